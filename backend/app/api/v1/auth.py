@@ -9,11 +9,14 @@ from app.core.security import (
     get_password_hash, 
     create_access_token,
     verify_token,
+    token_cache,
+    token_revocation_list,
     SecurityUtils
 )
 from app.core.config import settings
 from app.models.user import User
 from app.services.auth_service import AuthService
+from app.services.user_cache import user_cache
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
@@ -52,11 +55,65 @@ class PasswordChange(BaseModel):
 # Dependency to get current user
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """Get current authenticated user"""
-    try:
-        user_id = verify_token(token)
-        user = await User.get(user_id)
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found",
-                headers
\ No newline at end of file
+    user_id = verify_token(token)
+    user = await user_cache.get_user(user_id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Inactive user"
+        )
+    return user
+
+async def get_current_admin(current_user: User = Depends(get_current_user)):
+    """Require an authenticated admin"""
+    if not current_user.is_admin():
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return current_user
+
+@router.post("/login", response_model=Token)
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+    """Login with username (or email) and password"""
+    user = await AuthService.authenticate(form_data.username, form_data.password)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Inactive user"
+        )
+    
+    access_token = create_access_token(user.id)
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "user": user.get_public_profile()
+    }
+
+@router.post("/logout")
+async def logout(token: str = Depends(oauth2_scheme), current_user: User = Depends(get_current_user)):
+    """Revoke the current access token"""
+    await token_revocation_list.revoke(token)
+    return {"message": "Successfully logged out"}
+
+@router.get("/cache/stats")
+async def user_cache_stats(current_user: User = Depends(get_current_admin)):
+    """Authenticated user and token cache hit/miss counters"""
+    return {
+        "users": user_cache.stats(),
+        "tokens": token_cache.stats(),
+        "revoked_tokens": len(token_revocation_list)
+    }
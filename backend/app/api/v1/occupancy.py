@@ -0,0 +1,135 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, status
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.core.security import verify_token
+from app.models.user import User
+from app.services.occupancy_feed import Subscription, occupancy_feed
+from app.services.user_cache import user_cache
+
+router = APIRouter()
+
+
+async def authenticate(token: Optional[str]) -> Optional[User]:
+    """Active staff user for a token, or None"""
+    if not token:
+        return None
+    try:
+        user = await user_cache.get_user(verify_token(token))
+    except HTTPException:
+        return None
+    if user is None or not user.is_active or user.is_patient():
+        return None
+    return user
+
+
+async def get_feed_user(request: Request, token: Optional[str] = None) -> User:
+    """Bearer header, or ?token= for EventSource clients that cannot set headers"""
+    scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+    user = await authenticate(credentials if scheme.lower() == "bearer" else token)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Staff credentials required",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+
+def feed_available() -> bool:
+    return occupancy_feed.ready.is_set() and occupancy_feed.subscriber_count < occupancy_feed.max_subscribers
+
+
+def open_subscription(floor: Optional[int], location: Optional[str]) -> Optional[Subscription]:
+    if not occupancy_feed.ready.is_set():
+        return None
+    return occupancy_feed.subscribe(floor, location)
+
+
+@router.get("/")
+async def occupancy_snapshot(
+    floor: Optional[int] = None,
+    location: Optional[str] = None,
+    current_user: User = Depends(get_feed_user)
+):
+    """Current status and assignment of every box"""
+    return {"boxes": occupancy_feed.snapshot(floor, location)}
+
+
+@router.get("/stream")
+async def occupancy_stream(
+    floor: Optional[int] = None,
+    location: Optional[str] = None,
+    current_user: User = Depends(get_feed_user)
+):
+    """Server-Sent Events: a snapshot, then box and check-in/check-out changes"""
+    if not feed_available():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Occupancy feed unavailable")
+
+    async def events():
+        # Subscribed here, once the response streams: a client gone before
+        # that never runs the generator, and would leak a subscription
+        subscription = open_subscription(floor, location)
+        if subscription is None:
+            yield "event: unavailable\ndata: {}\n\n"
+            return
+        try:
+            snapshot = {"type": "snapshot", "boxes": occupancy_feed.snapshot(floor, location)}
+            yield f"event: snapshot\ndata: {json.dumps(snapshot, default=str)}\n\n"
+            while True:
+                event = await subscription.next_event(settings.OCCUPANCY_HEARTBEAT)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            occupancy_feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws")
+async def occupancy_socket(
+    websocket: WebSocket,
+    token: Optional[str] = None,
+    floor: Optional[int] = None,
+    location: Optional[str] = None
+):
+    """WebSocket: a snapshot, then box and check-in/check-out changes as JSON messages"""
+    if await authenticate(token) is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    subscription = open_subscription(floor, location)
+    if subscription is None:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+
+    async def forward():
+        await websocket.send_json({"type": "snapshot", "boxes": occupancy_feed.snapshot(floor, location)})
+        while True:
+            event = await subscription.next_event(settings.OCCUPANCY_HEARTBEAT)
+            await websocket.send_text(json.dumps(event or {"type": "ping"}, default=str))
+
+    async def until_closed():
+        # Clients only listen; reading notices a disconnect right away
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = []
+    try:
+        await websocket.accept()
+        tasks = [asyncio.create_task(forward()), asyncio.create_task(until_closed())]
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        occupancy_feed.unsubscribe(subscription)
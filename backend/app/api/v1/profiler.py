@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, status
+
+from app.api.v1.auth import get_current_admin
+from app.core.profiler import query_profiler
+from app.models.user import User
+
+router = APIRouter()
+
+
+@router.get("/")
+async def profiler_report(current_user: User = Depends(get_current_admin)):
+    """Command latency, slow queries, queries per route and N+1 suspects"""
+    return query_profiler.snapshot()
+
+
+@router.post("/reset", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_profiler(current_user: User = Depends(get_current_admin)):
+    """Clear the collected profiler data"""
+    query_profiler.reset()
@@ -0,0 +1,240 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from pymongo import ASCENDING
+from datetime import date, time
+from typing import List, Optional
+
+from app.api.v1.auth import get_current_admin, get_current_user
+from app.core.config import settings
+from app.core.pagination import Page, PageParams, paginate
+from app.models.reservation import (
+    Reservation,
+    ReservationBulkCreate,
+    ReservationBulkResult,
+    ReservationCalendarSlot,
+    ReservationCreate,
+    ReservationListItem,
+    ReservationStatusUpdate
+)
+from app.models.box import BoxFreeSlot, BoxRecommendation
+from app.models.user import User
+from app.services.box_matcher import box_matcher
+from app.services.bulk_reservation_service import BulkReservationService
+from app.services.export_service import ReservationExportService
+from app.services.reservation_service import ReservationService
+
+CALENDAR_MAX_DAYS = 62
+CALENDAR_MAX_SLOTS = 5000
+
+router = APIRouter()
+
+
+@router.post("/", response_model=Reservation, status_code=status.HTTP_201_CREATED)
+async def create_reservation(
+    reservation_data: ReservationCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """Book a reservation (409 if the box or doctor is already booked)"""
+    return await ReservationService.create_reservation(reservation_data, current_user)
+
+
+@router.post("/bulk", response_model=ReservationBulkResult)
+async def create_reservations_bulk(
+    bulk_data: ReservationBulkCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """Book a batch of reservations with per-item results (best effort or all-or-nothing)"""
+    return await BulkReservationService.create_reservations(bulk_data, current_user)
+
+
+@router.get("/", response_model=Page[ReservationListItem])
+async def list_reservations(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    box_id: Optional[str] = None,
+    doctor_id: Optional[str] = None,
+    patient_id: Optional[str] = None,
+    status_filter: Optional[List[str]] = Query(None, alias="status"),
+    sort: str = Query("date", pattern="^(date|created_at)$"),
+    page: PageParams = Depends(),
+    current_user: User = Depends(get_current_user)
+):
+    """List reservations page by page (patients and doctors only see their own)"""
+    if current_user.is_patient():
+        patient_id = str(current_user.id)
+    elif current_user.is_doctor():
+        doctor_id = str(current_user.id)
+
+    filters = ReservationExportService.build_query(date_from, date_to, box_id, doctor_id, status_filter)
+    if patient_id:
+        filters["patient_id"] = patient_id
+
+    return await paginate(
+        Reservation, filters, sort_field=sort,
+        cursor=page.cursor, limit=page.limit, direction=page.direction,
+        projection_model=ReservationListItem
+    )
+
+
+@router.get("/calendar", response_model=List[ReservationCalendarSlot])
+async def reservation_calendar(
+    date_from: date,
+    date_to: date,
+    box_id: Optional[str] = None,
+    doctor_id: Optional[str] = None,
+    include_cancelled: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Occupied slots of a box or doctor for a calendar view (no patient data)"""
+    if date_to < date_from or (date_to - date_from).days > CALENDAR_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Calendar range must be between 0 and {CALENDAR_MAX_DAYS} days"
+        )
+    if not box_id and not doctor_id and current_user.is_patient():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="box_id or doctor_id is required"
+        )
+
+    query = ReservationExportService.build_query(date_from, date_to, box_id, doctor_id)
+    if not include_cancelled:
+        query["status"] = {"$ne": settings.RESERVATION_STATUS["CANCELLED"]}
+
+    slots = await Reservation.find(query) \
+        .sort([("date", ASCENDING), ("start_time", ASCENDING)]) \
+        .limit(CALENDAR_MAX_SLOTS + 1) \
+        .project(ReservationCalendarSlot) \
+        .to_list()
+    if len(slots) > CALENDAR_MAX_SLOTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"More than {CALENDAR_MAX_SLOTS} slots; narrow the date range or filter by box or doctor"
+        )
+    return slots
+
+
+@router.get("/box-recommendations", response_model=List[BoxRecommendation])
+async def recommend_boxes(
+    day: date = Query(..., alias="date"),
+    start_time: time = Query(...),
+    duration_minutes: int = Query(..., ge=15, le=480),
+    doctor_id: Optional[str] = None,
+    equipment: Optional[List[str]] = Query(None),
+    capacity: int = Query(1, ge=1, le=10),
+    search_minutes: int = Query(0, ge=0, le=720),
+    limit: int = Query(5, ge=1, le=20),
+    current_user: User = Depends(get_current_user)
+):
+    """Free boxes for an appointment, the doctor's preferred boxes and tightest fits first"""
+    if current_user.is_doctor():
+        doctor_id = str(current_user.id)
+    if not doctor_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="doctor_id is required")
+    return await box_matcher.recommend(
+        doctor_id, day, start_time, duration_minutes,
+        equipment=equipment or (), capacity=capacity, search_minutes=search_minutes, limit=limit
+    )
+
+
+@router.get("/free-slots", response_model=List[BoxFreeSlot])
+async def free_slots(
+    date_from: date,
+    duration_minutes: int = Query(..., ge=15, le=480),
+    days: int = Query(14, ge=1, le=settings.FREE_SLOT_MAX_DAYS),
+    box_id: Optional[List[str]] = Query(None),
+    doctor_id: Optional[str] = None,
+    equipment: Optional[List[str]] = Query(None),
+    capacity: int = Query(1, ge=1, le=10),
+    step_minutes: int = Query(15, ge=settings.BOOKING_SLOT_MINUTES, le=240),
+    limit: int = Query(10, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    """First free slots across boxes (all, or the given box_id list), earliest first"""
+    if current_user.is_doctor():
+        doctor_id = str(current_user.id)
+    if step_minutes % settings.BOOKING_SLOT_MINUTES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"step_minutes must be a multiple of {settings.BOOKING_SLOT_MINUTES}"
+        )
+    return await box_matcher.free_slots(
+        date_from, days, duration_minutes, box_ids=box_id, doctor_id=doctor_id,
+        equipment=equipment or (), capacity=capacity, step_minutes=step_minutes, limit=limit
+    )
+
+
+@router.get("/export")
+async def export_reservations(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    box_id: Optional[str] = None,
+    doctor_id: Optional[str] = None,
+    status_filter: Optional[List[str]] = Query(None, alias="status"),
+    current_user: User = Depends(get_current_admin)
+):
+    """Stream a reservation report as CSV or XLSX (admin only)"""
+    query = ReservationExportService.build_query(date_from, date_to, box_id, doctor_id, status_filter)
+    filename = f"reservas_{date_from or 'inicio'}_{date_to or 'fin'}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    if format == "xlsx":
+        return StreamingResponse(
+            ReservationExportService.stream_xlsx(query),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers=headers
+        )
+    return StreamingResponse(
+        ReservationExportService.stream_csv(query),
+        media_type="text/csv; charset=utf-8",
+        headers=headers
+    )
+
+
+@router.post("/{reservation_id}/cancel", response_model=Reservation)
+async def cancel_reservation(
+    reservation_id: str,
+    reason: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Cancel a reservation and release its slots"""
+    reservation = await Reservation.get(reservation_id)
+    if reservation is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reservation not found"
+        )
+
+    if current_user.is_patient() and reservation.patient_id != str(current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+    return await ReservationService.cancel_reservation(reservation, current_user, reason)
+
+
+@router.patch("/{reservation_id}/status", response_model=Reservation)
+async def update_reservation_status(
+    reservation_id: str,
+    status_update: ReservationStatusUpdate,
+    current_user: User = Depends(get_current_user)
+):
+    """Confirm, check in, check out, cancel or mark a reservation as no-show"""
+    if current_user.is_patient():
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+    reservation = await Reservation.get(reservation_id)
+    if reservation is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reservation not found"
+        )
+
+    return await ReservationService.update_status(
+        reservation, status_update.status, current_user, status_update.reason
+    )
@@ -0,0 +1,117 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date, timedelta
+from typing import List, Optional
+
+from app.api.v1.auth import get_current_admin, get_current_user
+from app.core.config import settings
+from app.models.series import (
+    ReservationSeries,
+    ReservationSeriesCreate,
+    SeriesException,
+    SeriesMaterializeResult,
+    SeriesOccurrence
+)
+from app.models.user import User
+from app.services.series_service import SeriesService
+
+router = APIRouter()
+
+WINDOW_MAX_DAYS = 62
+
+
+def _check_window(date_from: date, date_to: date):
+    if date_to < date_from or (date_to - date_from).days > WINDOW_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range must be between 0 and {WINDOW_MAX_DAYS} days"
+        )
+
+
+async def _get_series(series_id: str, current_user: User) -> ReservationSeries:
+    series = await ReservationSeries.get(series_id)
+    if series is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Series not found"
+        )
+    user_id = str(current_user.id)
+    if (current_user.is_patient() and series.patient_id != user_id) or \
+            (current_user.is_doctor() and series.doctor_id != user_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return series
+
+
+@router.post("/", response_model=ReservationSeries, status_code=status.HTTP_201_CREATED)
+async def create_series(
+    series_data: ReservationSeriesCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """Create a recurring series (RRULE) and book its upcoming occurrences"""
+    return await SeriesService.create_series(series_data, current_user)
+
+
+@router.get("/occurrences", response_model=List[SeriesOccurrence])
+async def list_occurrences(
+    date_from: date,
+    date_to: date,
+    doctor_id: Optional[str] = None,
+    box_id: Optional[str] = None,
+    patient_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Occurrences of all active series in a date window, expanded on the fly"""
+    _check_window(date_from, date_to)
+    if current_user.is_patient():
+        patient_id = str(current_user.id)
+    return await SeriesService.occurrences(date_from, date_to, doctor_id, box_id, patient_id)
+
+
+@router.post("/materialize", response_model=SeriesMaterializeResult)
+async def materialize_series(
+    until: Optional[date] = None,
+    current_user: User = Depends(get_current_admin)
+):
+    """Book series occurrences as reservations up to a date (admin only)"""
+    until = until or date.today() + timedelta(days=settings.SERIES_MATERIALIZE_DAYS)
+    return await SeriesService.materialize(until)
+
+
+@router.get("/{series_id}", response_model=ReservationSeries)
+async def get_series(series_id: str, current_user: User = Depends(get_current_user)):
+    """Get a series with its exceptions"""
+    return await _get_series(series_id, current_user)
+
+
+@router.get("/{series_id}/occurrences", response_model=List[SeriesOccurrence])
+async def get_series_occurrences(
+    series_id: str,
+    date_from: date,
+    date_to: date,
+    include_cancelled: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Occurrences of one series in a date window"""
+    _check_window(date_from, date_to)
+    series = await _get_series(series_id, current_user)
+    return SeriesService.series_occurrences(series, date_from, date_to, include_cancelled)
+
+
+@router.post("/{series_id}/exceptions", response_model=ReservationSeries)
+async def add_series_exception(
+    series_id: str,
+    exception: SeriesException,
+    current_user: User = Depends(get_current_user)
+):
+    """Cancel, move or change a single occurrence"""
+    series = await _get_series(series_id, current_user)
+    return await SeriesService.add_exception(series, exception, current_user)
+
+
+@router.post("/{series_id}/cancel", response_model=ReservationSeries)
+async def cancel_series(series_id: str, current_user: User = Depends(get_current_user)):
+    """Stop a series and cancel its upcoming reservations"""
+    series = await _get_series(series_id, current_user)
+    return await SeriesService.cancel_series(series, current_user)
@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends
+from datetime import date
+from typing import Optional
+
+from app.api.v1.auth import get_current_admin
+from app.models.box import BoxStats
+from app.models.reservation import ReservationStats
+from app.models.schedule import ScheduleStats
+from app.models.user import User, UserStats
+from app.services.stats_service import StatsService
+
+router = APIRouter()
+
+
+@router.get("/reservations", response_model=ReservationStats)
+async def reservation_stats(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: User = Depends(get_current_admin)
+):
+    """Reservation statistics for a period (default: last 30 days)"""
+    return await StatsService.reservation_stats(date_from, date_to)
+
+
+@router.get("/boxes", response_model=BoxStats)
+async def box_stats(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: User = Depends(get_current_admin)
+):
+    """Box statistics and utilization for a period (default: last 30 days)"""
+    return await StatsService.box_stats(date_from, date_to)
+
+
+@router.get("/schedules", response_model=ScheduleStats)
+async def schedule_stats(current_user: User = Depends(get_current_admin)):
+    """Schedule statistics"""
+    return await StatsService.schedule_stats()
+
+
+@router.get("/users", response_model=UserStats)
+async def user_stats(current_user: User = Depends(get_current_admin)):
+    """User statistics"""
+    return await StatsService.user_stats()
+
+
+@router.get("/dashboard")
+async def dashboard(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: User = Depends(get_current_admin)
+):
+    """All statistics in one call, computed concurrently"""
+    return await StatsService.dashboard(date_from, date_to)
@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import Optional
+
+from app.api.v1.auth import get_current_admin, get_current_user
+from app.core.config import settings
+from app.core.pagination import Page, PageParams, paginate
+from app.models.user import User, UserPublicProfile, UserResponse
+
+router = APIRouter()
+
+# Roles any user may browse in the directory; admins may browse every role
+DIRECTORY_ROLES = {settings.USER_ROLES["DOCTOR"]}
+
+
+@router.get("/", response_model=Page[UserResponse])
+async def list_users(
+    role: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    page: PageParams = Depends(),
+    current_user: User = Depends(get_current_admin)
+):
+    """List users by registration date, page by page (admin only)"""
+    filters = {}
+    if role:
+        filters["role"] = role
+    if is_active is not None:
+        filters["is_active"] = is_active
+
+    return await paginate(
+        User, filters, sort_field="created_at",
+        cursor=page.cursor, limit=page.limit, direction=page.direction,
+        projection_model=UserResponse
+    )
+
+
+@router.get("/directory", response_model=Page[UserPublicProfile])
+async def user_directory(
+    role: str = Query(settings.USER_ROLES["DOCTOR"]),
+    department: Optional[str] = None,
+    page: PageParams = Depends(),
+    current_user: User = Depends(get_current_user)
+):
+    """Public profiles of active staff, e.g. doctors to book with"""
+    if role not in DIRECTORY_ROLES and not current_user.is_admin():
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+    filters = {"role": role, "is_active": True}
+    if department:
+        filters["department"] = department
+
+    return await paginate(
+        User, filters, cursor=page.cursor, limit=page.limit, direction=page.direction,
+        projection_model=UserPublicProfile
+    )
@@ -0,0 +1,342 @@
+"""
+Generate a synthetic dataset for performance testing.
+
+Creates doctors, patients, boxes, weekly schedules and reservations with
+clinic-like distributions: doctors work weekdays 08:00-13:00 and
+14:00-18:00 in one box per day, each with their own occupancy; durations,
+appointment types and priorities are weighted; patients follow a skewed
+popularity (a few frequent patients, a long tail); roughly PAST_RATIO of
+the reservations are in the past with final statuses (completed,
+cancelled, no-show), the rest upcoming (pending or confirmed). Doctor and
+box never overlap, so the data is valid for the booking paths.
+
+Documents are built as plain dicts in their stored shape (ISO dates and
+times) and streamed into unordered insert_many batches, several in
+flight while the next ones are generated, without per-document model
+validation. All users share one password hash. Slot claims are written
+for upcoming active reservations, and the daily rollups are rebuilt at
+the end.
+
+Usage: python -m app.commands.generate_load_data [--reservations 1000000] [--database redsalud_load] [--drop]
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time as timer
+from datetime import date, datetime, time, timedelta
+from typing import List
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.core.database import init_models
+from app.core.security import get_password_hash
+from app.models.box import Box
+from app.models.reservation import Reservation
+from app.models.schedule import Schedule
+from app.models.slot_claim import SlotClaim
+from app.models.user import User
+from app.services.reservation_service import ReservationService
+from app.services.rollup_service import RollupService
+
+logger = logging.getLogger(__name__)
+
+PASSWORD = "loadtest123"
+PAST_RATIO = 0.8
+WORKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday"]
+SHIFTS = [(8 * 60, 13 * 60), (14 * 60, 18 * 60)]
+
+FIRST_NAMES = [
+    "María", "José", "Juan", "Francisca", "Camila", "Diego", "Valentina", "Matías", "Javiera", "Benjamín",
+    "Catalina", "Sebastián", "Fernanda", "Tomás", "Constanza", "Nicolás", "Daniela", "Felipe", "Paula", "Ignacio"
+]
+LAST_NAMES = [
+    "González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva", "Martínez", "Sepúlveda",
+    "Morales", "Rodríguez", "López", "Fuentes", "Hernández", "Torres", "Araya", "Flores", "Espinoza", "Valenzuela"
+]
+SPECIALIZATIONS = [
+    ("Medicina General", 40), ("Pediatría", 12), ("Cardiología", 8), ("Traumatología", 8),
+    ("Ginecología", 8), ("Dermatología", 6), ("Neurología", 5), ("Oftalmología", 5),
+    ("Otorrinolaringología", 4), ("Psiquiatría", 4)
+]
+EQUIPMENT = ["Camilla", "Escritorio", "Computador", "ECG", "Monitor", "Lámpara", "Mesa instrumental", "Ecógrafo"]
+DURATIONS = ([15, 30, 45, 60], [15, 55, 15, 15])
+APPOINTMENT_TYPES = (["consultation", "follow_up", "procedure", "emergency"], [60, 25, 10, 5])
+PRIORITIES = (["normal", "high", "low", "urgent"], [85, 10, 3, 2])
+PAST_STATUSES = (["completed", "cancelled", "no_show", "confirmed"], [80, 10, 7, 3])
+UPCOMING_STATUSES = (["confirmed", "pending", "cancelled"], [60, 35, 5])
+
+
+def _name(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def _clock(minute: int) -> time:
+    return time(minute // 60, minute % 60)
+
+
+def make_users(rng: random.Random, doctors: int, patients: int, hashed_password: str, now: datetime):
+    specializations, weights = zip(*SPECIALIZATIONS)
+    doctor_docs, patient_docs = [], []
+    for i in range(doctors):
+        doctor_docs.append({
+            "_id": ObjectId(), "email": f"load-doctor{i}@redsalud.cl", "username": f"load_doctor{i}",
+            "full_name": f"Dr. {_name(rng)}", "hashed_password": hashed_password, "role": "doctor",
+            "is_active": True, "is_verified": True,
+            "specialization": rng.choices(specializations, weights)[0], "license_number": f"{10000000 + i}",
+            "medical_conditions": [], "allergies": [], "preferences": {}, "created_at": now, "updated_at": now
+        })
+    for i in range(patients):
+        birth = date(1940, 1, 1) + timedelta(days=rng.randrange(80 * 365))
+        patient_docs.append({
+            "_id": ObjectId(), "email": f"load-patient{i}@redsalud.cl", "username": f"load_patient{i}",
+            "full_name": _name(rng), "hashed_password": hashed_password, "role": "patient",
+            "is_active": rng.random() > 0.02, "is_verified": rng.random() > 0.1,
+            "rut": f"{5000000 + i}-{rng.randrange(10)}", "phone": f"+569{rng.randrange(10 ** 8):08d}",
+            "date_of_birth": birth.isoformat(),
+            "medical_conditions": [], "allergies": [], "preferences": {}, "created_at": now, "updated_at": now
+        })
+    return doctor_docs, patient_docs
+
+
+def make_boxes(rng: random.Random, count: int, now: datetime) -> List[dict]:
+    return [
+        {
+            "_id": ObjectId(), "name": f"Load Box {i + 1}", "location": f"Planta {i % 5 + 1} - Ala {'Norte' if i % 2 else 'Sur'}",
+            "capacity": rng.randint(1, 4), "equipment": rng.sample(EQUIPMENT, rng.randint(2, 5)),
+            "status": "available", "is_active": True, "floor": i % 5 + 1, "room_number": f"{i % 5 + 1}{i:03d}",
+            "available_from": "08:00", "available_to": "18:00", "available_days": WORKDAYS,
+            "special_requirements": [], "created_at": now, "updated_at": now
+        }
+        for i in range(count)
+    ]
+
+
+def make_schedules(doctors: List[dict], boxes: List[dict], effective_from: date, now: datetime) -> List[dict]:
+    slots = [
+        {"start_time": _clock(start).isoformat(), "end_time": _clock(end).isoformat(),
+         "is_available": True, "appointment_duration": 15, "break_between": 0}
+        for start, end in SHIFTS
+    ]
+    return [
+        {
+            "doctor_id": str(doctor["_id"]), "doctor_name": doctor["full_name"], "schedule_type": "regular",
+            "effective_from": effective_from.isoformat(), "effective_to": None, "day_of_week": day_of_week,
+            "specific_date": None, "time_slots": slots, "is_available": True,
+            "preferred_boxes": [str(boxes[i % len(boxes)]["_id"])], "notes": None, "max_patients_per_slot": 1,
+            "lunch_break_start": None, "lunch_break_end": None,
+            "created_at": now, "updated_at": now, "created_by": "load-generator"
+        }
+        for i, doctor in enumerate(doctors)
+        for day_of_week in WORKDAYS
+    ]
+
+
+def reservation_days(total: int, doctors: int, today: date):
+    """Workdays covering ``total`` reservations with about PAST_RATIO of them before today"""
+    # Each step books (mean duration) with the mean occupancy, or skips 15 minutes
+    busy = 0.75 * 0.9
+    mean_duration = sum(d * w for d, w in zip(*DURATIONS)) / sum(DURATIONS[1])
+    shift_minutes = sum(end - start for start, end in SHIFTS)
+    per_day = max(1.0, doctors * shift_minutes * busy / (busy * mean_duration + (1 - busy) * 15))
+    past_days = int(total * PAST_RATIO / per_day) + 1
+    day = today
+    while past_days:
+        day -= timedelta(days=1)
+        if day.weekday() < 5:
+            past_days -= 1
+    while True:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+
+def generate_reservations(rng: random.Random, total: int, doctors: List[dict], patients: List[dict],
+                          boxes: List[dict], today: date, now: datetime):
+    """Yield reservation documents, day by day, doctor by doctor"""
+    occupancy = [rng.uniform(0.55, 0.95) for _ in doctors]
+    durations, duration_weights = DURATIONS
+    produced = 0
+    for day in reservation_days(total, len(doctors), today):
+        ordinal = day.toordinal()
+        past = day < today
+        statuses = PAST_STATUSES if past else UPCOMING_STATUSES
+        day_iso = day.isoformat()
+        for index, doctor in enumerate(doctors):
+            box = boxes[(index + ordinal) % len(boxes)]
+            for shift_start, shift_end in SHIFTS:
+                minute = shift_start
+                while minute < shift_end:
+                    # Mornings are busier than afternoons
+                    busy = occupancy[index] * (1.0 if minute < 12 * 60 else 0.8)
+                    if rng.random() > busy:
+                        minute += 15
+                        continue
+                    duration = rng.choices(durations, duration_weights)[0]
+                    if minute + duration > shift_end:
+                        break
+                    patient = patients[int(len(patients) * rng.random() ** 2)]
+                    status = rng.choices(*statuses)[0]
+                    created_at = datetime.combine(day, time.min) - timedelta(minutes=rng.randrange(60, 60 * 24 * 30))
+                    start_time, end_time = _clock(minute), _clock(minute + duration)
+                    document = {
+                        "_id": ObjectId(),
+                        "patient_id": str(patient["_id"]), "doctor_id": str(doctor["_id"]), "box_id": str(box["_id"]),
+                        "date": day_iso, "start_time": start_time.isoformat(), "end_time": end_time.isoformat(),
+                        "duration_minutes": duration, "status": status,
+                        "appointment_type": rng.choices(*APPOINTMENT_TYPES)[0],
+                        "reason": None, "notes": None, "created_by": str(patient["_id"]),
+                        "priority": rng.choices(*PRIORITIES)[0],
+                        "patient_name": patient["full_name"], "patient_phone": patient["phone"],
+                        "patient_email": patient["email"],
+                        "doctor_name": doctor["full_name"], "doctor_specialization": doctor["specialization"],
+                        "box_name": box["name"], "box_location": box["location"],
+                        "follow_up_required": False, "reminder_sent": past,
+                        "created_at": min(created_at, now), "updated_at": min(created_at, now)
+                    }
+                    if status in ("confirmed", "completed", "no_show"):
+                        document["confirmed_at"] = created_at + timedelta(hours=1)
+                        document["confirmed_by"] = str(doctor["_id"])
+                    elif status == "cancelled":
+                        document["cancelled_at"] = created_at + timedelta(days=1)
+                        document["cancelled_by"] = str(patient["_id"])
+                        document["cancellation_reason"] = "Generated"
+                    if status == "completed":
+                        document["actual_duration"] = duration + rng.randint(-5, 10)
+                    yield document, start_time, end_time
+                    produced += 1
+                    if produced >= total:
+                        return
+                    minute += duration
+
+
+class BatchWriter:
+    """Unordered insert_many batches, sharing a limit of batches in flight"""
+
+    def __init__(self, collection, batch_size: int, semaphore: asyncio.Semaphore):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.semaphore = semaphore
+        self.written = 0
+        self._batch: List[dict] = []
+        self._tasks: List[asyncio.Task] = []
+
+    async def add(self, document: dict):
+        self._batch.append(document)
+        if len(self._batch) >= self.batch_size:
+            await self._send()
+
+    async def add_many(self, documents: List[dict]):
+        for document in documents:
+            await self.add(document)
+
+    async def _send(self):
+        batch, self._batch = self._batch, []
+        await self.semaphore.acquire()
+        self._tasks.append(asyncio.create_task(self._insert(batch)))
+        self.written += len(batch)
+
+    async def _insert(self, batch: List[dict]):
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+        finally:
+            self.semaphore.release()
+
+    async def flush(self) -> int:
+        if self._batch:
+            await self._send()
+        await asyncio.gather(*self._tasks)
+        self._tasks = []
+        return self.written
+
+
+async def generate(args):
+    client = AsyncIOMotorClient(args.database_url)
+    database = client[args.database]
+    if args.drop:
+        await client.drop_database(args.database)
+    elif await database[Reservation.Settings.name].estimated_document_count():
+        raise SystemExit(f"Database {args.database} already has reservations; use --drop to replace them")
+    await init_models(database)
+
+    rng = random.Random(args.seed)
+    today = date.today()
+    now = datetime.utcnow()
+    phase = timer.perf_counter()
+    started = phase
+
+    def done(label: str, count: int):
+        nonlocal phase
+        elapsed = timer.perf_counter() - phase
+        logger.info(f"{label:14s} {count:9d} in {elapsed:7.1f} s")
+        phase = timer.perf_counter()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    def writer(model) -> BatchWriter:
+        return BatchWriter(model.get_motor_collection(), args.batch_size, semaphore)
+
+    doctors, patients = make_users(rng, args.doctors, args.patients, get_password_hash(PASSWORD), now)
+    boxes = make_boxes(rng, max(args.boxes, args.doctors), now)
+    first_day = next(reservation_days(args.reservations, len(doctors), today))
+    schedules = make_schedules(doctors, boxes, first_day, now)
+    users, box_writer, schedule_writer = writer(User), writer(Box), writer(Schedule)
+    await users.add_many(doctors + patients)
+    await box_writer.add_many(boxes)
+    await schedule_writer.add_many(schedules)
+    await asyncio.gather(users.flush(), box_writer.flush(), schedule_writer.flush())
+    done("users/boxes", users.written + box_writer.written + schedule_writer.written)
+
+    # Generation and writes overlap: batches are sent while the next ones are built
+    reservations, claims = writer(Reservation), writer(SlotClaim)
+    today_iso = today.isoformat()
+    for document, start_time, end_time in generate_reservations(
+        rng, args.reservations, doctors, patients, boxes, today, now
+    ):
+        await reservations.add(document)
+        if document["date"] >= today_iso and document["status"] != "cancelled":
+            keys = ReservationService.claim_keys(
+                document["box_id"], document["doctor_id"], date.fromisoformat(document["date"]), start_time, end_time
+            )
+            expires_at = SlotClaim.expiry(keys[0])
+            for key in keys:
+                await claims.add({
+                    "_id": key, "reservation_id": str(document["_id"]), "created_at": now, "expires_at": expires_at
+                })
+    await asyncio.gather(reservations.flush(), claims.flush())
+    done("reservations", reservations.written)
+
+    if not args.skip_rollups:
+        rollups = await RollupService.rebuild()
+        done("rollups", rollups)
+
+    logger.info(
+        f"Generated {reservations.written} reservations ({claims.written} slot claims, {len(schedules)} schedules) "
+        f"in {args.database} in {timer.perf_counter() - started:.1f} s; password for all users: {PASSWORD}"
+    )
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset for performance testing")
+    parser.add_argument("--reservations", type=int, default=1_000_000)
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--patients", type=int, default=50_000)
+    parser.add_argument("--boxes", type=int, default=250, help="raised to --doctors if lower")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--database", default="redsalud_load")
+    parser.add_argument("--drop", action="store_true", help="drop the target database first")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--concurrency", type=int, default=4, help="insert batches in flight")
+    parser.add_argument("--skip-rollups", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    asyncio.run(generate(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Inspect, build and audit the MongoDB indexes of every document model.
+
+  diff   declared vs live indexes (exit code 1 when out of sync)
+  sync   build missing indexes (exit code 1 when changed ones are left);
+         --rebuild-changed drops and rebuilds changed ones, --drop-extra
+         drops undeclared ones
+  usage  $indexStats per index, least used first; --unused lists only ops == 0
+
+Usage: python -m app.commands.indexes {diff,sync,usage} [--collection NAME]
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.core.database import DOCUMENT_MODELS, init_models
+from app.core.indexes import diff_indexes, index_usage, sync_all
+
+logger = logging.getLogger(__name__)
+
+
+def print_diff(diff):
+    state = "in sync" if diff.in_sync else "out of sync"
+    print(f"{diff.collection}: {state}")
+    for spec in diff.missing:
+        print(f"  + {spec.describe()}")
+    for current, declared in diff.changed:
+        print(f"  ~ {current.describe()}")
+        print(f"    -> {declared.describe()}")
+    for spec in diff.extra:
+        print(f"  - {spec.describe()}  (not declared)")
+
+
+async def run(args) -> int:
+    client = AsyncIOMotorClient(settings.DATABASE_URL)
+    await init_models(client[settings.DATABASE_NAME], create_indexes=False)
+    models = [
+        model for model in DOCUMENT_MODELS
+        if not args.collection or model.get_settings().name in args.collection
+    ]
+    exit_code = 0
+    try:
+        if args.command == "diff":
+            for diff in await asyncio.gather(*(diff_indexes(model) for model in models)):
+                print_diff(diff)
+                if not diff.in_sync:
+                    exit_code = 1
+        elif args.command == "sync":
+            for diff in await sync_all(models, drop_extra=args.drop_extra, rebuild_changed=args.rebuild_changed):
+                print_diff(diff)
+                if diff.changed and not args.rebuild_changed:
+                    exit_code = 1
+        elif args.command == "usage":
+            for rows in await asyncio.gather(*(index_usage(model) for model in models)):
+                for usage in rows:
+                    if args.unused and usage.ops:
+                        continue
+                    since = usage.since.isoformat(timespec="seconds") if usage.since else "-"
+                    print(f"{usage.collection:22s} {usage.name:32s} {usage.ops:12d}  since {since}")
+    finally:
+        client.close()
+    return exit_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes")
+    parser.add_argument("command", choices=["diff", "sync", "usage"])
+    parser.add_argument("--collection", action="append", help="limit to a collection (repeatable)")
+    parser.add_argument("--drop-extra", action="store_true", help="sync: drop indexes no model declares")
+    parser.add_argument(
+        "--rebuild-changed", action="store_true",
+        help="sync: drop and rebuild indexes whose options changed (unindexed while building)"
+    )
+    parser.add_argument("--unused", action="store_true", help="usage: only indexes with no operations")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
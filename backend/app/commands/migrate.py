@@ -0,0 +1,60 @@
+"""
+Run the data migrations, then create or update the MongoDB indexes of
+every document model.
+
+API workers only bind their models on startup (unless
+DB_CREATE_INDEXES_ON_STARTUP is set), so run this once per deploy,
+before the new workers start, as a one-shot job (the docker-compose
+``migrate`` service, or an init container); never from each API replica.
+Workers log an error for every collection whose indexes are not up to
+date, or refuse to start with DB_REQUIRE_INDEXES. The index part is
+equivalent to ``app.commands.indexes sync``.
+
+Indexes whose options changed are reported, not rebuilt: that needs
+--rebuild-changed-indexes (see app.core.indexes).
+
+Usage: python -m app.commands.migrate [--drop-unknown-indexes] [--rebuild-changed-indexes]
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.core.data_migrations import run_all
+from app.core.database import DOCUMENT_MODELS, init_models
+from app.core.indexes import sync_all
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate(drop_unknown_indexes: bool = False, rebuild_changed_indexes: bool = False):
+    client = AsyncIOMotorClient(settings.DATABASE_URL)
+    started = time.perf_counter()
+    await init_models(client[settings.DATABASE_NAME], create_indexes=False)
+    await run_all(client[settings.DATABASE_NAME])
+    await sync_all(DOCUMENT_MODELS, drop_extra=drop_unknown_indexes, rebuild_changed=rebuild_changed_indexes)
+    logger.info(f"Indexes of {len(DOCUMENT_MODELS)} collections up to date in {time.perf_counter() - started:.1f} s")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create or update MongoDB indexes")
+    parser.add_argument(
+        "--drop-unknown-indexes", action="store_true",
+        help="also drop indexes that no model declares"
+    )
+    parser.add_argument(
+        "--rebuild-changed-indexes", action="store_true",
+        help="drop and rebuild indexes whose options changed"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    asyncio.run(migrate(args.drop_unknown_indexes, args.rebuild_changed_indexes))
+
+
+if __name__ == "__main__":
+    main()
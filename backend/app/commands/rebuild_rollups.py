@@ -0,0 +1,46 @@
+"""
+Backfill or rebuild the daily reservation rollups.
+
+Usage: python -m app.commands.rebuild_rollups [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import date
+
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.models.reservation import Reservation
+from app.models.rollup import ReservationRollup
+from app.services.rollup_service import RollupService
+
+logger = logging.getLogger(__name__)
+
+
+async def rebuild(date_from: date = None, date_to: date = None):
+    client = AsyncIOMotorClient(settings.DATABASE_URL)
+    await init_beanie(
+        database=client[settings.DATABASE_NAME],
+        document_models=[Reservation, ReservationRollup]
+    )
+    started = time.perf_counter()
+    count = await RollupService.rebuild(date_from, date_to)
+    logger.info(f"Corrected {count} rollups in {time.perf_counter() - started:.1f} s")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild daily reservation rollups")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat)
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    asyncio.run(rebuild(args.date_from, args.date_to))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Data migrations, run by app.commands.migrate before the index sync.
+
+Models store dates and times as ISO strings (see their bson_encoders),
+which compare correctly as strings in range queries. Documents written
+before that hold BSON datetimes instead and would be missed by those
+queries, so they are rewritten here.
+
+Every migration only matches documents still in the old format, so it is
+safe to run on every deploy.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+# collection -> (date fields, time fields); "list.field" is a field of every list item
+ISO_FIELDS: Dict[str, tuple] = {
+    "reservations": (
+        ["date", "follow_up_date", "occurrence_date"],
+        ["start_time", "end_time"]
+    ),
+    "schedules": (
+        ["effective_from", "effective_to", "specific_date"],
+        ["lunch_break_start", "lunch_break_end", "time_slots.start_time", "time_slots.end_time"]
+    ),
+}
+
+
+def _iso_items(items, name: str, to_iso) -> bool:
+    changed = False
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, dict) and isinstance(item.get(name), datetime):
+            item[name] = to_iso(item[name])
+            changed = True
+    return changed
+
+
+async def iso_dates(collection: AsyncIOMotorCollection, date_fields: List[str], time_fields: List[str]) -> int:
+    """Rewrite BSON datetimes of date and time fields as ISO strings"""
+    fields = date_fields + time_fields
+    query = {"$or": [{field: {"$type": "date"}} for field in fields]}
+    projection = sorted({field.split(".")[0] for field in fields})
+    converters = [(field, lambda value: value.date().isoformat()) for field in date_fields]
+    converters += [(field, lambda value: value.time().isoformat()) for field in time_fields]
+    converted = 0
+    operations = []
+    async for document in collection.find(query, projection=projection):
+        changes = {}
+        for field, to_iso in converters:
+            name, _, item_field = field.partition(".")
+            if item_field:
+                # Items are converted in place and the whole list is written back
+                if _iso_items(document.get(name), item_field, to_iso):
+                    changes[name] = document[name]
+            elif isinstance(document.get(name), datetime):
+                changes[name] = to_iso(document[name])
+        operations.append(UpdateOne({"_id": document["_id"]}, {"$set": changes}))
+        if len(operations) >= BATCH_SIZE:
+            await collection.bulk_write(operations, ordered=False)
+            converted += len(operations)
+            operations = []
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+        converted += len(operations)
+    return converted
+
+
+async def run_all(db: AsyncIOMotorDatabase):
+    for name, (date_fields, time_fields) in ISO_FIELDS.items():
+        converted = await iso_dates(db[name], date_fields, time_fields)
+        if converted:
+            logger.info(f"Converted dates and times of {converted} {name} to ISO strings")
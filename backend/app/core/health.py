@@ -0,0 +1,165 @@
+"""
+Liveness and readiness.
+
+Orchestrators poll the health endpoints every few seconds on every worker,
+so the endpoints never talk to MongoDB themselves. HealthMonitor pings
+MongoDB (and Redis, when configured) in a background task every
+HEALTH_PROBE_INTERVAL seconds and refreshes ``dbStats`` only every
+HEALTH_STATS_TTL seconds; the endpoints read the cached results.
+
+Pool saturation and event-loop lag are read live on each readiness check
+(both are in-process counters), so a worker drops out of rotation as soon
+as its connection pool queues callers or its loop falls behind, without
+waiting for the next probe.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.database import get_database_stats, ping_database
+from app.core.metrics import request_metrics
+from app.core.pool import pool_monitor
+from app.core.redis import get_redis
+from app.core.startup import startup_timings
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Background MongoDB/Redis probes plus cheap in-process readiness checks"""
+
+    def __init__(self, interval: float, timeout: float, stats_ttl: float):
+        self.interval = interval
+        self.timeout = timeout
+        self.stats_ttl = stats_ttl
+        self.database_ok: Optional[bool] = None
+        self.database_latency_ms: Optional[float] = None
+        self.database_checked_at: Optional[float] = None  # time.monotonic()
+        self.database_stats: Optional[Dict[str, Any]] = None
+        self.stats_checked_at: Optional[float] = None
+        self.redis_ok: Optional[bool] = None
+        self.last_probe: Optional[str] = None
+        self._started_at = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Probe once, then keep probing in the background"""
+        if self._task is None:
+            await self.probe()
+            self._task = asyncio.create_task(self._probe_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error(f"Health probe failed: {e}")
+
+    async def probe(self):
+        """Refresh the cached MongoDB/Redis status"""
+        refresh_stats = self.stats_checked_at is None or time.monotonic() - self.stats_checked_at >= self.stats_ttl
+        await asyncio.gather(
+            self._probe_database(),
+            self._probe_stats() if refresh_stats else asyncio.sleep(0),
+            self._probe_redis()
+        )
+        self.last_probe = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    async def _probe_database(self):
+        started = time.perf_counter()
+        try:
+            ok = await asyncio.wait_for(ping_database(), self.timeout)
+        except asyncio.TimeoutError:
+            ok = False
+        if ok != self.database_ok and self.database_ok is not None:
+            logger.warning(f"MongoDB is {'reachable again' if ok else 'unreachable'}")
+        self.database_ok = ok
+        self.database_latency_ms = round((time.perf_counter() - started) * 1000, 1) if ok else None
+        self.database_checked_at = time.monotonic()
+
+    async def _probe_stats(self):
+        try:
+            stats = await asyncio.wait_for(get_database_stats(), self.timeout)
+        except asyncio.TimeoutError:
+            stats = None
+        if stats is not None:
+            self.database_stats = stats
+        self.stats_checked_at = time.monotonic()
+
+    async def _probe_redis(self):
+        redis = get_redis()
+        if redis is None:
+            self.redis_ok = None
+            return
+        try:
+            self.redis_ok = bool(await asyncio.wait_for(redis.ping(), self.timeout))
+        except Exception:
+            self.redis_ok = False
+
+    def readiness(self) -> Tuple[bool, Dict[str, str]]:
+        """Whether the worker should receive traffic, with one entry per failed check"""
+        failures: Dict[str, str] = {}
+        if startup_timings.total_ms is None:
+            failures["startup"] = "startup not finished"
+
+        # A probe older than a few intervals means the probe task is stuck
+        if self.database_checked_at is None:
+            failures["database"] = "not probed yet"
+        elif not self.database_ok:
+            failures["database"] = "ping failed"
+        elif time.monotonic() - self.database_checked_at > 3 * self.interval + self.timeout:
+            failures["database"] = "probe result is stale"
+
+        saturated = pool_monitor.saturated(settings.READINESS_MAX_POOL_USAGE, self.interval)
+        if saturated:
+            failures["pool"] = saturated
+
+        lag = request_metrics.current_loop_lag()
+        if lag is not None and lag > settings.READINESS_MAX_LOOP_LAG:
+            failures["event_loop"] = f"lag {lag * 1000:.0f} ms"
+
+        return not failures, failures
+
+    def liveness(self) -> Dict[str, Any]:
+        return {
+            "status": "alive",
+            "uptime_seconds": round(time.monotonic() - self._started_at, 1)
+        }
+
+    def report(self) -> Dict[str, Any]:
+        """Cached probe results and live pool/loop figures"""
+        ready, failures = self.readiness()
+        lag = request_metrics.current_loop_lag()
+        return {
+            "status": "healthy" if ready else "unhealthy",
+            "failures": failures,
+            "last_probe": self.last_probe,
+            "database": {
+                "connected": self.database_ok,
+                "latency_ms": self.database_latency_ms,
+                "stats": self.database_stats
+            },
+            "redis": {"connected": self.redis_ok} if settings.REDIS_URL else None,
+            "pool": pool_monitor.snapshot(),
+            "event_loop_lag_ms": round(lag * 1000, 1) if lag is not None else None
+        }
+
+
+health_monitor = HealthMonitor(
+    interval=settings.HEALTH_PROBE_INTERVAL,
+    timeout=settings.HEALTH_PROBE_TIMEOUT,
+    stats_ttl=settings.HEALTH_STATS_TTL
+)
@@ -0,0 +1,197 @@
+"""
+Index management for the document models.
+
+The declared indexes of a model are the ones Beanie would create: fields
+wrapped in ``Indexed`` plus ``Settings.indexes`` (field names or
+IndexModel, which carry compound keys, unique, partial filters and TTL).
+``diff_indexes`` compares them with the live collection by ordered key
+pattern and options; ``sync_indexes`` builds what is missing and
+optionally drops undeclared indexes; ``index_usage`` reads
+``$indexStats`` so unused indexes can be found.
+
+A changed index (same key or name, other options) cannot be built next
+to the old one: MongoDB rejects a second index with the same key or
+name. Replacing it means dropping it first, and its queries scan the
+collection until the new build finishes, so sync only does that when
+asked (``rebuild_changed``) and otherwise reports the change.
+
+Builds are run by app.commands.indexes, not by the API workers, which
+only run ``check_indexes`` on startup to report a skipped migration. Since
+MongoDB 4.2 every build holds exclusive locks only at its start and end,
+so building on a live collection does not block reads and writes.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple, Type
+
+from beanie import Document
+from beanie.odm.utils.pydantic import get_model_fields
+from beanie.odm.utils.typing import get_index_attributes
+from pymongo import IndexModel
+
+logger = logging.getLogger(__name__)
+
+# Options that do not change what an index is
+IGNORED_OPTIONS = {"name", "v", "ns", "background"}
+
+
+class IndexSpec(NamedTuple):
+    """Key pattern and options of one index, comparable across declared/live"""
+    name: str
+    key: Tuple[Tuple[str, object], ...]
+    options: Dict[str, object]
+
+    @classmethod
+    def from_document(cls, document: dict) -> "IndexSpec":
+        key = document["key"]
+        key = tuple(key.items()) if isinstance(key, dict) else tuple(tuple(part) for part in key)
+        options = {
+            option: value for option, value in document.items()
+            if option != "key" and option not in IGNORED_OPTIONS and value is not False
+        }
+        return cls(document.get("name") or "_".join(f"{field}_{direction}" for field, direction in key), key, options)
+
+    def describe(self) -> str:
+        key = ", ".join(f"{field}:{direction}" for field, direction in self.key)
+        options = "".join(f" {option}={value}" for option, value in sorted(self.options.items()))
+        return f"{self.name} ({key}){options}"
+
+    def to_index_model(self) -> IndexModel:
+        return IndexModel(list(self.key), name=self.name, **self.options)
+
+
+class IndexDiff(NamedTuple):
+    """Declared vs live indexes of one collection"""
+    collection: str
+    missing: List[IndexSpec]  # declared, not built
+    changed: List[Tuple[IndexSpec, IndexSpec]]  # (live, declared): same key or name, other options
+    extra: List[IndexSpec]  # built, not declared
+    unchanged: List[IndexSpec]
+
+    @property
+    def in_sync(self) -> bool:
+        return not (self.missing or self.changed or self.extra)
+
+
+class IndexUsage(NamedTuple):
+    """$indexStats counters of one index"""
+    collection: str
+    name: str
+    ops: int
+    since: Optional[datetime]
+
+
+def declared_indexes(model: Type[Document]) -> List[IndexSpec]:
+    """Indexes a model declares (the model must be initialized)"""
+    specs: Dict[tuple, IndexSpec] = {}
+    for name, field in get_model_fields(model).items():
+        attributes = get_index_attributes(field)
+        if attributes is not None:
+            index = IndexModel([(field.alias or name, attributes[0])], **attributes[1])
+            spec = IndexSpec.from_document(index.document)
+            specs[spec.key] = spec
+    for index in model.get_settings().indexes or []:
+        # Beanie wraps entries in IndexModelField on init
+        index = getattr(index, "index", index)
+        if not isinstance(index, IndexModel):
+            index = IndexModel(index)
+        spec = IndexSpec.from_document(index.document)
+        specs[spec.key] = spec
+    return list(specs.values())
+
+
+async def live_indexes(model: Type[Document]) -> List[IndexSpec]:
+    """Indexes currently built on a model's collection, without _id"""
+    information = await model.get_motor_collection().index_information()
+    return [
+        IndexSpec.from_document({"name": name, **details})
+        for name, details in information.items()
+        if name != "_id_"
+    ]
+
+
+async def diff_indexes(model: Type[Document]) -> IndexDiff:
+    """Compare a model's declared indexes with its live collection"""
+    live = await live_indexes(model)
+    by_key = {spec.key: spec for spec in live}
+    by_name = {spec.name: spec for spec in live}
+    matched = set()
+    missing, changed, unchanged = [], [], []
+    for declared in declared_indexes(model):
+        current = by_key.get(declared.key) or by_name.get(declared.name)
+        if current is None:
+            missing.append(declared)
+            continue
+        matched.add(current.name)
+        if current.key == declared.key and current.options == declared.options:
+            unchanged.append(declared)
+        else:
+            changed.append((current, declared))
+    extra = [spec for spec in live if spec.name not in matched]
+    return IndexDiff(model.get_settings().name, missing, changed, extra, unchanged)
+
+
+async def sync_indexes(model: Type[Document], drop_extra: bool = False, rebuild_changed: bool = False) -> IndexDiff:
+    """Build missing indexes, optionally rebuild changed ones and drop undeclared ones"""
+    diff = await diff_indexes(model)
+    collection = model.get_motor_collection()
+    to_build = list(diff.missing)
+    for current, declared in diff.changed:
+        if not rebuild_changed:
+            logger.error(
+                f"{diff.collection}: {current.describe()} differs from {declared.describe()}; "
+                f"left as is, rebuild it with `indexes sync --rebuild-changed` when the collection is quiet"
+            )
+            continue
+        logger.warning(f"{diff.collection}: dropping {current.name} to rebuild it")
+        await collection.drop_index(current.name)
+        to_build.append(declared)
+    if drop_extra:
+        for spec in diff.extra:
+            await collection.drop_index(spec.name)
+
+    if to_build:
+        await collection.create_indexes([spec.to_index_model() for spec in to_build])
+        logger.info(f"{diff.collection}: built {', '.join(spec.name for spec in to_build)}")
+    return diff
+
+
+async def sync_all(
+    models: List[Type[Document]],
+    drop_extra: bool = False,
+    rebuild_changed: bool = False
+) -> List[IndexDiff]:
+    """sync_indexes for several collections at once"""
+    return list(await asyncio.gather(*(sync_indexes(model, drop_extra, rebuild_changed) for model in models)))
+
+
+async def check_indexes(models: List[Type[Document]]) -> List[IndexDiff]:
+    """Log collections whose declared indexes are missing or changed; returns them"""
+    diffs = await asyncio.gather(*(diff_indexes(model) for model in models))
+    stale = [diff for diff in diffs if diff.missing or diff.changed]
+    for diff in stale:
+        names = [spec.name for spec in diff.missing] + [declared.name for _, declared in diff.changed]
+        logger.error(
+            f"{diff.collection}: indexes {', '.join(names)} are not built as declared; "
+            f"run python -m app.commands.migrate"
+        )
+    return stale
+
+
+async def index_usage(model: Type[Document]) -> List[IndexUsage]:
+    """Operations served by each index since it was built or the server restarted"""
+    collection = model.get_motor_collection()
+    ops: Dict[str, int] = {}
+    since: Dict[str, datetime] = {}
+    # One row per index and server; add up the members reporting
+    async for row in collection.aggregate([{"$indexStats": {}}]):
+        name = row["name"]
+        accesses = row.get("accesses") or {}
+        ops[name] = ops.get(name, 0) + int(accesses.get("ops", 0))
+        if accesses.get("since") and (name not in since or accesses["since"] < since[name]):
+            since[name] = accesses["since"]
+    return sorted(
+        (IndexUsage(model.get_settings().name, name, count, since.get(name)) for name, count in ops.items()),
+        key=lambda usage: usage.ops
+    )
@@ -0,0 +1,269 @@
+"""
+Request and process metrics in the Prometheus text format.
+
+RequestMetricsMiddleware is a plain ASGI middleware: per request it takes
+two perf_counter readings and updates a few dict entries, all on the event
+loop thread, so no locks are needed. Routes are labelled with their
+template ("/api/v1/reservations/{reservation_id}"), never the raw path,
+so the number of series stays bounded; unmatched paths share one label.
+
+Event-loop lag is sampled by a background task that sleeps a fixed
+interval and measures how late it wakes up. Process RSS, CPU and thread
+counts are read from psutil when /metrics is scraped.
+"""
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover - psutil is optional
+    psutil = None
+
+LATENCY_BUCKETS_SECONDS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SIZE_BUCKETS_BYTES = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+LOOP_LAG_BUCKETS_SECONDS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1]
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Histogram:
+    """Cumulative-bucket histogram in Prometheus layout"""
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        running, result = 0, []
+        for bound, count in zip(self.buckets + ["+Inf"], self.counts):
+            running += count
+            result.append((str(bound), running))
+        return result
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return None
+        target = q * self.count
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            if running >= target:
+                return bound
+        return float("inf")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 1),
+            "mean_ms": round(self.total / self.count, 2) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99)
+        }
+
+    def render(self, name: str, labels: str = "") -> List[str]:
+        """_bucket, _sum and _count lines for one label set"""
+        prefix = f"{labels}," if labels else ""
+        lines = [f'{name}_bucket{{{prefix}le="{bound}"}} {count}' for bound, count in self.cumulative()]
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.total:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+class RequestMetrics:
+    """Per-route request counters, latency and size histograms, loop lag"""
+
+    def __init__(self, loop_lag_interval: float):
+        self.loop_lag_interval = loop_lag_interval
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self.requests: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.response_size: Dict[Tuple[str, str], Histogram] = {}
+        self.loop_lag = Histogram(LOOP_LAG_BUCKETS_SECONDS)
+        self.loop_lag_max = 0.0
+        self.loop_lag_last = 0.0
+        self._lag_sampled_at: Optional[float] = None
+        self._lag_task: Optional[asyncio.Task] = None
+        self._process = psutil.Process(os.getpid()) if psutil is not None else None
+        if self._process is not None:
+            self._process.cpu_percent()  # First call only sets the baseline
+
+    def observe(self, method: str, route: str, status: int, duration: float, size: int):
+        key = (method, route)
+        latency = self.latency.get(key)
+        if latency is None:
+            latency = self.latency[key] = Histogram(LATENCY_BUCKETS_SECONDS)
+            self.response_size[key] = Histogram(SIZE_BUCKETS_BYTES)
+        latency.observe(duration)
+        self.response_size[key].observe(size)
+        self.requests[(method, route, str(status))] += 1
+
+    async def start(self):
+        """Sample event-loop lag in the background"""
+        if self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._sample_loop_lag())
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+
+    async def _sample_loop_lag(self):
+        interval = self.loop_lag_interval
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter() - started - interval)
+            self.loop_lag.observe(lag)
+            self.loop_lag_max = max(self.loop_lag_max, lag)
+            self.loop_lag_last = lag
+            self._lag_sampled_at = started + interval + lag
+
+    def current_loop_lag(self) -> Optional[float]:
+        """Latest lag sample, or how overdue the next one is if that is larger
+
+        None when the sampler is not running.
+        """
+        if self._lag_task is None or self._lag_sampled_at is None:
+            return None
+        overdue = time.perf_counter() - self._lag_sampled_at - self.loop_lag_interval
+        return max(self.loop_lag_last, overdue)
+
+    def render_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP http_requests_total HTTP requests by method, route template and status",
+            "# TYPE http_requests_total counter"
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}')
+
+        lines += [
+            "# HELP http_requests_in_flight HTTP requests being handled",
+            "# TYPE http_requests_in_flight gauge"
+        ]
+        for method, count in sorted(self.in_flight.items()):
+            lines.append(f'http_requests_in_flight{{method="{method}"}} {count}')
+
+        lines += [
+            "# HELP http_request_duration_seconds HTTP request latency",
+            "# TYPE http_request_duration_seconds histogram"
+        ]
+        for (method, route), histogram in sorted(self.latency.items()):
+            lines += histogram.render("http_request_duration_seconds", f'method="{method}",route="{_escape(route)}"')
+
+        lines += [
+            "# HELP http_response_size_bytes HTTP response body size",
+            "# TYPE http_response_size_bytes histogram"
+        ]
+        for (method, route), histogram in sorted(self.response_size.items()):
+            lines += histogram.render("http_response_size_bytes", f'method="{method}",route="{_escape(route)}"')
+
+        lines += [
+            "# HELP event_loop_lag_seconds Delay of a timer on the event loop past its deadline",
+            "# TYPE event_loop_lag_seconds histogram"
+        ]
+        lines += self.loop_lag.render("event_loop_lag_seconds")
+        lines += [
+            "# HELP event_loop_lag_max_seconds Largest event-loop lag seen",
+            "# TYPE event_loop_lag_max_seconds gauge",
+            f"event_loop_lag_max_seconds {self.loop_lag_max:.6f}"
+        ]
+        lines += self._process_lines()
+        return "\n".join(lines) + "\n"
+
+    def _process_lines(self) -> List[str]:
+        if self._process is None:
+            return []
+        with self._process.oneshot():
+            memory = self._process.memory_info()
+            cpu = self._process.cpu_times()
+            lines = [
+                "# HELP process_resident_memory_bytes Resident set size",
+                "# TYPE process_resident_memory_bytes gauge",
+                f"process_resident_memory_bytes {memory.rss}",
+                "# HELP process_virtual_memory_bytes Virtual memory size",
+                "# TYPE process_virtual_memory_bytes gauge",
+                f"process_virtual_memory_bytes {memory.vms}",
+                "# HELP process_cpu_seconds_total User and system CPU time",
+                "# TYPE process_cpu_seconds_total counter",
+                f"process_cpu_seconds_total {cpu.user + cpu.system:.3f}",
+                "# HELP process_cpu_percent CPU usage since the previous scrape",
+                "# TYPE process_cpu_percent gauge",
+                f"process_cpu_percent {self._process.cpu_percent():.1f}",
+                "# HELP process_threads Threads in the worker process",
+                "# TYPE process_threads gauge",
+                f"process_threads {self._process.num_threads()}"
+            ]
+            if hasattr(self._process, "num_fds"):
+                lines += [
+                    "# HELP process_open_fds Open file descriptors",
+                    "# TYPE process_open_fds gauge",
+                    f"process_open_fds {self._process.num_fds()}"
+                ]
+        return lines
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware feeding RequestMetrics"""
+
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        method = scope["method"]
+        status_code = 500
+        size = 0
+
+        async def send_and_measure(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        metrics.in_flight[method] += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            metrics.in_flight[method] -= 1
+            route = scope.get("route")
+            metrics.observe(
+                method, getattr(route, "path", UNMATCHED_ROUTE), status_code, time.perf_counter() - started, size
+            )
+
+
+request_metrics = RequestMetrics(loop_lag_interval=settings.LOOP_LAG_INTERVAL)
@@ -0,0 +1,167 @@
+"""
+Keyset (cursor) pagination for Beanie queries.
+
+Pages are ordered by (sort field, _id) and each page continues strictly
+after the last row of the previous one, so page 10,000 costs the same
+index seek as page 1 instead of skipping everything before it. Cursors
+are opaque to clients: url-safe base64 of the sort field, direction, the
+stored sort value and the _id of the last row.
+"""
+import base64
+import binascii
+from datetime import date, datetime, time
+from typing import Any, Dict, Generic, List, Optional, Sequence, Tuple, Type, TypeVar, Union, get_args, get_origin
+
+from beanie import Document
+from beanie.odm.utils.encoder import Encoder
+from bson import ObjectId, json_util
+from fastapi import HTTPException, Query, status
+from pydantic import BaseModel
+from pymongo import ASCENDING, DESCENDING
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# Values a cursor may carry; anything else (a document, an array) would
+# become part of the query operator it is put in
+CURSOR_SCALARS = (str, int, float, bool, datetime, ObjectId, type(None))
+# Encoded to learn what a field of these types is stored as
+TYPE_SAMPLES = {datetime: datetime(2000, 1, 1), date: date(2000, 1, 1), time: time()}
+
+
+class Page(BaseModel, Generic[T]):
+    """One page of results and the cursor of the next one"""
+    items: List[T]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    limit: int
+
+
+class PageParams:
+    """Query parameters shared by list endpoints"""
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page"),
+        limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+        order: str = Query("asc", pattern="^(asc|desc)$")
+    ):
+        self.cursor = cursor
+        self.limit = limit
+        self.direction = ASCENDING if order == "asc" else DESCENDING
+
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid pagination cursor"
+    )
+
+
+def encode_cursor(sort_field: str, direction: int, value: Any, last_id: Any) -> str:
+    """Opaque cursor pointing just after (value, last_id)"""
+    payload = json_util.dumps({"f": sort_field, "d": direction, "v": value, "i": last_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def cursor_value_types(model: Type[Document], sort_field: str) -> Tuple[type, ...]:
+    """Types the stored value of ``sort_field`` can have in a cursor"""
+    if sort_field == "_id":
+        return (ObjectId,)
+    field = model.model_fields.get(sort_field)
+    if field is None:
+        return CURSOR_SCALARS
+    annotation = field.annotation
+    options = get_args(annotation) if get_origin(annotation) is Union else (annotation,)
+    encoder = Encoder(custom_encoders=model.get_settings().bson_encoders)
+    types = set()
+    for option in options:
+        base = next((t for t in getattr(option, "__mro__", ()) if t in TYPE_SAMPLES or t in CURSOR_SCALARS), None)
+        if base is None:
+            return CURSOR_SCALARS
+        if base in TYPE_SAMPLES:
+            base = type(encoder.encode(TYPE_SAMPLES[base]))
+        types.add(base)
+        if base is float:
+            # Whole floats come back from JSON as ints
+            types.add(int)
+    return tuple(types)
+
+
+def decode_cursor(
+    cursor: str,
+    sort_field: str,
+    direction: int,
+    value_types: Tuple[type, ...] = CURSOR_SCALARS
+) -> Tuple[Any, Any]:
+    """(value, _id) stored in a cursor; 400 if it is malformed, for another ordering or of the wrong type"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, last_id = payload["v"], payload["i"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise _invalid_cursor()
+    if payload.get("f") != sort_field or payload.get("d") != direction:
+        raise _invalid_cursor()
+    if not isinstance(value, value_types) or not isinstance(last_id, ObjectId):
+        raise _invalid_cursor()
+    return value, last_id
+
+
+def keyset_filter(sort_field: str, direction: int, value: Any, last_id: Any) -> Dict[str, Any]:
+    """Rows strictly after (value, last_id) in (sort_field, _id) order"""
+    op = "$gt" if direction == ASCENDING else "$lt"
+    if sort_field == "_id":
+        return {"_id": {op: last_id}}
+    return {
+        "$or": [
+            {sort_field: {op: value}},
+            {sort_field: value, "_id": {op: last_id}}
+        ]
+    }
+
+
+async def paginate(
+    model: Type[Document],
+    filters: Dict[str, Any],
+    sort_field: str = "_id",
+    cursor: Optional[str] = None,
+    limit: int = settings.DEFAULT_PAGE_SIZE,
+    direction: int = ASCENDING,
+    projection_model: Optional[Type[BaseModel]] = None
+) -> Page:
+    """
+    Fetch one page of ``model`` matching ``filters`` ordered by
+    (sort_field, _id). The sort field should lead (after any equality
+    filters) a compound index ending in _id.
+    """
+    limit = max(1, min(limit, settings.MAX_PAGE_SIZE))
+    query = dict(filters)
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_field, direction, cursor_value_types(model, sort_field))
+        query = {"$and": [filters, keyset_filter(sort_field, direction, value, last_id)]} if filters \
+            else keyset_filter(sort_field, direction, value, last_id)
+
+    sort: Sequence[Tuple[str, int]] = [(sort_field, direction)]
+    if sort_field != "_id":
+        sort = [(sort_field, direction), ("_id", direction)]
+
+    find = model.find(query).sort(sort).limit(limit + 1)
+    if projection_model is not None:
+        find = find.project(projection_model)
+    rows = await find.to_list()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        last_id = last.id
+        value = last_id
+        if sort_field != "_id":
+            encoder = Encoder(custom_encoders=model.get_settings().bson_encoders)
+            value = encoder.encode(getattr(last, sort_field))
+        next_cursor = encode_cursor(sort_field, direction, value, last_id)
+
+    return Page(items=rows, next_cursor=next_cursor, has_more=has_more, limit=limit)
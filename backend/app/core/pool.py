@@ -0,0 +1,128 @@
+"""
+MongoDB connection pool statistics.
+
+ConnectionPoolMonitor is a pymongo pool listener: per server address it
+counts connections checked out, callers waiting for a checkout and failed
+checkouts (pool timeouts). pymongo calls it from whichever thread does the
+checkout (Motor runs operations on executor threads), so updates take a
+lock; each event only bumps a few integers.
+"""
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from pymongo import monitoring
+from pymongo.common import MAX_POOL_SIZE
+
+
+class PoolStats:
+    """Counters of one server's connection pool"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.last_failure_at: Optional[float] = None  # time.monotonic()
+        self.last_failure_reason: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "max_size": self.max_size,
+            "open": self.open,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+            "last_failure_reason": self.last_failure_reason
+        }
+
+
+class ConnectionPoolMonitor(monitoring.ConnectionPoolListener):
+    """Connection pool usage per server address"""
+
+    def __init__(self):
+        self.pools: Dict[str, PoolStats] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, address) -> PoolStats:
+        key = "%s:%s" % address
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = PoolStats(MAX_POOL_SIZE)
+        return pool
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event.address).max_size = event.options.get("maxPoolSize", MAX_POOL_SIZE) or MAX_POOL_SIZE
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools.pop("%s:%s" % event.address, None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._pool(event.address).open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.open = max(0, pool.open - 1)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._pool(event.address).waiting += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.waiting = max(0, pool.waiting - 1)
+            pool.checkout_failures += 1
+            pool.last_failure_at = time.monotonic()
+            pool.last_failure_reason = str(event.reason)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.waiting = max(0, pool.waiting - 1)
+            pool.in_use += 1
+            pool.checkouts += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.in_use = max(0, pool.in_use - 1)
+
+    def saturated(self, max_usage: float, failure_window: float) -> Optional[str]:
+        """Why the pool cannot take more work, or None
+
+        A pool is saturated when callers are queued while at least
+        ``max_usage`` of its connections are checked out, or when a
+        checkout failed within the last ``failure_window`` seconds.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for address, pool in self.pools.items():
+                if pool.waiting and pool.in_use >= pool.max_size * max_usage:
+                    return f"{address}: {pool.in_use}/{pool.max_size} connections in use, {pool.waiting} waiting"
+                if pool.last_failure_at is not None and now - pool.last_failure_at <= failure_window:
+                    return f"{address}: connection checkout failed ({pool.last_failure_reason})"
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {address: pool.as_dict() for address, pool in self.pools.items()}
+
+
+pool_monitor = ConnectionPoolMonitor()
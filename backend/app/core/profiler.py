@@ -0,0 +1,351 @@
+"""
+MongoDB query profiler built on pymongo command monitoring.
+
+``query_profiler`` is registered as an event listener on the Motor client
+created in init_db. For every command it records:
+
+- a latency histogram per (collection, command);
+- slow commands (over SLOW_QUERY_MS) with their filter shape (values
+  replaced by "?"), logged and kept in a bounded list; the first time a
+  shape is slow it is explained (queryPlanner) in the background and the
+  winning plan is summarized, e.g. "FETCH <- IXSCAN doctor_id_1_date_1";
+- per-request counts: QueryCountMiddleware puts a RequestQueries in a
+  context variable (Motor copies the context into its executor threads),
+  and a request that repeats one shape N_PLUS_ONE_THRESHOLD times or more
+  is reported as an N+1 suspect for its route.
+
+Listener callbacks run on Motor's executor threads, so shared state is
+guarded by a lock and the explain is handed back to the event loop.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from datetime import datetime
+from threading import Lock
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from app.core.config import settings
+from app.core.metrics import UNMATCHED_ROUTE, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in milliseconds; the last bucket is +Inf
+LATENCY_BUCKETS_MS = [1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+QUERY_COUNT_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200]
+
+# Commands whose first value is the collection and that carry a filter
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "delete": "deletes",
+    "update": "updates",
+    "aggregate": "pipeline"
+}
+EXPLAINABLE = {"find", "count", "distinct", "aggregate", "findAndModify", "update", "delete"}
+# Session/cluster fields that explain does not accept inside the command
+COMMAND_ONLY_FIELDS = {"$db", "lsid", "$clusterTime", "txnNumber", "$readPreference", "readConcern", "writeConcern"}
+IGNORED_COMMANDS = {
+    "explain", "ping", "isMaster", "ismaster", "hello", "buildInfo", "saslStart", "saslContinue",
+    "endSessions", "getMore", "killCursors"
+}
+
+
+def query_shape(value: Any) -> Any:
+    """Filter with its values replaced by "?", keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = [query_shape(item) for item in value]
+        # $in lists and the like collapse to one placeholder
+        return "?" if all(shape == "?" for shape in shapes) else shapes
+    return "?"
+
+
+def command_shape(command_name: str, command: dict) -> str:
+    """Compact, stable string for the filter of a command"""
+    field = FILTER_FIELDS.get(command_name)
+    if field is None:
+        return ""
+    value = command.get(field)
+    if command_name in ("update", "delete"):
+        value = [statement.get("q") for statement in value or []][:1]
+    elif command_name == "aggregate":
+        value = [stage for stage in value or [] if "$match" in stage][:1]
+    return json.dumps(query_shape(value), sort_keys=True, default=str)
+
+
+def plan_summary(explain: dict) -> str:
+    """Winning plan as a chain of stages, e.g. "FETCH <- IXSCAN doctor_id_1_date_1" """
+    planner = explain.get("queryPlanner")
+    if planner is None:
+        # aggregate: the $cursor stage holds the query planner output
+        for stage in explain.get("stages") or []:
+            if "$cursor" in stage:
+                planner = stage["$cursor"].get("queryPlanner")
+                break
+    if not planner:
+        return "unknown"
+    plan = planner.get("winningPlan") or {}
+    plan = plan.get("queryPlan", plan)  # Slot-based engine wraps the classic tree
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        if plan.get("indexName"):
+            stage += f" {plan['indexName']}"
+        stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " <- ".join(stages)
+
+
+class RequestQueries:
+    """Commands issued while handling one HTTP request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration_ms = 0.0
+        self.shapes: Dict[Tuple[str, str, str], int] = defaultdict(int)
+
+    def repeated(self, threshold: int) -> List[Tuple[Tuple[str, str, str], int]]:
+        return [(shape, count) for shape, count in self.shapes.items() if count >= threshold]
+
+
+current_request_queries: ContextVar[Optional[RequestQueries]] = ContextVar("current_request_queries", default=None)
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """Command latency, slow queries and per-request query counts"""
+
+    def __init__(self, slow_ms: float, explain: bool, log_size: int, n_plus_one_threshold: int):
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = Lock()
+        self._pending: Dict[Tuple, Tuple[str, str, dict]] = {}
+        self._latency: Dict[Tuple[str, str], Histogram] = {}
+        self._failures: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._slow: Deque[dict] = deque(maxlen=log_size)
+        self._explained: Dict[str, str] = {}
+        self._routes: Dict[str, Histogram] = {}
+        self._n_plus_one: Dict[Tuple[str, str, str, str], dict] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client = None
+
+    def attach(self, client):
+        """Client used for explains, and the loop they run on"""
+        self._client = client
+        self._loop = asyncio.get_running_loop()
+
+    # pymongo listener interface (called on executor threads)
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = "-"
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                event.database_name, collection, event.command
+            )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finished(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finished(event, failed=True)
+
+    def _finished(self, event, failed: bool):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        database, collection, command = pending
+        name = event.command_name
+        duration_ms = event.duration_micros / 1000
+        shape = command_shape(name, command)
+
+        with self._lock:
+            histogram = self._latency.get((collection, name))
+            if histogram is None:
+                histogram = self._latency[(collection, name)] = Histogram(LATENCY_BUCKETS_MS)
+            histogram.observe(duration_ms)
+            if failed:
+                self._failures[(collection, name)] += 1
+
+        request = current_request_queries.get()
+        if request is not None:
+            request.count += 1
+            request.duration_ms += duration_ms
+            request.shapes[(collection, name, shape)] += 1
+
+        if duration_ms >= self.slow_ms and not failed:
+            self._record_slow(database, collection, name, shape, command, duration_ms)
+
+    def _record_slow(self, database: str, collection: str, name: str, shape: str, command: dict, duration_ms: float):
+        key = f"{collection}.{name} {shape}"
+        entry = {
+            "at": datetime.utcnow(),
+            "collection": collection,
+            "command": name,
+            "shape": shape,
+            "duration_ms": round(duration_ms, 1),
+            "plan": self._explained.get(key)
+        }
+        with self._lock:
+            self._slow.append(entry)
+            needs_explain = self.explain and name in EXPLAINABLE and key not in self._explained
+            if needs_explain:
+                self._explained[key] = None  # Explain each shape once
+        logger.warning(f"Slow query {duration_ms:.0f} ms: {collection}.{name} {shape}")
+        if needs_explain and self._loop is not None and self._client is not None:
+            explain = {k: v for k, v in command.items() if k not in COMMAND_ONLY_FIELDS}
+            self._loop.call_soon_threadsafe(
+                lambda: asyncio.ensure_future(self._explain(database, key, explain, entry))
+            )
+
+    async def _explain(self, database: str, key: str, command: dict, entry: dict):
+        try:
+            result = await self._client[database].command({"explain": command, "verbosity": "queryPlanner"})
+            summary = plan_summary(result)
+        except Exception as e:
+            summary = f"explain failed: {e}"
+        with self._lock:
+            self._explained[key] = summary
+            entry["plan"] = summary
+        logger.warning(f"Slow query plan for {key}: {summary}")
+
+    # Per-request accounting
+
+    def record_request(self, route: str, request: RequestQueries):
+        """Fold one request's query counts into the per-route stats"""
+        repeated = request.repeated(self.n_plus_one_threshold)
+        with self._lock:
+            histogram = self._routes.get(route)
+            if histogram is None:
+                histogram = self._routes[route] = Histogram(QUERY_COUNT_BUCKETS)
+            histogram.observe(request.count)
+            for (collection, name, shape), count in repeated:
+                key = (route, collection, name, shape)
+                suspect = self._n_plus_one.get(key)
+                if suspect is None:
+                    suspect = self._n_plus_one[key] = {
+                        "route": route, "collection": collection, "command": name, "shape": shape,
+                        "requests": 0, "max_repeats": 0
+                    }
+                    logger.warning(f"Possible N+1 in {route}: {collection}.{name} {shape} repeated {count} times")
+                suspect["requests"] += 1
+                suspect["max_repeats"] = max(suspect["max_repeats"], count)
+
+    # Reporting
+
+    def reset(self):
+        with self._lock:
+            self._latency.clear()
+            self._failures.clear()
+            self._slow.clear()
+            self._explained.clear()
+            self._routes.clear()
+            self._n_plus_one.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            commands = [
+                {"collection": collection, "command": name, "failures": self._failures.get((collection, name), 0),
+                 **histogram.as_dict()}
+                for (collection, name), histogram in self._latency.items()
+            ]
+            routes = [
+                {"route": route, "requests": histogram.count,
+                 "queries_mean": round(histogram.total / histogram.count, 2) if histogram.count else None,
+                 "queries_p95": histogram.quantile(0.95)}
+                for route, histogram in self._routes.items()
+            ]
+            return {
+                "slow_query_ms": self.slow_ms,
+                "commands": sorted(commands, key=lambda row: row["total_ms"], reverse=True),
+                "slow_queries": list(reversed(self._slow)),
+                "routes": sorted(routes, key=lambda row: row["queries_mean"] or 0, reverse=True),
+                "n_plus_one": sorted(self._n_plus_one.values(), key=lambda row: row["max_repeats"], reverse=True)
+            }
+
+    def render_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP mongodb_command_duration_milliseconds MongoDB command latency",
+            "# TYPE mongodb_command_duration_milliseconds histogram"
+        ]
+        with self._lock:
+            for (collection, name), histogram in sorted(self._latency.items()):
+                lines += histogram.render(
+                    "mongodb_command_duration_milliseconds", f'collection="{collection}",command="{name}"'
+                )
+            lines += [
+                "# HELP mongodb_command_failures_total Failed MongoDB commands",
+                "# TYPE mongodb_command_failures_total counter"
+            ]
+            for (collection, name), count in sorted(self._failures.items()):
+                lines.append(f'mongodb_command_failures_total{{collection="{collection}",command="{name}"}} {count}')
+            lines += [
+                "# HELP mongodb_slow_queries_logged Slow queries currently in the slow query log",
+                "# TYPE mongodb_slow_queries_logged gauge",
+                f"mongodb_slow_queries_logged {len(self._slow)}",
+                "# HELP http_request_db_queries MongoDB commands per HTTP request",
+                "# TYPE http_request_db_queries histogram"
+            ]
+            for route, histogram in sorted(self._routes.items()):
+                lines += histogram.render("http_request_db_queries", f'route="{route}"')
+            lines += [
+                "# HELP http_request_n_plus_one_total Requests repeating one query shape at least the N+1 threshold",
+                "# TYPE http_request_n_plus_one_total counter"
+            ]
+            for suspect in self._n_plus_one.values():
+                lines.append(
+                    f'http_request_n_plus_one_total{{route="{suspect["route"]}",collection="{suspect["collection"]}",'
+                    f'command="{suspect["command"]}"}} {suspect["requests"]}'
+                )
+        return "\n".join(lines) + "\n"
+
+
+class QueryCountMiddleware:
+    """ASGI middleware counting the MongoDB commands of each HTTP request"""
+
+    def __init__(self, app, profiler: QueryProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = current_request_queries.set(queries)
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(queries.count).encode()))
+                headers.append((b"x-db-time-ms", f"{queries.duration_ms:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            current_request_queries.reset(token)
+            route = scope.get("route")
+            self.profiler.record_request(getattr(route, "path", UNMATCHED_ROUTE), queries)
+
+
+query_profiler = QueryProfiler(
+    slow_ms=settings.SLOW_QUERY_MS,
+    explain=settings.SLOW_QUERY_EXPLAIN,
+    log_size=settings.SLOW_QUERY_LOG_SIZE,
+    n_plus_one_threshold=settings.N_PLUS_ONE_THRESHOLD
+)
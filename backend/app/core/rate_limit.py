@@ -0,0 +1,312 @@
+"""
+Rate limiting shared across workers.
+
+Limits use GCRA (generic cell rate algorithm): a key's state is a single
+"theoretical arrival time" (TAT) advancing by window / requests on each
+admitted request, which allows bursts of up to ``requests`` and then a
+steady rate, with no per-request timestamps to store.
+
+With Redis configured, the TAT lives in Redis and a Lua script admits
+requests atomically. Workers do not call it per request: each one leases
+a share of the limit (RATE_LIMIT_LEASE_FRACTION, at least one request)
+and spends it locally, so a caller under the limit costs a dict lookup
+and a decrement. Leases left unused for RATE_LIMIT_LEASE_TTL seconds are
+handed back to Redis by a background sweep, so tokens parked on one
+worker do not count against a caller who moved to another. Without
+Redis, or when Redis fails, the same GCRA runs in process, per worker.
+
+Every request is checked against the default limit (RATE_LIMIT_REQUESTS
+per RATE_LIMIT_WINDOW); ROUTE_LIMITS adds stricter limits to expensive or
+abusable routes. Keys are per user for requests with a valid bearer
+token and per client address otherwise. Behind a reverse proxy every
+peer address is the proxy's, so RATE_LIMIT_CLIENT_HEADER names the header
+the proxy puts the client address in; it is only read from the peers in
+RATE_LIMIT_TRUSTED_PROXIES, so leaving that list empty ignores the header.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import defaultdict
+from typing import Collection, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.core.security import verify_token
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "rate-limit:"
+EXEMPT_PREFIXES = ("/health", "/metrics", "/docs", "/redoc", "/openapi.json")
+
+# KEYS[1] TAT key; ARGV interval, window, requests wanted, requests returned.
+# Returns {granted, retry_after}; grants fewer than wanted near the limit.
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+local refund = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+tat = math.max(tat - refund * interval, now)
+local granted = math.max(0, math.min(want, math.floor((now + window - tat) / interval + 1e-9)))
+tat = tat + granted * interval
+if tat > now then
+    redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - now) * 1000))
+else
+    redis.call('DEL', KEYS[1])
+end
+if granted > 0 then
+    return {granted, '0'}
+end
+return {0, tostring(tat + interval - window - now)}
+"""
+
+
+class RateLimit(NamedTuple):
+    """``requests`` per ``window`` seconds, as a burst or spread out"""
+    requests: int
+    window: float
+
+    @property
+    def interval(self) -> float:
+        return self.window / self.requests
+
+
+class RouteLimit(NamedTuple):
+    """Extra limit on one route, on top of the default limit"""
+    name: str
+    method: str
+    path: str
+    limit: RateLimit
+
+
+ROUTE_LIMITS: List[RouteLimit] = [
+    RouteLimit("login", "POST", "/api/v1/auth/login", RateLimit(10, 60)),
+    RouteLimit("bulk_reservations", "POST", "/api/v1/reservations/bulk", RateLimit(10, 60)),
+    RouteLimit("export_reservations", "GET", "/api/v1/reservations/export", RateLimit(5, 60)),
+    RouteLimit("materialize_series", "POST", "/api/v1/series/materialize", RateLimit(5, 60))
+]
+
+
+class Lease:
+    """Requests granted by Redis and not yet spent by this worker"""
+    __slots__ = ("limit", "tokens", "expires_at")
+
+    def __init__(self, limit: RateLimit, tokens: int, expires_at: float):
+        self.limit = limit
+        self.tokens = tokens
+        self.expires_at = expires_at
+
+
+class RateLimiter:
+    """GCRA limiter with a local lease fast path over a shared Redis state"""
+
+    def __init__(self, lease_fraction: float, lease_ttl: float):
+        self.lease_fraction = lease_fraction
+        self.lease_ttl = lease_ttl
+        self.leases: Dict[str, Lease] = {}
+        self.local_tat: Dict[str, float] = {}
+        self.rejected: Dict[str, int] = defaultdict(int)
+        self.redis_calls = 0
+        self._script = None
+        self._script_redis = None
+        self._sweeper: Optional[asyncio.Task] = None
+        self._last_redis_error = 0.0
+
+    async def start(self):
+        """Return expired leases and prune local state in the background"""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        try:
+            await self.sweep(expire_all=True)
+        except Exception as e:
+            logger.warning(f"Rate limiter could not return leases: {e}")
+
+    async def acquire(self, key: str, limit: RateLimit) -> Optional[float]:
+        """Admit one request: None if allowed, else seconds until it would be"""
+        now = time.monotonic()
+        lease = self.leases.get(key)
+        if lease is not None and lease.tokens and lease.expires_at > now:
+            lease.tokens -= 1
+            return None
+
+        redis = get_redis()
+        if redis is None:
+            return self._acquire_local(key, limit, now)
+
+        refund = self.leases.pop(key).tokens if lease is not None else 0
+        try:
+            granted, retry_after = await self._call_script(
+                redis, key, limit, max(1, int(limit.requests * self.lease_fraction)), refund
+            )
+        except Exception as e:
+            if now - self._last_redis_error > 10:
+                logger.warning(f"Rate limiter falling back to per-worker limits: {e}")
+                self._last_redis_error = now
+            return self._acquire_local(key, limit, now)
+
+        if not granted:
+            return retry_after
+        if granted > 1:
+            # Another request for the key may have leased meanwhile
+            lease = self.leases.get(key)
+            if lease is None:
+                self.leases[key] = Lease(limit, granted - 1, now + self.lease_ttl)
+            else:
+                lease.tokens += granted - 1
+                lease.expires_at = now + self.lease_ttl
+        return None
+
+    def _acquire_local(self, key: str, limit: RateLimit, now: float) -> Optional[float]:
+        tat = max(self.local_tat.get(key, now), now) + limit.interval
+        if tat - now > limit.window:
+            return tat - limit.window - now
+        self.local_tat[key] = tat
+        return None
+
+    async def _call_script(self, redis, key: str, limit: RateLimit, want: int, refund: int) -> Tuple[int, float]:
+        if self._script is None or self._script_redis is not redis:
+            self._script = redis.register_script(GCRA_SCRIPT)
+            self._script_redis = redis
+        self.redis_calls += 1
+        granted, retry_after = await self._script(
+            keys=[REDIS_KEY_PREFIX + key],
+            args=[limit.interval, limit.window, want, refund]
+        )
+        return int(granted), float(retry_after)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.lease_ttl)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.warning(f"Rate limiter sweep failed: {e}")
+
+    async def sweep(self, expire_all: bool = False):
+        """Hand unused expired leases back to Redis and drop idle local keys"""
+        now = time.monotonic()
+        expired = [
+            (key, lease) for key, lease in self.leases.items()
+            if expire_all or lease.expires_at <= now
+        ]
+        for key, _ in expired:
+            del self.leases[key]
+        for key in [key for key, tat in self.local_tat.items() if tat <= now]:
+            del self.local_tat[key]
+
+        redis = get_redis()
+        if redis is None:
+            return
+        for key, lease in expired:
+            if lease.tokens:
+                await self._call_script(redis, key, lease.limit, 0, lease.tokens)
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP rate_limit_rejections_total Requests rejected with 429, by limit",
+            "# TYPE rate_limit_rejections_total counter"
+        ]
+        for name, count in sorted(self.rejected.items()):
+            lines.append(f'rate_limit_rejections_total{{limit="{name}"}} {count}')
+        lines += [
+            "# HELP rate_limit_redis_calls_total Lease requests sent to Redis",
+            "# TYPE rate_limit_redis_calls_total counter",
+            f"rate_limit_redis_calls_total {self.redis_calls}"
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def default_limit() -> RateLimit:
+    return RateLimit(settings.RATE_LIMIT_REQUESTS, settings.RATE_LIMIT_WINDOW)
+
+
+_ROUTE_LIMITS_BY_PATH = {(rule.method, rule.path): rule for rule in ROUTE_LIMITS}
+
+
+def client_identity(scope, client_header: bytes = b"", trusted_proxies: Collection[str] = ()) -> str:
+    """user:<id> for a valid bearer token, else ip:<client address>"""
+    forwarded = None
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    return "user:" + verify_token(token)
+                except HTTPException:
+                    pass
+        elif client_header and name == client_header:
+            forwarded = value
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if forwarded is not None and peer in trusted_proxies:
+        # The proxy appends the address it saw; earlier entries come from the client
+        address = forwarded.decode("latin-1").rsplit(",", 1)[-1].strip()
+        if address:
+            return "ip:" + address
+    return "ip:" + peer
+
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 with Retry-After over the limit"""
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+        self.default = default_limit()
+        self.client_header = settings.RATE_LIMIT_CLIENT_HEADER.lower().encode("latin-1")
+        self.trusted_proxies = frozenset(settings.RATE_LIMIT_TRUSTED_PROXIES)
+        if self.client_header and not self.trusted_proxies:
+            logger.warning("RATE_LIMIT_CLIENT_HEADER is ignored until RATE_LIMIT_TRUSTED_PROXIES lists the proxies")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        identity = client_identity(scope, self.client_header, self.trusted_proxies)
+        rule = _ROUTE_LIMITS_BY_PATH.get((scope["method"], scope["path"].rstrip("/") or "/"))
+        if rule is not None:
+            retry_after = await self.limiter.acquire(f"{rule.name}:{identity}", rule.limit)
+            if retry_after is not None:
+                await self._reject(send, rule.name, rule.limit, retry_after)
+                return
+        retry_after = await self.limiter.acquire(f"default:{identity}", self.default)
+        if retry_after is not None:
+            await self._reject(send, "default", self.default, retry_after)
+            return
+        await self.app(scope, receive, send)
+
+    async def _reject(self, send, name: str, limit: RateLimit, retry_after: float):
+        self.limiter.rejected[name] += 1
+        body = b'{"detail":"Too many requests"}'
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+                (b"x-ratelimit-limit", f"{limit.requests};w={int(limit.window)}".encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+rate_limiter = RateLimiter(
+    lease_fraction=settings.RATE_LIMIT_LEASE_FRACTION,
+    lease_ttl=settings.RATE_LIMIT_LEASE_TTL
+)
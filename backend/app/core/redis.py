@@ -0,0 +1,30 @@
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - redis is optional
+    aioredis = None
+
+
+class RedisConnection:
+    client = None
+
+redis_connection = RedisConnection()
+
+def get_redis():
+    """Get the shared Redis client, or None when Redis is not configured"""
+    if redis_connection.client is None and settings.REDIS_URL and aioredis is not None:
+        redis_connection.client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        logger.info("Redis client created")
+    return redis_connection.client
+
+async def close_redis():
+    """Close the shared Redis client"""
+    if redis_connection.client is not None:
+        await redis_connection.client.close()
+        redis_connection.client = None
+        logger.info("Redis connection closed")
@@ -1,12 +1,25 @@
+import asyncio
+import hashlib
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union, Optional
+from typing import Any, Dict, Union, Optional, Tuple
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
 
 def create_access_token(subject: Union[str, Any], expires_delta: timedelta = None) -> str:
     """Create JWT access token"""
@@ -21,24 +34,158 @@ def create_access_token(subject: Union[str, Any], expires_delta: timedelta = Non
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> str:
-    """Verify JWT token and return subject"""
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid authentication credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def token_digest(token: str) -> str:
+    """Digest used as the cache/revocation key of a token"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class TokenRevocationList:
+    """
+    Revoked token digests with O(1) lookup.
+
+    Entries expire with the token itself. When Redis is configured,
+    revocations are stored there and broadcast so every worker sees them.
+    """
+    
+    REDIS_KEY_PREFIX = "token-revoked:"
+    CHANNEL = "token-revoked"
+    PURGE_INTERVAL = 60.0  # seconds between sweeps of expired entries
+    
+    def __init__(self):
+        self._revoked: Dict[str, float] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._purged_at = time.monotonic()
+    
+    def __len__(self) -> int:
+        return len(self._revoked)
+    
+    def is_revoked(self, digest: str) -> bool:
+        expires_at = self._revoked.get(digest)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            self._revoked.pop(digest, None)
+            return False
+        return True
+    
+    def add(self, digest: str, expires_at: float):
+        if time.monotonic() - self._purged_at >= self.PURGE_INTERVAL:
+            self.purge()
+        self._revoked[digest] = expires_at
+        token_cache.delete(digest)
+    
+    def purge(self):
+        """Drop entries whose tokens have expired anyway"""
+        self._purged_at = time.monotonic()
+        now = time.time()
+        for digest in [d for d, exp in self._revoked.items() if exp <= now]:
+            self._revoked.pop(digest, None)
+    
+    async def revoke(self, token: str):
+        """Revoke a token until it expires"""
+        try:
+            claims = jwt.get_unverified_claims(token)
+            expires_at = float(claims.get("exp", time.time() + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60))
+        except JWTError:
+            return
+        digest = token_digest(token)
+        self.add(digest, expires_at)
+        
+        redis = get_redis()
+        if redis is not None:
+            ttl = max(1, int(expires_at - time.time()))
+            try:
+                await redis.set(self.REDIS_KEY_PREFIX + digest, expires_at, ex=ttl)
+                await redis.publish(self.CHANNEL, f"{digest}:{expires_at}")
+            except Exception as e:
+                # Still revoked on this worker; the others only learn of it
+                # if the key was written before the failure
+                logger.warning(f"Token revocation not shared: {e}")
+    
+    async def start(self):
+        """Load shared revocations and follow new ones"""
+        redis = get_redis()
+        if redis is None or self._listener is not None:
+            return
+        pubsub = await self._subscribe(redis)
+        self._listener = asyncio.create_task(self._listen(redis, pubsub))
+    
+    async def _subscribe(self, redis):
+        """
+        Subscribe, then read every shared revocation: anything revoked while
+        unsubscribed (startup, lost connection) is in Redis, anything after
+        arrives as a message.
+        """
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(self.CHANNEL)
+        async for key in redis.scan_iter(match=self.REDIS_KEY_PREFIX + "*"):
+            expires_at = await redis.get(key)
+            if expires_at is not None:
+                self.add(key[len(self.REDIS_KEY_PREFIX):], float(expires_at))
+        return pubsub
+    
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+    
+    async def _listen(self, redis, pubsub):
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = await self._subscribe(redis)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        digest, expires_at = message["data"].rsplit(":", 1)
+                        self.add(digest, float(expires_at))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Token revocation listener error: {e}")
+                pubsub = None
+                await asyncio.sleep(1)
+
+# Validated claims keyed by token digest, each entry living until the token's exp
+token_cache = TTLCache(
+    maxsize=settings.TOKEN_CACHE_SIZE,
+    ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+token_revocation_list = TokenRevocationList()
+
+def decode_token(token: str) -> dict:
+    """Verify JWT signature and expiry, returning its claims"""
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return user_id
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
     except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception()
+
+def verify_token(token: str) -> str:
+    """Verify JWT token and return subject"""
+    digest = token_digest(token)
+    if token_revocation_list.is_revoked(digest):
+        raise _credentials_exception()
+    
+    payload = token_cache.get(digest)
+    if payload is None:
+        payload = decode_token(token)
+        remaining = float(payload.get("exp", 0)) - time.time()
+        if remaining > 0:
+            token_cache.set(digest, payload, ttl=remaining)
+    
+    user_id: str = payload.get("sub")
+    if user_id is None:
+        raise _credentials_exception()
+    return user_id
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password against hash"""
@@ -48,6 +195,70 @@ def get_password_hash(password: str) -> str:
     """Hash password"""
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """
+    Async bcrypt hashing on a bounded thread or process pool.
+
+    bcrypt takes 100-300 ms per call; running it inline in an async handler
+    blocks the event loop for every other request. The semaphore caps how
+    many calls can be queued or running at once per worker.
+    """
+    
+    def __init__(self, pool: str = "thread", max_workers: int = 4, max_concurrency: int = 16):
+        self.pool = pool
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+    
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.pool == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="password-hash"
+                )
+        return self._executor
+    
+    async def _run(self, func, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+    
+    async def hash(self, password: str) -> str:
+        """Hash password off the event loop"""
+        return await self._run(get_password_hash, password)
+    
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify password off the event loop"""
+        return await self._run(verify_password, plain_password, hashed_password)
+    
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify password and return a new hash when the stored one uses
+        outdated parameters (e.g. BCRYPT_ROUNDS changed)
+        """
+        return await self._run(verify_and_update_password, plain_password, hashed_password)
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify password, returning a replacement hash if it needs rehashing"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+password_hasher = PasswordHasher(
+    pool=settings.PASSWORD_HASH_POOL,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_concurrency=settings.PASSWORD_HASH_MAX_CONCURRENCY
+)
+
 def generate_password_reset_token(email: str) -> str:
     """Generate password reset token"""
     delta = timedelta(hours=24)  # Token expires in 24 hours
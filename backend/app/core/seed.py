@@ -0,0 +1,164 @@
+"""
+Development sample data.
+
+Seeding is idempotent: one query finds which sample users already exist,
+only the missing passwords are hashed (concurrently, off the event loop),
+and each collection gets a single unordered bulk_write of ``$setOnInsert``
+upserts keyed by a unique field, so re-running it (or several workers
+starting at once) never duplicates or overwrites anything. A sample
+document clashing with an existing one on another unique field (say, a
+username taken under a different email) is skipped, not fatal. Sample
+boxes are only added to an empty boxes collection, as before. Seeding is
+skipped when SEED_INITIAL_DATA is false and always in production.
+
+For large synthetic datasets see app/commands/generate_load_data.py.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import List, Type
+
+from beanie import Document
+from beanie.odm.utils.encoder import Encoder
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.core.security import password_hasher
+from app.models.box import Box
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+SAMPLE_USERS = [
+    {
+        "email": "admin@redsalud.cl",
+        "username": "admin",
+        "full_name": "Administrador Sistema",
+        "password": "admin123",
+        "role": "admin",
+        "is_active": True,
+        "is_verified": True
+    },
+    {
+        "email": "doctor@redsalud.cl",
+        "username": "doctor1",
+        "full_name": "Dr. Juan Pérez",
+        "password": "doctor123",
+        "role": "doctor",
+        "is_active": True,
+        "is_verified": True,
+        "specialization": "Medicina General",
+        "license_number": "12345678"
+    },
+    {
+        "email": "patient@redsalud.cl",
+        "username": "patient1",
+        "full_name": "María González",
+        "password": "patient123",
+        "role": "patient",
+        "is_active": True,
+        "is_verified": True,
+        "rut": "12345678-9",
+        "phone": "+56912345678",
+        "date_of_birth": "1990-05-15"
+    }
+]
+
+SAMPLE_BOXES = [
+    {
+        "name": "Box 1 - Consulta General",
+        "description": "Box para consultas médicas generales",
+        "location": "Planta 1 - Ala Norte",
+        "capacity": 2,
+        "equipment": ["Camilla", "Escritorio", "Computador"],
+        "status": "available"
+    },
+    {
+        "name": "Box 2 - Cardiología",
+        "description": "Box especializado en cardiología",
+        "location": "Planta 2 - Ala Sur",
+        "capacity": 3,
+        "equipment": ["Camilla", "ECG", "Monitor", "Escritorio"],
+        "status": "available"
+    },
+    {
+        "name": "Box 3 - Procedimientos",
+        "description": "Box para procedimientos menores",
+        "location": "Planta 1 - Ala Sur",
+        "capacity": 4,
+        "equipment": ["Camilla", "Mesa instrumental", "Lámpara", "Monitor"],
+        "status": "available"
+    }
+]
+
+
+def should_seed() -> bool:
+    """Sample data is only ever loaded outside production"""
+    return settings.SEED_INITIAL_DATA and settings.ENVIRONMENT != "production"
+
+
+def encode_document(document: Document) -> dict:
+    """Document as stored by Beanie, without _id so the server assigns it on insert"""
+    encoded = Encoder(custom_encoders=document.get_settings().bson_encoders).encode(document)
+    encoded.pop("_id", None)
+    return encoded
+
+
+async def upsert_missing(model: Type[Document], key: str, documents: List[Document]) -> int:
+    """Insert the documents whose key is not taken yet; returns how many were inserted"""
+    if not documents:
+        return 0
+    operations = [
+        UpdateOne({key: getattr(document, key)}, {"$setOnInsert": encode_document(document)}, upsert=True)
+        for document in documents
+    ]
+    try:
+        result = await model.get_motor_collection().bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        for error in errors:
+            document = documents[error["index"]]
+            logger.warning(f"Sample {model.__name__} {getattr(document, key)} skipped: {error['errmsg']}")
+        return e.details.get("nUpserted", 0)
+    return result.upserted_count
+
+
+async def seed_initial_data():
+    """Load the development sample users and boxes if they are missing"""
+    started = time.perf_counter()
+    emails = [user["email"] for user in SAMPLE_USERS]
+    existing = {
+        row["email"]
+        for row in await User.get_motor_collection().find({"email": {"$in": emails}}, {"email": 1}).to_list(None)
+    }
+    missing = [user for user in SAMPLE_USERS if user["email"] not in existing]
+    hashes = await asyncio.gather(*(password_hasher.hash(user["password"]) for user in missing))
+
+    now = datetime.utcnow()
+    users = [
+        User(
+            **{field: value for field, value in user.items() if field != "password"},
+            hashed_password=hashed_password,
+            created_at=now,
+            updated_at=now
+        )
+        for user, hashed_password in zip(missing, hashes)
+    ]
+    boxes = []
+    if await Box.get_motor_collection().find_one({}, {"_id": 1}) is None:
+        boxes = [Box(**box, created_at=now, updated_at=now) for box in SAMPLE_BOXES]
+
+    created_users, created_boxes = await asyncio.gather(
+        upsert_missing(User, "email", users),
+        upsert_missing(Box, "name", boxes)
+    )
+    logger.info(
+        f"Initial data: {created_users} users and {created_boxes} boxes created "
+        f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
@@ -0,0 +1,45 @@
+"""
+Startup timings.
+
+The lifespan hook runs independent startup steps concurrently; each one
+is wrapped in ``startup_timings.run`` so its duration is recorded. The
+breakdown is logged once the worker is ready and reported by /health/details.
+"""
+import logging
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimings:
+    """Wall-clock duration of each startup step, in milliseconds"""
+
+    def __init__(self):
+        self.steps: Dict[str, float] = {}
+        self.total_ms: Optional[float] = None
+        self._started: Optional[float] = None
+
+    def start(self):
+        self.steps = {}
+        self.total_ms = None
+        self._started = time.perf_counter()
+
+    async def run(self, name: str, step: Awaitable) -> Any:
+        """Await a startup step, recording how long it took"""
+        started = time.perf_counter()
+        try:
+            return await step
+        finally:
+            self.steps[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def finish(self):
+        self.total_ms = round((time.perf_counter() - self._started) * 1000, 1)
+        breakdown = ", ".join(f"{name} {ms:.0f} ms" for name, ms in self.steps.items())
+        logger.info(f"Startup completed in {self.total_ms:.0f} ms ({breakdown})")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"total_ms": self.total_ms, "steps": dict(self.steps)}
+
+
+startup_timings = StartupTimings()
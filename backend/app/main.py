@@ -1,22 +1,66 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+import asyncio
 import uvicorn
 from contextlib import asynccontextmanager
 
-from app.core.config import settings
+from app.core.config import settings, create_directories
 from app.core.database import init_db, close_db
-from app.api.v1 import auth, users, boxes, reservations, schedules
+from app.core.health import health_monitor
+from app.core.metrics import RequestMetricsMiddleware, request_metrics
+from app.core.profiler import QueryCountMiddleware, query_profiler
+from app.core.rate_limit import RateLimitMiddleware, rate_limiter
+from app.core.redis import close_redis
+from app.core.security import password_hasher, token_revocation_list
+from app.core.startup import startup_timings
+from app.services.availability_index import availability_index
+from app.services.box_matcher import box_matcher
+from app.services.occupancy_feed import occupancy_feed
+from app.services.response_cache import ResponseCacheMiddleware, response_cache
+from app.services.user_cache import user_cache
+from app.api.v1 import auth, users, boxes, reservations, schedules, series, stats, profiler, occupancy
+from app.api.v1.auth import get_current_admin
+from app.models.user import User
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    await init_db()
+    # Startup: independent steps run concurrently, each one timed
+    startup_timings.start()
+    steps = [
+        startup_timings.run("directories", asyncio.to_thread(create_directories)),
+        startup_timings.run("database", init_db()),
+        startup_timings.run("user_cache", user_cache.start()),
+        startup_timings.run("token_revocations", token_revocation_list.start()),
+        startup_timings.run("box_matcher", box_matcher.start()),
+        startup_timings.run("availability_index", availability_index.start())
+    ]
+    if settings.RESPONSE_CACHE_ENABLED:
+        steps.append(startup_timings.run("response_cache", response_cache.start()))
+    if settings.METRICS_ENABLED:
+        steps.append(startup_timings.run("metrics", request_metrics.start()))
+    if settings.RATE_LIMIT_ENABLED:
+        steps.append(startup_timings.run("rate_limiter", rate_limiter.start()))
+    await asyncio.gather(*steps)
+    await health_monitor.start()
+    await occupancy_feed.start()
+    startup_timings.finish()
     yield
     # Shutdown
+    await health_monitor.stop()
+    await occupancy_feed.stop()
+    await rate_limiter.stop()
+    await request_metrics.stop()
+    await token_revocation_list.stop()
+    await response_cache.stop()
+    await box_matcher.stop()
+    await availability_index.stop()
+    await user_cache.stop()
+    await close_redis()
     await close_db()
+    password_hasher.shutdown()
 
 
 # Create FastAPI application
@@ -29,12 +73,20 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Cached GET responses for box/schedule listings; innermost, so CORS and rate limits still apply
+if settings.RESPONSE_CACHE_ENABLED:
+    app.add_middleware(ResponseCacheMiddleware, cache=response_cache)
+
 # Add security middleware
 app.add_middleware(
     TrustedHostMiddleware, 
     allowed_hosts=settings.ALLOWED_HOSTS
 )
 
+# Rate limiting; inside CORS so 429 responses still carry CORS headers
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -44,12 +96,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Count MongoDB commands per request (X-DB-Queries header, N+1 detection)
+if settings.QUERY_PROFILING:
+    app.add_middleware(QueryCountMiddleware, profiler=query_profiler)
+
+# Request latency/size metrics; added last so it is the outermost middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(RequestMetricsMiddleware, metrics=request_metrics)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/api/v1/users", tags=["Users"])
 app.include_router(boxes.router, prefix="/api/v1/boxes", tags=["Boxes"])
 app.include_router(reservations.router, prefix="/api/v1/reservations", tags=["Reservations"])
 app.include_router(schedules.router, prefix="/api/v1/schedules", tags=["Schedules"])
+app.include_router(series.router, prefix="/api/v1/series", tags=["Reservation series"])
+app.include_router(stats.router, prefix="/api/v1/stats", tags=["Statistics"])
+app.include_router(profiler.router, prefix="/api/v1/profiler", tags=["Profiler"])
+app.include_router(occupancy.router, prefix="/api/v1/occupancy", tags=["Occupancy"])
 
 
 @app.get("/")
@@ -65,12 +129,49 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint for monitoring"""
-    return {
-        "status": "healthy",
-        "service": "RedSalud API",
-        "version": "1.0.0"
-    }
+    """Health check endpoint for monitoring (503 when not ready); details are in /health/details"""
+    ready, _ = health_monitor.readiness()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "healthy" if ready else "unhealthy", "service": "RedSalud API", "version": "1.0.0"}
+    )
+
+
+@app.get("/health/details")
+async def health_details(current_user: User = Depends(get_current_admin)):
+    """Cached probe results, database stats, pool and startup figures (admin only)"""
+    return {**health_monitor.report(), "startup": startup_timings.as_dict()}
+
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the worker is up and its event loop answers"""
+    return health_monitor.liveness()
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: MongoDB reachable, pool not exhausted, event loop not lagging"""
+    ready, failures = health_monitor.readiness()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not ready", "failures": failures}
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    sections = []
+    if settings.METRICS_ENABLED:
+        sections.append(request_metrics.render_prometheus())
+    if settings.QUERY_PROFILING:
+        sections.append(query_profiler.render_prometheus())
+    if settings.RATE_LIMIT_ENABLED:
+        sections.append(rate_limiter.render_prometheus())
+    if settings.RESPONSE_CACHE_ENABLED:
+        sections.append(response_cache.render_prometheus())
+    return "".join(sections)
 
 
 @app.exception_handler(404)
@@ -1,7 +1,7 @@
-from beanie import Document, Indexed
+from beanie import Document, Indexed, after_event, Insert, Replace, Save, SaveChanges, Update, Delete
 from pydantic import BaseModel, Field
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime, time
 from app.core.config import settings
 
 class Box(Document):
@@ -15,7 +15,7 @@ class Box(Document):
     equipment: Optional[List[str]] = []
     
     # Status
-    status: str = Field(..., regex=f"^({'|'.join(settings.BOX_STATUS.values())})$")
+    status: str = Field(..., pattern=f"^({'|'.join(settings.BOX_STATUS.values())})$")
     
     # Availability
     is_active: bool = True
@@ -42,8 +42,8 @@ class Box(Document):
     
     class Settings:
         name = "boxes"
+        # name gets its unique index from Indexed()
         indexes = [
-            "name",
             "status",
             "location",
             "is_active"
@@ -52,6 +52,32 @@ class Box(Document):
     def __str__(self):
         return f"Box(name={self.name}, status={self.status})"
     
+    @after_event(Insert, Replace, Save, SaveChanges, Update, Delete)
+    async def invalidate_response_cache(self):
+        """Drop cached box listings after any write"""
+        from app.services.response_cache import response_cache
+        await response_cache.invalidate("boxes")
+    
+    @after_event(Insert, Replace, Save, SaveChanges, Update)
+    async def publish_occupancy(self):
+        """Push status and assignment changes to occupancy subscribers"""
+        from app.services.occupancy_feed import occupancy_feed
+        await occupancy_feed.box_changed(self)
+    
+    @after_event(Insert, Replace, Save, SaveChanges, Update)
+    async def sync_box_matcher(self):
+        """Keep box recommendations in step with equipment, hours and status"""
+        from app.services.box_matcher import box_matcher
+        await box_matcher.box_changed(self)
+    
+    @after_event(Delete)
+    async def publish_removal(self):
+        """Tell occupancy subscribers and the box matcher the box is gone"""
+        from app.services.box_matcher import box_matcher
+        from app.services.occupancy_feed import occupancy_feed
+        await occupancy_feed.box_deleted(str(self.id))
+        await box_matcher.box_deleted(str(self.id))
+    
     def is_available(self) -> bool:
         """Check if box is available for booking"""
         return (
@@ -118,4 +144,28 @@ class BoxStats(BaseModel):
     maintenance_boxes: int
     utilization_rate: float
     boxes_by_floor: dict
-    most_used_boxes: List[dict]
\ No newline at end of file
+    most_used_boxes: List[dict]
+
+
+class BoxRecommendation(BaseModel):
+    """A box free for a requested appointment, best match first"""
+    box_id: str
+    name: str
+    location: str
+    floor: Optional[int] = None
+    start_time: time
+    end_time: time
+    preferred: bool  # In the doctor's preferred_boxes for that day
+    free_before_minutes: int  # Free time left before the appointment
+    free_after_minutes: int  # Free time left after it
+
+
+class BoxFreeSlot(BaseModel):
+    """A start at which a box (and the doctor, if given) is free"""
+    box_id: str
+    name: str
+    location: str
+    floor: Optional[int] = None
+    date: date
+    start_time: time
+    end_time: time
@@ -1,9 +1,23 @@
-from beanie import Document, Indexed
-from pydantic import BaseModel, Field
+from beanie import Document, Indexed, PydanticObjectId
+from pydantic import AliasChoices, BaseModel, Field, field_validator
+from pymongo import ASCENDING, IndexModel
 from typing import Optional, List
-from datetime import datetime, date, time
+from datetime import datetime, date, time, timedelta
 from app.core.config import settings
 
+def on_slot_boundary(value: Optional[time]) -> bool:
+    """Check if a start time falls on a BOOKING_SLOT_MINUTES cell boundary"""
+    if value is None:
+        return True
+    minutes = value.hour * 60 + value.minute
+    return minutes % settings.BOOKING_SLOT_MINUTES == 0 and not value.second and not value.microsecond
+
+def check_slot_boundary(value: Optional[time]) -> Optional[time]:
+    # Unaligned starts would claim a cell shared with the adjacent booking
+    if not on_slot_boundary(value):
+        raise ValueError(f"start_time must be a multiple of {settings.BOOKING_SLOT_MINUTES} minutes")
+    return value
+
 class Reservation(Document):
     # Basic Information
     patient_id: Indexed(str)
@@ -17,7 +31,7 @@ class Reservation(Document):
     duration_minutes: int = Field(ge=15, le=480)  # 15 minutes to 8 hours
     
     # Status
-    status: str = Field(..., regex=f"^({'|'.join(settings.RESERVATION_STATUS.values())})$")
+    status: str = Field(..., pattern=f"^({'|'.join(settings.RESERVATION_STATUS.values())})$")
     
     # Purpose
     appointment_type: str  # "consultation", "procedure", "follow_up", "emergency"
@@ -61,6 +75,10 @@ class Reservation(Document):
     follow_up_date: Optional[date] = None
     follow_up_notes: Optional[str] = None
     
+    # Recurring series (materialized occurrence)
+    series_id: Optional[str] = None
+    occurrence_date: Optional[date] = None  # Date in the series rule, before any move
+    
     # System fields
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -76,10 +94,53 @@ class Reservation(Document):
             "doctor_id",
             "box_id",
             "date",
-            "status",
             "appointment_type",
-            "created_at"
+            "created_at",
+            # Overlap checks for double-booking prevention
+            IndexModel(
+                [("box_id", ASCENDING), ("date", ASCENDING), ("start_time", ASCENDING)],
+                name="box_date_start_time"
+            ),
+            IndexModel(
+                [("doctor_id", ASCENDING), ("date", ASCENDING), ("start_time", ASCENDING)],
+                name="doctor_date_start_time"
+            ),
+            # A doctor's / box's reservations in a status on a date or range;
+            # status_date also serves status-only filters
+            IndexModel(
+                [("doctor_id", ASCENDING), ("status", ASCENDING), ("date", ASCENDING)],
+                name="doctor_status_date"
+            ),
+            IndexModel(
+                [("box_id", ASCENDING), ("status", ASCENDING), ("date", ASCENDING)],
+                name="box_status_date"
+            ),
+            IndexModel([("status", ASCENDING), ("date", ASCENDING)], name="status_date"),
+            # Keyset pagination: (sort key, _id), optionally behind an equality filter
+            IndexModel([("date", ASCENDING), ("_id", ASCENDING)], name="date_id"),
+            IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at_id"),
+            IndexModel(
+                [("doctor_id", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)],
+                name="doctor_date_id"
+            ),
+            IndexModel(
+                [("patient_id", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)],
+                name="patient_date_id"
+            ),
+            # One materialized reservation per series occurrence
+            IndexModel(
+                [("series_id", ASCENDING), ("occurrence_date", ASCENDING)],
+                name="series_occurrence",
+                unique=True,
+                partialFilterExpression={"series_id": {"$type": "string"}}
+            )
         ]
+        # Dates and times are stored as ISO strings, which sort correctly
+        bson_encoders = {
+            datetime: lambda value: value,
+            date: lambda value: value.isoformat(),
+            time: lambda value: value.isoformat()
+        }
     
     def __str__(self):
         return f"Reservation(patient={self.patient_name}, date={self.date}, status={self.status})"
@@ -119,6 +180,18 @@ class Reservation(Document):
     def get_appointment_datetime(self) -> datetime:
         """Get full appointment datetime"""
         return datetime.combine(self.date, self.start_time)
+    
+    def overlaps(self, start_time: time, end_time: time) -> bool:
+        """Check if this reservation overlaps a time range on its date"""
+        return self.start_time < end_time and start_time < self.end_time
+    
+    @staticmethod
+    def compute_end_time(start_time: time, duration_minutes: int) -> time:
+        """End time of an appointment (capped at the end of the day)"""
+        end = datetime.combine(date.min, start_time) + timedelta(minutes=duration_minutes)
+        if end.date() > date.min:
+            return time.max
+        return end.time()
 
 class ReservationCreate(BaseModel):
     """Schema for creating a reservation"""
@@ -133,6 +206,33 @@ class ReservationCreate(BaseModel):
     notes: Optional[str] = None
     priority: Optional[str] = "normal"
 
+    @field_validator("start_time")
+    @classmethod
+    def start_on_slot(cls, value):
+        return check_slot_boundary(value)
+
+class ReservationBulkCreate(BaseModel):
+    """Schema for booking many reservations at once"""
+    items: List[ReservationCreate] = Field(..., min_length=1, max_length=settings.BULK_RESERVATION_MAX_ITEMS)
+    mode: str = Field("best_effort", pattern="^(best_effort|all_or_nothing)$")
+    check_schedule: bool = True  # Require the doctor's schedule to cover each item
+
+class ReservationBulkItemResult(BaseModel):
+    """Outcome of one item of a bulk booking"""
+    index: int
+    status_code: int
+    reservation_id: Optional[str] = None
+    confirmation_code: Optional[str] = None
+    detail: Optional[str] = None
+
+class ReservationBulkResult(BaseModel):
+    """Outcome of a bulk booking"""
+    mode: str
+    committed: bool
+    created: int
+    failed: int
+    results: List[ReservationBulkItemResult]
+
 class ReservationUpdate(BaseModel):
     """Schema for updating a reservation"""
     date: Optional[date] = None
@@ -144,6 +244,59 @@ class ReservationUpdate(BaseModel):
     priority: Optional[str] = None
     status: Optional[str] = None
 
+    @field_validator("start_time")
+    @classmethod
+    def start_on_slot(cls, value):
+        return check_slot_boundary(value)
+
+class ReservationStatusUpdate(BaseModel):
+    """Schema for changing a reservation status"""
+    status: str = Field(..., pattern=f"^({'|'.join(settings.RESERVATION_STATUS.values())})$")
+    reason: Optional[str] = None
+
+class ReservationCalendarSlot(BaseModel):
+    """Projection for calendar views and overlap checks"""
+    id: PydanticObjectId = Field(validation_alias=AliasChoices("_id", "id"))
+    box_id: str
+    doctor_id: str
+    date: date
+    start_time: time
+    end_time: time
+    status: str
+    box_name: str
+    doctor_name: str
+
+    class Settings:
+        projection = {
+            "_id": 1, "box_id": 1, "doctor_id": 1, "date": 1, "start_time": 1,
+            "end_time": 1, "status": 1, "box_name": 1, "doctor_name": 1
+        }
+
+class ReservationListItem(BaseModel):
+    """Projection for reservation listings"""
+    id: PydanticObjectId = Field(validation_alias=AliasChoices("_id", "id"))
+    patient_id: str
+    patient_name: str
+    doctor_id: str
+    doctor_name: str
+    box_id: str
+    box_name: str
+    date: date
+    start_time: time
+    end_time: time
+    duration_minutes: int
+    status: str
+    appointment_type: str
+    priority: str = "normal"
+    created_at: datetime
+
+    class Settings:
+        projection = {
+            "_id": 1, "patient_id": 1, "patient_name": 1, "doctor_id": 1, "doctor_name": 1,
+            "box_id": 1, "box_name": 1, "date": 1, "start_time": 1, "end_time": 1,
+            "duration_minutes": 1, "status": 1, "appointment_type": 1, "priority": 1, "created_at": 1
+        }
+
 class ReservationStats(BaseModel):
     """Reservation statistics"""
     total_reservations: int
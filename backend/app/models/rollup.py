@@ -0,0 +1,42 @@
+from beanie import Document
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+from typing import Dict, Optional
+from datetime import datetime
+
+class ReservationRollup(Document):
+    """
+    Per-day reservation counters for the whole clinic, one box or one doctor.
+
+    _id is "<scope>:<key>:<YYYY-MM-DD>". Counters are maintained with $inc
+    when reservations are created or change status, and can be rebuilt
+    from the reservations collection.
+    """
+    id: str
+    scope: str  # "clinic", "box" or "doctor"
+    key: str    # "all", box_id or doctor_id
+    date: str   # YYYY-MM-DD
+    month: str  # YYYY-MM
+    name: Optional[str] = None  # box or doctor name
+
+    total: int = 0
+    duration_minutes: int = 0   # sum over all reservations
+    booked: int = 0             # reservations occupying the box
+    booked_minutes: int = 0
+    status: Dict[str, int] = {}
+    type: Dict[str, int] = {}
+    hours: Dict[str, int] = {}  # "08" -> reservations starting that hour
+
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "reservation_rollups"
+        indexes = [
+            IndexModel(
+                [("scope", ASCENDING), ("date", ASCENDING), ("key", ASCENDING)],
+                name="scope_date_key"
+            )
+        ]
+
+    def __str__(self):
+        return f"ReservationRollup(scope={self.scope}, key={self.key}, date={self.date})"
@@ -1,9 +1,11 @@
-from beanie import Document, Indexed
+from beanie import Document, Indexed, after_event, Insert, Replace, Save, SaveChanges, Update, Delete
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict
 from datetime import datetime, date, time
 from enum import Enum
 
+from app.services.slot_grid import time_slot_starts, build_slot_grid
+
 class DayOfWeek(str, Enum):
     MONDAY = "monday"
     TUESDAY = "tuesday" 
@@ -29,26 +31,7 @@ class TimeSlot(BaseModel):
     
     def get_available_slots(self) -> List[time]:
         """Get all available appointment slots in this time range"""
-        slots = []
-        current_time = self.start_time
-        
-        while current_time < self.end_time:
-            slots.append(current_time)
-            # Add appointment duration + break
-            total_minutes = self.appointment_duration + self.break_between
-            hours = total_minutes // 60
-            minutes = total_minutes % 60
-            
-            # Calculate next slot time
-            next_hour = current_time.hour + hours + (current_time.minute + minutes) // 60
-            next_minute = (current_time.minute + minutes) % 60
-            
-            if next_hour >= 24:
-                break
-                
-            current_time = time(next_hour, next_minute)
-        
-        return slots
+        return time_slot_starts(self)
 
 class Schedule(Document):
     # Basic Information
@@ -100,12 +83,36 @@ class Schedule(Document):
             "schedule_type",
             "is_available"
         ]
+        # Dates and times are stored as ISO strings, which sort correctly
+        bson_encoders = {
+            datetime: lambda value: value,
+            date: lambda value: value.isoformat(),
+            time: lambda value: value.isoformat()
+        }
     
     def __str__(self):
         return f"Schedule(doctor={self.doctor_name}, type={self.schedule_type})"
     
-    def is_active_on(self, check_date: date) -> bool:
-        """Check if schedule is active on a specific date"""
+    @after_event(Insert, Replace, Save, SaveChanges, Update)
+    async def sync_availability_index(self):
+        """Keep the availability index of every worker in sync after writes"""
+        from app.services.availability_index import availability_index
+        await availability_index.schedule_changed(self)
+    
+    @after_event(Delete)
+    async def drop_from_availability_index(self):
+        """Remove deleted schedules from the availability index of every worker"""
+        from app.services.availability_index import availability_index
+        await availability_index.schedule_deleted(str(self.id))
+    
+    @after_event(Insert, Replace, Save, SaveChanges, Update, Delete)
+    async def invalidate_response_cache(self):
+        """Drop cached schedule listings after any write"""
+        from app.services.response_cache import response_cache
+        await response_cache.invalidate("schedules")
+    
+    def applies_on(self, check_date: date) -> bool:
+        """Check if this entry's own dates and weekday cover a date (ignores the doctor's other entries)"""
         if not self.is_available:
             return False
         
@@ -125,39 +132,34 @@ class Schedule(Document):
         
         return False
     
+    def is_active_on(self, check_date: date) -> bool:
+        """Check if schedule is active on a specific date (its own dates only, see is_in_effect_on)"""
+        return self.applies_on(check_date)
+    
     def get_available_slots_for_date(self, check_date: date) -> List[time]:
-        """Get all available time slots for a specific date"""
+        """Get all available time slots for a specific date (its own dates only)"""
         if not self.is_active_on(check_date):
             return []
         
-        all_slots = []
-        for time_slot in self.time_slots:
-            if time_slot.is_available:
-                slots = time_slot.get_available_slots()
-                all_slots.extend(slots)
+        return build_slot_grid([self], [check_date]).slots_for(self.doctor_id, check_date)
+    
+    async def is_in_effect_on(self, check_date: date) -> bool:
+        """Check if schedule is in effect on a date, after the doctor's leave and exceptions"""
+        from app.services.availability_index import get_availability_index
+        index = await get_availability_index()
+        return index.is_in_effect(self, check_date)
+    
+    async def get_effective_slots_for_date(self, check_date: date) -> List[time]:
+        """Available time slots on a date, or none when the doctor's leave or exceptions override it"""
+        if not await self.is_in_effect_on(check_date):
+            return []
         
-        return sorted(all_slots)
+        return build_slot_grid([self], [check_date]).slots_for(self.doctor_id, check_date)
     
     def has_conflict_with(self, other_schedule: 'Schedule') -> bool:
         """Check if this schedule conflicts with another schedule"""
-        if self.doctor_id != other_schedule.doctor_id:
-            return False
-        
-        # Check date overlap
-        if self.effective_to and other_schedule.effective_from > self.effective_to:
-            return False
-        
-        if other_schedule.effective_to and self.effective_from > other_schedule.effective_to:
-            return False
-        
-        # Check day/date overlap
-        if self.schedule_type == ScheduleType.REGULAR and other_schedule.schedule_type == ScheduleType.REGULAR:
-            return self.day_of_week == other_schedule.day_of_week
-        
-        if self.schedule_type == ScheduleType.EXCEPTION and other_schedule.schedule_type == ScheduleType.EXCEPTION:
-            return self.specific_date == other_schedule.specific_date
-        
-        return True
+        from app.services.schedule_conflicts import find_conflicts
+        return bool(find_conflicts([self, other_schedule]))
 
 class ScheduleCreate(BaseModel):
     """Schema for creating a schedule"""
@@ -197,6 +199,18 @@ class DoctorAvailability(BaseModel):
     booked_slots: int
     availability_percentage: float
 
+class ScheduleConflict(BaseModel):
+    """Overlapping window between two schedules of the same doctor"""
+    doctor_id: str
+    schedule_id: Optional[str]
+    conflicting_schedule_id: Optional[str]
+    day_of_week: Optional[DayOfWeek] = None
+    specific_date: Optional[date] = None
+    overlap_from: date
+    overlap_to: Optional[date] = None  # None means indefinite
+    start_time: time
+    end_time: time
+
 class ScheduleStats(BaseModel):
     """Schedule statistics"""
     total_schedules: int
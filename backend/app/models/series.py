@@ -0,0 +1,143 @@
+from beanie import Document, Indexed
+from pydantic import BaseModel, Field, field_validator
+from pymongo import ASCENDING, IndexModel
+from typing import Optional, List
+from datetime import datetime, date, time
+from app.models.reservation import check_slot_boundary
+
+class SeriesException(BaseModel):
+    """Change to one occurrence of a series, keyed by its original date"""
+    original_date: date
+    cancelled: bool = False
+    # Overrides for a moved/changed occurrence
+    moved_to: Optional[date] = None
+    start_time: Optional[time] = None
+    duration_minutes: Optional[int] = Field(None, ge=15, le=480)
+    box_id: Optional[str] = None
+    reason: Optional[str] = None
+
+class SeriesOccurrenceFailure(BaseModel):
+    """Occurrence that materialize could not book"""
+    original_date: date
+    date: date
+    status_code: int
+    detail: Optional[str] = None
+    failed_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ReservationSeries(Document):
+    """
+    Recurring reservations stored as one RRULE.
+
+    Occurrences are expanded on demand for a date window; only the next
+    SERIES_MATERIALIZE_DAYS are materialized as Reservation documents
+    (tagged with series_id and occurrence_date) for reminders and check-in.
+    """
+    # Participants
+    patient_id: Indexed(str)
+    doctor_id: Indexed(str)
+    box_id: Indexed(str)
+    patient_name: str
+    doctor_name: str
+    box_name: str
+
+    # Recurrence
+    rrule: str  # RFC 5545 RRULE, e.g. "FREQ=WEEKLY;COUNT=12;BYDAY=MO,TH"
+    dtstart: date
+    until: Optional[date] = None  # Last occurrence, None if the series never ends
+    start_time: time
+    duration_minutes: int = Field(ge=15, le=480)
+    exceptions: List[SeriesException] = []
+
+    # Appointment details
+    appointment_type: str
+    reason: Optional[str] = None
+    notes: Optional[str] = None
+    priority: str = "normal"
+
+    # State
+    is_active: bool = True
+    materialized_until: Optional[date] = None
+    # Occurrences up to materialized_until left unbooked; an exception for the date clears them
+    failed_occurrences: List[SeriesOccurrenceFailure] = []
+    cancelled_at: Optional[datetime] = None
+    cancelled_by: Optional[str] = None
+
+    # System fields
+    created_by: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "reservation_series"
+        indexes = [
+            "patient_id",
+            "doctor_id",
+            "box_id",
+            # Series overlapping a date window
+            IndexModel(
+                [("is_active", ASCENDING), ("dtstart", ASCENDING), ("until", ASCENDING)],
+                name="active_dtstart_until"
+            ),
+            IndexModel(
+                [("is_active", ASCENDING), ("materialized_until", ASCENDING)],
+                name="active_materialized_until"
+            )
+        ]
+        # Dates and times are stored as ISO strings, which sort correctly
+        bson_encoders = {
+            datetime: lambda value: value,
+            date: lambda value: value.isoformat(),
+            time: lambda value: value.isoformat()
+        }
+
+    def __str__(self):
+        return f"ReservationSeries(patient={self.patient_name}, rrule={self.rrule})"
+
+    def get_exception(self, original_date: date) -> Optional[SeriesException]:
+        for exception in self.exceptions:
+            if exception.original_date == original_date:
+                return exception
+        return None
+
+class ReservationSeriesCreate(BaseModel):
+    """Schema for creating a reservation series"""
+    patient_id: str
+    doctor_id: str
+    box_id: str
+    rrule: str
+    dtstart: date
+    start_time: time
+    duration_minutes: int = Field(ge=15, le=480)
+    appointment_type: str
+    reason: Optional[str] = None
+    notes: Optional[str] = None
+    priority: Optional[str] = "normal"
+
+    @field_validator("start_time")
+    @classmethod
+    def start_on_slot(cls, value):
+        return check_slot_boundary(value)
+
+class SeriesOccurrence(BaseModel):
+    """One occurrence of a series in a date window"""
+    series_id: str
+    original_date: date
+    date: date
+    start_time: time
+    end_time: time
+    duration_minutes: int
+    box_id: str
+    doctor_id: str
+    patient_id: str
+    doctor_name: str
+    box_name: str
+    modified: bool = False
+    cancelled: bool = False
+    materialized: bool = False
+
+class SeriesMaterializeResult(BaseModel):
+    """Outcome of materializing series occurrences"""
+    until: date
+    series: int
+    created: int
+    failed: int
@@ -0,0 +1,51 @@
+from beanie import Document
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+from typing import Optional
+from datetime import datetime, date, time, timedelta
+from app.core.config import settings
+
+class SlotClaim(Document):
+    """
+    Lock document for one booking cell of a box or doctor.
+
+    The _id is the slot key ("box:<id>:<date>:<minute>"), so MongoDB's
+    unique _id index guarantees only one reservation can hold a cell.
+
+    Claims are written with a short pending expiry and extended once their
+    reservation is saved, so a booking that dies in between frees its cells
+    after SLOT_CLAIM_PENDING_TTL seconds.
+    """
+    id: str
+    reservation_id: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: Optional[datetime] = None  # Pending and past-day claims are removed by the TTL index
+    
+    class Settings:
+        name = "slot_claims"
+        indexes = [
+            "reservation_id",
+            IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0)
+        ]
+    
+    def __str__(self):
+        return f"SlotClaim(key={self.id}, reservation={self.reservation_id})"
+
+    @staticmethod
+    def make_key(kind: str, owner_id: str, day: str, minute: int) -> str:
+        """Build the slot key for a box/doctor booking cell"""
+        return f"{kind}:{owner_id}:{day}:{minute:04d}"
+
+    @staticmethod
+    def expiry(key: str) -> datetime:
+        """When a claim stops mattering: a day after the claimed day ends (UTC leeway)"""
+        return SlotClaim.day_expiry(date.fromisoformat(key.split(":")[2]))
+
+    @staticmethod
+    def day_expiry(day: date) -> datetime:
+        return datetime.combine(day + timedelta(days=2), time.min)
+
+    @staticmethod
+    def pending_expiry(now: datetime) -> datetime:
+        """Expiry of a claim whose reservation is not saved yet"""
+        return now + timedelta(seconds=settings.SLOT_CLAIM_PENDING_TTL)
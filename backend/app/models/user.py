@@ -1,10 +1,36 @@
-from beanie import Document, Indexed
-from pydantic import BaseModel, EmailStr, Field
+from beanie import Document, Indexed, PydanticObjectId, after_event, Replace, Save, SaveChanges, Update, Delete
+from pydantic import AliasChoices, BaseModel, ConfigDict, EmailStr, Field
+from pymongo import ASCENDING, IndexModel
 from typing import Optional, List
 from datetime import datetime
 from app.core.config import settings
 
-class User(Document):
+class UserRoles:
+    """Role checks shared by User and UserAuth"""
+    role: str
+    
+    def is_admin(self) -> bool:
+        return self.role == settings.USER_ROLES["ADMIN"]
+    
+    def is_doctor(self) -> bool:
+        return self.role == settings.USER_ROLES["DOCTOR"]
+    
+    def is_patient(self) -> bool:
+        return self.role == settings.USER_ROLES["PATIENT"]
+    
+    def can_manage_boxes(self) -> bool:
+        return self.role in [settings.USER_ROLES["ADMIN"]]
+    
+    def can_manage_users(self) -> bool:
+        return self.role in [settings.USER_ROLES["ADMIN"]]
+    
+    def can_create_schedules(self) -> bool:
+        return self.role in [settings.USER_ROLES["ADMIN"], settings.USER_ROLES["DOCTOR"]]
+    
+    def can_make_reservations(self) -> bool:
+        return self.role in [settings.USER_ROLES["PATIENT"]]
+
+class User(UserRoles, Document):
     # Basic Info
     email: Indexed(EmailStr, unique=True)
     username: Indexed(str, unique=True)
@@ -12,7 +38,7 @@ class User(Document):
     hashed_password: str
     
     # Role and permissions
-    role: str = Field(..., regex=f"^({'|'.join(settings.USER_ROLES.values())})$")
+    role: str = Field(..., pattern=f"^({'|'.join(settings.USER_ROLES.values())})$")
     is_active: bool = True
     is_verified: bool = False
     
@@ -43,36 +69,29 @@ class User(Document):
     
     class Settings:
         name = "users"
+        # email and username get their unique indexes from Indexed(); listing
+        # them here again would replace those with non-unique ones
         indexes = [
-            "email",
-            "username", 
             "role",
-            "is_active"
+            "is_active",
+            # Keyset pagination of user listings
+            IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)], name="created_at_id"),
+            # Staff directory: active users of a role in _id order; inactive ones are left out
+            IndexModel(
+                [("role", ASCENDING), ("_id", ASCENDING)],
+                name="active_role_id",
+                partialFilterExpression={"is_active": True}
+            )
         ]
     
     def __str__(self):
         return f"User(email={self.email}, role={self.role})"
     
-    def is_admin(self) -> bool:
-        return self.role == settings.USER_ROLES["ADMIN"]
-    
-    def is_doctor(self) -> bool:
-        return self.role == settings.USER_ROLES["DOCTOR"]
-    
-    def is_patient(self) -> bool:
-        return self.role == settings.USER_ROLES["PATIENT"]
-    
-    def can_manage_boxes(self) -> bool:
-        return self.role in [settings.USER_ROLES["ADMIN"]]
-    
-    def can_manage_users(self) -> bool:
-        return self.role in [settings.USER_ROLES["ADMIN"]]
-    
-    def can_create_schedules(self) -> bool:
-        return self.role in [settings.USER_ROLES["ADMIN"], settings.USER_ROLES["DOCTOR"]]
-    
-    def can_make_reservations(self) -> bool:
-        return self.role in [settings.USER_ROLES["PATIENT"]]
+    @after_event(Replace, Save, SaveChanges, Update, Delete)
+    async def invalidate_cache(self):
+        """Drop cached copies after profile, status or password changes"""
+        from app.services.user_cache import user_cache
+        await user_cache.invalidate(str(self.id))
     
     def get_public_profile(self) -> dict:
         """Get public profile information"""
@@ -97,10 +116,62 @@ class UserProfile(BaseModel):
     allergies: Optional[List[str]] = None
     preferences: Optional[dict] = None
 
+class UserPublicProfile(BaseModel):
+    """Projection matching User.get_public_profile"""
+    id: PydanticObjectId = Field(validation_alias=AliasChoices("_id", "id"))
+    full_name: str
+    role: str
+    specialization: Optional[str] = None
+    department: Optional[str] = None
+    is_active: bool = True
+
+    class Settings:
+        projection = {
+            "_id": 1, "full_name": 1, "role": 1, "specialization": 1, "department": 1, "is_active": 1
+        }
+
+class UserResponse(BaseModel):
+    """User as returned by the API (no password hash or medical data)"""
+    id: PydanticObjectId = Field(validation_alias=AliasChoices("_id", "id"))
+    email: EmailStr
+    username: str
+    full_name: str
+    role: str
+    is_active: bool = True
+    is_verified: bool = False
+    rut: Optional[str] = None
+    phone: Optional[str] = None
+    specialization: Optional[str] = None
+    department: Optional[str] = None
+    created_at: datetime
+    last_login: Optional[datetime] = None
+
 class UserStats(BaseModel):
     """User statistics"""
     total_users: int
     active_users: int
     users_by_role: dict
     recent_registrations: int
-    verified_users: int
\ No newline at end of file
+    verified_users: int
+
+
+class UserAuth(UserRoles, BaseModel):
+    """
+    Fields needed for authentication and role checks; all the user cache
+    keeps, and what get_current_user returns. Read-only and not a Document,
+    so it cannot be saved over the full user; load the User to change it.
+    """
+    model_config = ConfigDict(frozen=True)
+
+    id: PydanticObjectId = Field(validation_alias=AliasChoices("_id", "id"))
+    email: EmailStr
+    username: str
+    full_name: str
+    role: str
+    is_active: bool = True
+    is_verified: bool = False
+
+    class Settings:
+        projection = {
+            "_id": 1, "email": 1, "username": 1, "full_name": 1, "role": 1, "is_active": 1, "is_verified": 1
+        }
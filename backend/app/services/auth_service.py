@@ -0,0 +1,40 @@
+import logging
+from datetime import datetime
+from typing import Optional
+
+from app.core.security import password_hasher
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# Precomputed bcrypt hash used to equalize timing for unknown users
+DUMMY_HASH = "$2b$12$KIXQJnR9JZ1kB2eBqQ6bTOnWf7n5Yf1z8b8gq6h2o3k9m0l1p2r3u"
+
+
+class AuthService:
+    """Authentication operations"""
+
+    @staticmethod
+    async def authenticate(username: str, password: str) -> Optional[User]:
+        """
+        Check credentials (username or email) without blocking the event loop.
+
+        When the stored hash uses outdated bcrypt parameters it is replaced
+        transparently on successful login.
+        """
+        user = await User.find_one({"$or": [{"username": username}, {"email": username}]})
+        if user is None:
+            # Spend the same time as a real check so usernames can't be probed
+            await password_hasher.verify(password, DUMMY_HASH)
+            return None
+
+        is_valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+        if not is_valid:
+            return None
+
+        user.last_login = datetime.utcnow()
+        if new_hash:
+            user.hashed_password = new_hash
+            logger.info(f"Rehashed password for user {user.id}")
+        await user.save()
+        return user
@@ -0,0 +1,312 @@
+"""
+In-process doctor availability index.
+
+Maps weekdays and dates to the schedules that apply on them and resolves
+overrides per doctor:
+
+1. An active VACATION or SICK_LEAVE entry covering the date makes the
+   doctor unavailable.
+2. Otherwise, EXCEPTION entries for the date replace the doctor's REGULAR
+   schedules (an exception with ``is_available=False`` is a day off).
+3. Otherwise, the doctor's REGULAR schedules for that weekday apply.
+
+REGULAR, VACATION and SICK_LEAVE entries with ``is_available=False`` are
+ignored. The index is loaded lazily from the ``schedules`` collection and
+kept in sync by the Schedule document event hooks. Each worker has its own
+index, so the hooks also broadcast the schedule id over Redis pub/sub and
+the other workers re-read that schedule; after a lost Redis connection a
+worker reloads the whole index, since changes may have been missed.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from collections import defaultdict
+from datetime import date, time, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from beanie import PydanticObjectId
+
+from app.core.redis import get_redis
+from app.models.schedule import DayOfWeek, Schedule, ScheduleType
+from app.services.slot_grid import WEEKDAY_NAMES
+
+logger = logging.getLogger(__name__)
+
+LEAVE_TYPES = (ScheduleType.VACATION, ScheduleType.SICK_LEAVE)
+CHANNEL = "availability-index"
+# Tells this process's own broadcasts apart
+WORKER_ID = uuid.uuid4().hex
+
+# (bucket, key) pairs a schedule was indexed under, used for removal
+Placement = Tuple[str, object]
+
+
+def _in_range(schedule: Schedule, day: date) -> bool:
+    if day < schedule.effective_from:
+        return False
+    return not (schedule.effective_to and day > schedule.effective_to)
+
+
+class AvailabilityIndex:
+    """Weekday/date index over doctor schedules"""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Schedule, List[Placement]]] = {}
+        # weekday -> doctor_id -> schedule_id -> schedule
+        self._regular: Dict[str, Dict[str, Dict[str, Schedule]]] = defaultdict(lambda: defaultdict(dict))
+        # date -> doctor_id -> schedule_id -> schedule
+        self._exceptions: Dict[date, Dict[str, Dict[str, Schedule]]] = defaultdict(lambda: defaultdict(dict))
+        # date -> doctor_id -> schedule ids
+        self._leave: Dict[date, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+        # doctor_id -> schedule_id -> first day of an open-ended leave
+        self._open_leave: Dict[str, Dict[str, date]] = defaultdict(dict)
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    async def load(self):
+        """(Re)build the index from the schedules collection"""
+        async with self._lock:
+            self.clear()
+            async for schedule in Schedule.find_all():
+                self.upsert(schedule)
+            self._loaded = True
+            logger.info(f"Availability index loaded with {len(self._entries)} schedules")
+
+    async def ensure_loaded(self):
+        """Load the index on first use"""
+        if not self._loaded:
+            await self.load()
+
+    def clear(self):
+        self._entries.clear()
+        self._regular.clear()
+        self._exceptions.clear()
+        self._leave.clear()
+        self._open_leave.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def upsert(self, schedule: Schedule):
+        """Index a created or updated schedule"""
+        schedule_id = str(schedule.id)
+        self.remove(schedule_id)
+
+        placements: List[Placement] = []
+        doctor_id = schedule.doctor_id
+
+        if schedule.schedule_type == ScheduleType.REGULAR:
+            if schedule.is_available and schedule.day_of_week:
+                weekday = DayOfWeek(schedule.day_of_week).value
+                self._regular[weekday][doctor_id][schedule_id] = schedule
+                placements.append(("regular", weekday))
+
+        elif schedule.schedule_type == ScheduleType.EXCEPTION:
+            if schedule.specific_date:
+                self._exceptions[schedule.specific_date][doctor_id][schedule_id] = schedule
+                placements.append(("exception", schedule.specific_date))
+
+        elif schedule.schedule_type in LEAVE_TYPES and schedule.is_available:
+            if schedule.specific_date:
+                days = [schedule.specific_date]
+            elif schedule.effective_to:
+                span = (schedule.effective_to - schedule.effective_from).days
+                days = [schedule.effective_from + timedelta(days=i) for i in range(span + 1)]
+            else:
+                self._open_leave[doctor_id][schedule_id] = schedule.effective_from
+                placements.append(("open_leave", doctor_id))
+                days = []
+
+            for day in days:
+                self._leave[day][doctor_id].add(schedule_id)
+                placements.append(("leave", day))
+
+        self._entries[schedule_id] = (schedule, placements)
+
+    def remove(self, schedule_id: str):
+        """Drop a schedule from the index"""
+        schedule_id = str(schedule_id)
+        entry = self._entries.pop(schedule_id, None)
+        if entry is None:
+            return
+
+        schedule, placements = entry
+        doctor_id = schedule.doctor_id
+        for bucket, key in placements:
+            if bucket in ("regular", "exception"):
+                buckets = self._regular if bucket == "regular" else self._exceptions
+                doctors = buckets[key]
+                doctors[doctor_id].pop(schedule_id, None)
+                if not doctors[doctor_id]:
+                    del doctors[doctor_id]
+                if not doctors:
+                    del buckets[key]
+            elif bucket == "leave":
+                doctors = self._leave[key]
+                doctors[doctor_id].discard(schedule_id)
+                if not doctors[doctor_id]:
+                    del doctors[doctor_id]
+                if not doctors:
+                    del self._leave[key]
+            elif bucket == "open_leave":
+                self._open_leave[key].pop(schedule_id, None)
+                if not self._open_leave[key]:
+                    del self._open_leave[key]
+
+    # Cross-worker sync
+
+    async def schedule_changed(self, schedule: Schedule):
+        """Index a written schedule here and on the other workers"""
+        self.upsert(schedule)
+        await self._publish(str(schedule.id))
+
+    async def schedule_deleted(self, schedule_id: str):
+        """Drop a deleted schedule here and on the other workers"""
+        self.remove(schedule_id)
+        await self._publish(str(schedule_id))
+
+    async def _publish(self, schedule_id: str):
+        redis = get_redis()
+        if redis is None:
+            return
+        try:
+            await redis.publish(CHANNEL, json.dumps({"worker": WORKER_ID, "schedule_id": schedule_id}))
+        except Exception as e:
+            logger.warning(f"Availability index broadcast failed: {e}")
+
+    async def refresh(self, schedule_id: str):
+        """Re-read a schedule another worker wrote (or deleted)"""
+        if not self._loaded:
+            return  # Read fresh on first use
+        schedule = await Schedule.get(PydanticObjectId(schedule_id))
+        if schedule is None:
+            self.remove(schedule_id)
+        else:
+            self.upsert(schedule)
+
+    async def start(self):
+        """Follow schedule writes made by the other workers"""
+        redis = get_redis()
+        if redis is None or self._listener is not None:
+            return
+        self._listener = asyncio.create_task(self._listen(redis))
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self, redis):
+        reconnecting = False
+        while True:
+            try:
+                pubsub = redis.pubsub()
+                await pubsub.subscribe(CHANNEL)
+                if reconnecting and self._loaded:
+                    # Subscribed again before reloading, so no write falls in between
+                    await self.load()
+                reconnecting = False
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        payload = json.loads(message["data"])
+                        if payload["worker"] != WORKER_ID:
+                            await self.refresh(payload["schedule_id"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Availability index listener error: {e}")
+                reconnecting = True
+                await asyncio.sleep(1)
+
+    # Queries
+
+    def is_on_leave(self, doctor_id: str, day: date) -> bool:
+        """Check if a doctor has vacation or sick leave on a date"""
+        on_leave = self._leave.get(day)
+        if on_leave and doctor_id in on_leave:
+            return True
+        open_leave = self._open_leave.get(doctor_id)
+        return bool(open_leave) and any(start <= day for start in open_leave.values())
+
+    def regular_schedules(self, weekday: str) -> List[Schedule]:
+        """REGULAR schedules declared for a weekday"""
+        return [s for entries in self._regular.get(weekday, {}).values() for s in entries.values()]
+
+    def schedules_on(self, day: date) -> Dict[str, List[Schedule]]:
+        """Effective schedules per doctor on a date, after overrides"""
+        exceptions = self._exceptions.get(day, {})
+        result: Dict[str, List[Schedule]] = {}
+
+        for doctor_id, entries in exceptions.items():
+            if self.is_on_leave(doctor_id, day):
+                continue
+            active = [s for s in entries.values() if s.is_available and _in_range(s, day)]
+            if active:
+                result[doctor_id] = active
+
+        for doctor_id, entries in self._regular.get(WEEKDAY_NAMES[day.weekday()], {}).items():
+            if doctor_id in exceptions or self.is_on_leave(doctor_id, day):
+                continue
+            active = [s for s in entries.values() if _in_range(s, day)]
+            if active:
+                result[doctor_id] = active
+
+        return result
+
+    def doctors_available_on(self, day: date) -> List[str]:
+        """IDs of doctors with at least one effective schedule on a date"""
+        return list(self.schedules_on(day))
+
+    def schedules_for_doctor(self, doctor_id: str, day: date) -> List[Schedule]:
+        """Effective schedules of one doctor on a date"""
+        if self.is_on_leave(doctor_id, day):
+            return []
+
+        exceptions = self._exceptions.get(day, {}).get(doctor_id)
+        if exceptions is not None:
+            return [s for s in exceptions.values() if s.is_available and _in_range(s, day)]
+
+        regular = self._regular.get(WEEKDAY_NAMES[day.weekday()], {}).get(doctor_id, {})
+        return [s for s in regular.values() if _in_range(s, day)]
+
+    def is_in_effect(self, schedule: Schedule, day: date) -> bool:
+        """Check if a schedule applies on a date once the doctor's overrides are resolved"""
+        if not schedule.applies_on(day) or self.is_on_leave(schedule.doctor_id, day):
+            return False
+        if schedule.schedule_type == ScheduleType.REGULAR:
+            # Any exception of the doctor for the date replaces the regular schedules
+            return self._exceptions.get(day, {}).get(schedule.doctor_id) is None
+        return True
+
+    def is_doctor_available(self, doctor_id: str, day: date) -> bool:
+        return bool(self.schedules_for_doctor(doctor_id, day))
+
+    def covers(self, doctor_id: str, day: date, start_time: time, end_time: time) -> bool:
+        """Check if a doctor's effective schedule covers a whole appointment"""
+        for schedule in self.schedules_for_doctor(doctor_id, day):
+            lunch_start, lunch_end = schedule.lunch_break_start, schedule.lunch_break_end
+            if lunch_start and lunch_end and start_time < lunch_end and lunch_start < end_time:
+                continue
+            for time_slot in schedule.time_slots:
+                if time_slot.is_available and time_slot.start_time <= start_time and end_time <= time_slot.end_time:
+                    return True
+        return False
+
+
+availability_index = AvailabilityIndex()
+
+
+async def get_availability_index() -> AvailabilityIndex:
+    """Get the loaded availability index"""
+    await availability_index.ensure_loaded()
+    return availability_index
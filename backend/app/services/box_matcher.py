@@ -0,0 +1,531 @@
+"""
+Box recommendations and free-slot search over day bitmaps.
+
+Box-days and doctor-days are kept as bitmaps of BOOKING_SLOT_MINUTES cells
+(see day_bitmaps), and each box also has an "open" mask per weekday from
+available_from/available_to and available_days. "Is box B free from T for
+D minutes" is then a single AND of its occupied-or-closed mask with the
+appointment's mask, and the free run around a fit comes from bit_length on
+the same masks, so ranking all candidate boxes costs microseconds per box.
+
+Ranking: the doctor's preferred_boxes (from the schedules effective that
+day) first, in the order listed; then best fit, i.e. the least free time
+left around the appointment, which keeps long gaps for long appointments;
+then the fewest unneeded equipment and the smallest capacity surplus.
+
+Free-slot search ("first N free slots across these boxes" over up to
+FREE_SLOT_MAX_DAYS days) ORs the fit masks of the candidate boxes per day,
+ANDed with where the doctor is both free and on schedule, and reads the
+lowest set bits.
+
+Box profiles and day bitmaps are loaded lazily (one query for all boxes,
+one query per batch of missing dates) and kept for BOX_MATCHER_TTL
+seconds, LRU-bounded to BOX_MATCHER_MAX_DAYS dates. Booking, bulk booking,
+status changes and box writes update them incrementally and broadcast the
+change to the other workers over Redis pub/sub. Answers are advisory: the
+slot claims taken when booking still decide, so a missed update can only
+cost a 409, never a double booking.
+"""
+import asyncio
+import json
+import logging
+import time as timer
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.models.box import Box, BoxFreeSlot, BoxRecommendation
+from app.models.reservation import Reservation
+from app.services.availability_index import AvailabilityIndex, get_availability_index
+from app.services.day_bitmaps import (
+    CELL,
+    CELLS_PER_DAY,
+    DayCalendar,
+    cell_range,
+    fit_mask,
+    free_run,
+    hours_mask,
+    range_mask,
+    schedule_fits,
+    set_cells,
+    stride_mask,
+    time_mask
+)
+from app.services.slot_grid import MINUTES_PER_DAY, WEEKDAY_NAMES, to_minutes, to_time
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "box-matcher"
+# Tells this process's own broadcasts apart; PIDs repeat across containers
+WORKER_ID = uuid.uuid4().hex
+ACTIVE_STATUSES = [
+    settings.RESERVATION_STATUS["PENDING"],
+    settings.RESERVATION_STATUS["CONFIRMED"],
+    settings.RESERVATION_STATUS["IN_PROGRESS"]
+]
+UNBOOKABLE_BOX_STATUSES = {settings.BOX_STATUS["MAINTENANCE"]}
+
+
+def _minute(value: Optional[str], default: int) -> int:
+    try:
+        hours, minutes = value.split(":")[:2]
+        return int(hours) * 60 + int(minutes)
+    except (AttributeError, ValueError):
+        return default
+
+
+def _end_time(start_minute: int, duration_minutes: int) -> time:
+    return to_time(min(start_minute + duration_minutes, MINUTES_PER_DAY - 1))
+
+
+class BoxProfile(NamedTuple):
+    """What the matcher needs to know about a box"""
+    box_id: str
+    name: str
+    location: str
+    floor: Optional[int]
+    capacity: int
+    equipment: frozenset
+    bookable: bool
+    open_masks: Tuple[int, ...]  # One per weekday, Monday first
+
+    @classmethod
+    def from_document(cls, document: dict) -> "BoxProfile":
+        hours = hours_mask(
+            _minute(document.get("available_from"), 0),
+            _minute(document.get("available_to"), MINUTES_PER_DAY)
+        )
+        days = set(document.get("available_days") or [])
+        return cls(
+            box_id=str(document.get("_id") or document.get("id")),
+            name=document.get("name", ""),
+            location=document.get("location", ""),
+            floor=document.get("floor"),
+            capacity=document.get("capacity") or 1,
+            equipment=frozenset(document.get("equipment") or ()),
+            bookable=bool(document.get("is_active", True)) and document.get("status") not in UNBOOKABLE_BOX_STATUSES,
+            open_masks=tuple(hours if name in days else 0 for name in WEEKDAY_NAMES)
+        )
+
+
+class BoxMatcher:
+    """In-process box-day bitmaps answering "which box fits best" queries"""
+
+    def __init__(self, max_days: int, ttl: float):
+        self.max_days = max_days
+        self.ttl = ttl
+        self.boxes: Dict[str, BoxProfile] = {}
+        self.boxes_loaded_at: Optional[float] = None
+        self.days: "OrderedDict[date, DayCalendar]" = OrderedDict()
+        self._loading: Dict[object, asyncio.Future] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    # Loading
+
+    async def _single_flight(self, key, load):
+        pending = self._loading.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = self._loading[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await load()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Waiters re-raise it; do not warn about it
+            raise
+        finally:
+            del self._loading[key]
+
+    async def ensure_boxes(self):
+        if self.boxes_loaded_at is None or timer.monotonic() - self.boxes_loaded_at > self.ttl:
+            await self._single_flight("boxes", self._load_boxes)
+
+    async def _load_boxes(self):
+        fields = ("name", "location", "floor", "capacity", "equipment", "is_active", "status",
+                  "available_from", "available_to", "available_days")
+        boxes = {}
+        async for document in Box.get_motor_collection().find({}, {field: 1 for field in fields}):
+            profile = BoxProfile.from_document(document)
+            boxes[profile.box_id] = profile
+        self.boxes = boxes
+        self.boxes_loaded_at = timer.monotonic()
+
+    async def calendar(self, day: date) -> DayCalendar:
+        """Box and doctor bitmaps of a date, loading them if needed"""
+        return (await self.calendars([day]))[day]
+
+    async def calendars(self, days: Sequence[date]) -> Dict[date, DayCalendar]:
+        """Bitmaps of several dates; the missing ones are read in one query"""
+        now = timer.monotonic()
+        result: Dict[date, DayCalendar] = {}
+        waiting: Dict[date, asyncio.Future] = {}
+        missing: List[date] = []
+        for day in days:
+            calendar = self.days.get(day)
+            if calendar is not None and now - calendar.loaded_at <= self.ttl:
+                self.days.move_to_end(day)
+                result[day] = calendar
+            elif day in self._loading:
+                waiting[day] = self._loading[day]
+            else:
+                missing.append(day)
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = {day: loop.create_future() for day in missing}
+            self._loading.update(futures)
+            try:
+                loaded = await self._load_days(missing)
+                for day, future in futures.items():
+                    future.set_result(loaded[day])
+                result.update(loaded)
+            except Exception as e:
+                for future in futures.values():
+                    future.set_exception(e)
+                    future.exception()  # Waiters re-raise it; do not warn about it
+                raise
+            finally:
+                for day in missing:
+                    del self._loading[day]
+
+        for day, future in waiting.items():
+            result[day] = await asyncio.shield(future)
+        return result
+
+    async def _load_days(self, days: List[date]) -> Dict[date, DayCalendar]:
+        loaded = {day: DayCalendar() for day in days}
+        cursor = Reservation.get_motor_collection().find(
+            {"date": {"$in": [day.isoformat() for day in days]}, "status": {"$in": ACTIVE_STATUSES}},
+            {"box_id": 1, "doctor_id": 1, "date": 1, "start_time": 1, "end_time": 1}
+        )
+        async for document in cursor:
+            loaded[date.fromisoformat(document["date"])].add(
+                str(document["_id"]),
+                document["box_id"],
+                document.get("doctor_id"),
+                time_mask(time.fromisoformat(document["start_time"]), time.fromisoformat(document["end_time"]))
+            )
+        for day in sorted(loaded):
+            self.days[day] = loaded[day]
+            self.days.move_to_end(day)
+        while len(self.days) > self.max_days:
+            self.days.popitem(last=False)
+        return loaded
+
+    # Queries
+
+    async def preferred_boxes(self, doctor_id: str, day: date) -> List[str]:
+        """Preferred boxes of the doctor's effective schedules that day, in order"""
+        index = await get_availability_index()
+        preferred: List[str] = []
+        for schedule in index.schedules_for_doctor(doctor_id, day):
+            for box_id in schedule.preferred_boxes or ():
+                if box_id not in preferred:
+                    preferred.append(box_id)
+        return preferred
+
+    async def recommend(
+        self,
+        doctor_id: str,
+        day: date,
+        start_time: time,
+        duration_minutes: int,
+        equipment: Sequence[str] = (),
+        capacity: int = 1,
+        search_minutes: int = 0,
+        limit: int = 5
+    ) -> List[BoxRecommendation]:
+        """
+        Best boxes for an appointment, at ``start_time`` or, when none fits,
+        at the earliest later start within ``search_minutes``.
+        """
+        (_, calendar), preferred = await asyncio.gather(
+            asyncio.gather(self.ensure_boxes(), self.calendar(day)),
+            self.preferred_boxes(doctor_id, day)
+        )
+        return self.rank(
+            calendar, day, preferred, start_time, duration_minutes, equipment, capacity, search_minutes, limit,
+            doctor_blocked=calendar.doctors.get(doctor_id)
+        )
+
+    def candidates(
+        self,
+        calendar: DayCalendar,
+        day: date,
+        equipment: Sequence[str] = (),
+        capacity: int = 1,
+        box_ids: Optional[Sequence[str]] = None
+    ) -> List[Tuple[BoxProfile, int]]:
+        """Bookable boxes open that day, each with its occupied-or-closed mask"""
+        weekday = day.weekday()
+        needed = frozenset(equipment)
+        profiles = self.boxes.values() if box_ids is None else filter(None, map(self.boxes.get, box_ids))
+        candidates = []
+        for profile in profiles:
+            open_mask = profile.open_masks[weekday]
+            if open_mask and profile.bookable and profile.capacity >= capacity and needed <= profile.equipment:
+                # Bits past the end of the day are all set
+                candidates.append((profile, calendar.boxes.get(profile.box_id) | ~open_mask))
+        return candidates
+
+    def rank(
+        self,
+        calendar: DayCalendar,
+        day: date,
+        preferred: List[str],
+        start_time: time,
+        duration_minutes: int,
+        equipment: Sequence[str] = (),
+        capacity: int = 1,
+        search_minutes: int = 0,
+        limit: int = 5,
+        doctor_blocked: int = 0
+    ) -> List[BoxRecommendation]:
+        """Synchronous part of ``recommend`` over already loaded state"""
+        needed = frozenset(equipment)
+        preferred_rank = {box_id: rank for rank, box_id in enumerate(preferred)}
+        candidates = self.candidates(calendar, day, equipment, capacity)
+        if not candidates:
+            return []
+
+        first, last = cell_range(to_minutes(start_time), to_minutes(start_time) + duration_minutes)
+        cells = last - first
+        for shift in range(0, search_minutes // CELL + 1):
+            start = first + shift
+            end = start + cells
+            if end > CELLS_PER_DAY:
+                break
+            wanted = range_mask(start, end)
+            if doctor_blocked & wanted:
+                continue
+            fits = []
+            for profile, blocked in candidates:
+                if blocked & wanted:
+                    continue
+                free_before, free_after = free_run(blocked, start, end)
+                fits.append((
+                    preferred_rank.get(profile.box_id, len(preferred)),
+                    free_before + free_after,
+                    len(profile.equipment) - len(needed),
+                    profile.capacity - capacity,
+                    profile.name,
+                    profile,
+                    free_before,
+                    free_after
+                ))
+            if fits:
+                fits.sort(key=lambda fit: fit[:5])
+                return [
+                    BoxRecommendation(
+                        box_id=profile.box_id,
+                        name=profile.name,
+                        location=profile.location,
+                        floor=profile.floor,
+                        start_time=to_time(start * CELL),
+                        end_time=_end_time(start * CELL, duration_minutes),
+                        preferred=profile.box_id in preferred_rank,
+                        free_before_minutes=before * CELL,
+                        free_after_minutes=after_cells * CELL
+                    )
+                    for *_, profile, before, after_cells in fits[:limit]
+                ]
+        return []
+
+    async def free_slots(
+        self,
+        date_from: date,
+        days: int,
+        duration_minutes: int,
+        box_ids: Optional[Sequence[str]] = None,
+        doctor_id: Optional[str] = None,
+        equipment: Sequence[str] = (),
+        capacity: int = 1,
+        step_minutes: int = 15,
+        limit: int = 10
+    ) -> List[BoxFreeSlot]:
+        """
+        First free slots for an appointment across boxes, earliest first,
+        over ``days`` days from ``date_from``. Starts are every
+        ``step_minutes`` from midnight; with a doctor, only where the
+        doctor is on schedule and not booked. Days and starts already past
+        are skipped.
+        """
+        now = datetime.now()
+        first_day = max(date_from, now.date())
+        dates = [first_day + timedelta(days=offset) for offset in range((date_from - first_day).days + days)]
+        if not dates:
+            return []
+        _, calendars, index = await asyncio.gather(
+            self.ensure_boxes(), self.calendars(dates), get_availability_index()
+        )
+        return self.find_free_slots(
+            calendars, dates, index, duration_minutes, box_ids, doctor_id, equipment, capacity, step_minutes, limit,
+            not_before=now
+        )
+
+    def find_free_slots(
+        self,
+        calendars: Dict[date, DayCalendar],
+        dates: Sequence[date],
+        index: AvailabilityIndex,
+        duration_minutes: int,
+        box_ids: Optional[Sequence[str]] = None,
+        doctor_id: Optional[str] = None,
+        equipment: Sequence[str] = (),
+        capacity: int = 1,
+        step_minutes: int = 15,
+        limit: int = 10,
+        not_before: Optional[datetime] = None
+    ) -> List[BoxFreeSlot]:
+        """Synchronous part of ``free_slots`` over already loaded state"""
+        cells = -(-duration_minutes // CELL)
+        starts = stride_mask(max(1, step_minutes // CELL))
+
+        slots: List[BoxFreeSlot] = []
+        for day in dates:
+            calendar = calendars[day]
+            allowed = starts
+            if not_before is not None and day <= not_before.date():
+                if day < not_before.date():
+                    continue
+                # Starts before the current time, rounded up to a cell
+                elapsed = not_before.hour * 3600 + not_before.minute * 60 + not_before.second
+                allowed &= ~range_mask(0, min(CELLS_PER_DAY, -(-elapsed // (CELL * 60))))
+            if doctor_id is not None:
+                allowed &= schedule_fits(index.schedules_for_doctor(doctor_id, day), cells)
+                allowed &= fit_mask(~calendar.doctors.get(doctor_id), cells)
+            if not allowed:
+                continue
+
+            fits = []
+            for profile, blocked in self.candidates(calendar, day, equipment, capacity, box_ids):
+                fit = fit_mask(~blocked, cells) & allowed
+                if fit:
+                    fits.append((profile, fit))
+            if box_ids is None:
+                fits.sort(key=lambda item: item[0].name)
+            any_box = 0
+            for _, fit in fits:
+                any_box |= fit
+
+            for cell in set_cells(any_box):
+                for profile, fit in fits:
+                    if fit >> cell & 1:
+                        slots.append(BoxFreeSlot(
+                            box_id=profile.box_id,
+                            name=profile.name,
+                            location=profile.location,
+                            floor=profile.floor,
+                            date=day,
+                            start_time=to_time(cell * CELL),
+                            end_time=_end_time(cell * CELL, duration_minutes)
+                        ))
+                        if len(slots) >= limit:
+                            return slots
+        return slots
+
+    # Incremental updates
+
+    def apply(self, change: dict):
+        """Apply one change from this or another worker"""
+        kind = change["op"]
+        if kind == "box":
+            profile = BoxProfile.from_document(change["box"])
+            self.boxes[profile.box_id] = profile
+            return
+        if kind == "box_deleted":
+            self.boxes.pop(change["box_id"], None)
+            return
+
+        calendar = self.days.get(date.fromisoformat(change["date"]))
+        if calendar is None:
+            return  # Not loaded; it will be read fresh when needed
+        if kind == "add":
+            mask = range_mask(*cell_range(change["start"], change["end"]))
+            calendar.add(change["id"], change["box_id"], change.get("doctor_id"), mask)
+        elif kind == "remove":
+            calendar.remove(change["id"], change["box_id"], change.get("doctor_id"))
+
+    async def _publish(self, changes: List[dict]):
+        for change in changes:
+            self.apply(change)
+        redis = get_redis()
+        if redis is not None and changes:
+            try:
+                await redis.publish(CHANNEL, json.dumps({"worker": WORKER_ID, "changes": changes}))
+            except Exception as e:
+                logger.warning(f"Box matcher broadcast failed: {e}")
+
+    @staticmethod
+    def _reservation_change(op: str, reservation) -> dict:
+        return {
+            "op": op,
+            "id": str(reservation.id),
+            "box_id": reservation.box_id,
+            "doctor_id": reservation.doctor_id,
+            "date": reservation.date.isoformat(),
+            "start": to_minutes(reservation.start_time),
+            "end": MINUTES_PER_DAY if reservation.end_time == time.max else to_minutes(reservation.end_time)
+        }
+
+    async def record_created_many(self, reservations: Iterable):
+        await self._publish([self._reservation_change("add", r) for r in reservations if r.status in ACTIVE_STATUSES])
+
+    async def record_created(self, reservation):
+        await self.record_created_many([reservation])
+
+    async def record_status_change(self, reservation):
+        if reservation.status not in ACTIVE_STATUSES:
+            await self._publish([self._reservation_change("remove", reservation)])
+
+    async def box_changed(self, box: Box):
+        await self._publish([{"op": "box", "box": box.model_dump(mode="json")}])
+
+    async def box_deleted(self, box_id: str):
+        await self._publish([{"op": "box_deleted", "box_id": box_id}])
+
+    # Cross-worker sync
+
+    async def start(self):
+        """Follow changes made by the other workers"""
+        redis = get_redis()
+        if redis is None or self._listener is not None:
+            return
+        self._listener = asyncio.create_task(self._listen(redis))
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self, redis):
+        while True:
+            try:
+                pubsub = redis.pubsub()
+                await pubsub.subscribe(CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        payload = json.loads(message["data"])
+                        if payload["worker"] != WORKER_ID:
+                            for change in payload["changes"]:
+                                self.apply(change)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Changes may have been missed; reload on next use
+                logger.warning(f"Box matcher listener error: {e}")
+                self.days.clear()
+                self.boxes_loaded_at = None
+                await asyncio.sleep(1)
+
+
+box_matcher = BoxMatcher(max_days=settings.BOX_MATCHER_MAX_DAYS, ttl=settings.BOX_MATCHER_TTL)
@@ -0,0 +1,310 @@
+"""
+Bulk reservation booking.
+
+A batch is validated with a few set-based reads instead of the per-item
+lookups of ReservationService.create_reservation:
+
+1. patients, doctors and boxes of the whole batch, with two $in queries;
+2. doctor schedules, from the in-process availability index;
+3. active reservations of the batch's boxes and doctors on its dates, in
+   one query, folded into box-day and doctor-day bitmaps so each item's
+   overlap test (against them and the items accepted before it) is an AND.
+
+Accepted items then claim their slot cells with one unordered insert_many
+(a cell taken meanwhile rejects only the item that needs it) and are
+written with one unordered insert_many. In ``all_or_nothing`` mode any
+rejected item aborts the batch and the writes run in a transaction, or
+are compensated on deployments without transaction support.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import status
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from app.models.box import Box
+from app.models.reservation import (
+    Reservation,
+    ReservationBulkCreate,
+    ReservationBulkItemResult,
+    ReservationBulkResult,
+    ReservationCalendarSlot,
+    ReservationCreate
+)
+from app.models.slot_claim import SlotClaim
+from app.models.user import User
+from app.services.availability_index import AvailabilityIndex, get_availability_index
+from app.services.box_matcher import box_matcher
+from app.services.day_bitmaps import time_mask
+from app.services.reservation_service import ACTIVE_STATUSES, ReservationService
+from app.services.rollup_service import RollupService
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+TRANSACTIONS_UNSUPPORTED = 20  # IllegalOperation on standalone servers
+
+# (owner field, owner id, date) -> bitmap of booked cells
+Booked = Dict[Tuple[str, str, date], int]
+
+
+def _object_ids(values: Iterable[str]) -> List[ObjectId]:
+    return [ObjectId(value) for value in values if ObjectId.is_valid(value)]
+
+
+def _failure(index: int, status_code: int, detail: str) -> ReservationBulkItemResult:
+    return ReservationBulkItemResult(index=index, status_code=status_code, detail=detail)
+
+
+class BulkReservationService:
+    """Set-based validation and batched writes for many reservations"""
+
+    @staticmethod
+    async def load_parties(items: List[ReservationCreate]) -> Tuple[Dict[str, User], Dict[str, Box]]:
+        """Patients, doctors and boxes referenced by a batch, by id"""
+        user_ids = {item.patient_id for item in items} | {item.doctor_id for item in items}
+        box_ids = {item.box_id for item in items}
+        users, boxes = await asyncio.gather(
+            User.find({"_id": {"$in": _object_ids(user_ids)}}).to_list(),
+            Box.find({"_id": {"$in": _object_ids(box_ids)}}).to_list()
+        )
+        return {str(user.id): user for user in users}, {str(box.id): box for box in boxes}
+
+    @staticmethod
+    async def load_booked(items: List[ReservationCreate]) -> Booked:
+        """Active reservations of the batch's boxes and doctors on its dates"""
+        query = {
+            "date": {"$in": sorted({item.date.isoformat() for item in items})},
+            "status": {"$in": ACTIVE_STATUSES},
+            "$or": [
+                {"box_id": {"$in": list({item.box_id for item in items})}},
+                {"doctor_id": {"$in": list({item.doctor_id for item in items})}}
+            ]
+        }
+        booked: Booked = defaultdict(int)
+        for slot in await Reservation.find(query).project(ReservationCalendarSlot).to_list():
+            mask = time_mask(slot.start_time, slot.end_time)
+            booked[("box_id", slot.box_id, slot.date)] |= mask
+            booked[("doctor_id", slot.doctor_id, slot.date)] |= mask
+        return booked
+
+    @staticmethod
+    def check_item(
+        item: ReservationCreate,
+        end_time: time,
+        created_by: User,
+        users: Dict[str, User],
+        boxes: Dict[str, Box],
+        booked: Booked,
+        schedules: Optional[AvailabilityIndex]
+    ) -> Optional[Tuple[int, str]]:
+        """(status code, detail) when an item cannot be booked"""
+        if created_by.is_patient() and item.patient_id != str(created_by.id):
+            return status.HTTP_403_FORBIDDEN, "Patients can only book reservations for themselves"
+
+        error = ReservationService.party_error(
+            users.get(item.patient_id), users.get(item.doctor_id), boxes.get(item.box_id)
+        )
+        if error:
+            return error
+
+        if schedules is not None and not schedules.covers(item.doctor_id, item.date, item.start_time, end_time):
+            return status.HTTP_422_UNPROCESSABLE_ENTITY, "Outside the doctor's schedule"
+        # Same cells the slot claims will lock
+        mask = time_mask(item.start_time, end_time)
+        if booked[("box_id", item.box_id, item.date)] & mask:
+            return status.HTTP_409_CONFLICT, "Box is already booked for this time"
+        if booked[("doctor_id", item.doctor_id, item.date)] & mask:
+            return status.HTTP_409_CONFLICT, "Doctor is already booked for this time"
+        return None
+
+    @staticmethod
+    async def create_reservations(
+        data: ReservationBulkCreate,
+        created_by: User,
+        extra_fields: Optional[List[dict]] = None
+    ) -> ReservationBulkResult:
+        """Validate and book a batch of reservations (extra_fields are set on each item's document)"""
+        items = data.items
+        all_or_nothing = data.mode == "all_or_nothing"
+        schedules = await get_availability_index() if data.check_schedule else None
+        (users, boxes), booked = await asyncio.gather(
+            BulkReservationService.load_parties(items),
+            BulkReservationService.load_booked(items)
+        )
+
+        results: List[Optional[ReservationBulkItemResult]] = [None] * len(items)
+        accepted: List[Tuple[int, Reservation]] = []
+        for index, item in enumerate(items):
+            end_time = Reservation.compute_end_time(item.start_time, item.duration_minutes)
+            error = BulkReservationService.check_item(item, end_time, created_by, users, boxes, booked, schedules)
+            if error:
+                results[index] = _failure(index, *error)
+                continue
+            reservation = ReservationService.build_reservation(
+                item, end_time, users[item.patient_id], users[item.doctor_id], boxes[item.box_id], created_by
+            )
+            if extra_fields:
+                for field, value in extra_fields[index].items():
+                    setattr(reservation, field, value)
+            # Later items of the batch must not overlap this one
+            mask = time_mask(item.start_time, end_time)
+            booked[("box_id", item.box_id, item.date)] |= mask
+            booked[("doctor_id", item.doctor_id, item.date)] |= mask
+            accepted.append((index, reservation))
+
+        if all_or_nothing and len(accepted) < len(items):
+            failures = {}
+            aborted = True
+        elif all_or_nothing:
+            failures = await BulkReservationService.write_all_or_nothing(accepted)
+            aborted = bool(failures)
+        else:
+            failures = await BulkReservationService.write_best_effort(accepted)
+            aborted = False
+
+        created = []
+        for index, reservation in accepted:
+            if index in failures:
+                results[index] = _failure(index, *failures[index])
+            elif aborted:
+                results[index] = _failure(
+                    index, status.HTTP_424_FAILED_DEPENDENCY, "Not booked: another item of the batch failed"
+                )
+            else:
+                created.append(reservation)
+                results[index] = ReservationBulkItemResult(
+                    index=index,
+                    status_code=status.HTTP_201_CREATED,
+                    reservation_id=str(reservation.id),
+                    confirmation_code=reservation.confirmation_code
+                )
+
+        if created:
+            await RollupService.record_created_many(created)
+            await box_matcher.record_created_many(created)
+        logger.info(f"Bulk booking ({data.mode}): {len(created)} of {len(items)} reservations created")
+        return ReservationBulkResult(
+            mode=data.mode,
+            committed=bool(created),
+            created=len(created),
+            failed=len(items) - len(created),
+            results=results
+        )
+
+    @staticmethod
+    def claim_documents(accepted: List[Tuple[int, Reservation]], pending: bool = True) -> Tuple[List[dict], List[int]]:
+        """Slot claim documents of a batch and the batch index owning each"""
+        now = datetime.utcnow()
+        pending_expiry = SlotClaim.pending_expiry(now) if pending else None
+        documents, owners = [], []
+        for index, reservation in accepted:
+            keys = ReservationService.claim_keys(
+                reservation.box_id, reservation.doctor_id, reservation.date,
+                reservation.start_time, reservation.end_time
+            )
+            expires_at = pending_expiry or SlotClaim.day_expiry(reservation.date)
+            for key in keys:
+                documents.append({
+                    "_id": key, "reservation_id": str(reservation.id), "created_at": now, "expires_at": expires_at
+                })
+                owners.append(index)
+        return documents, owners
+
+    @staticmethod
+    def write_failures(error: BulkWriteError, owners: List[int], detail: str) -> Dict[int, Tuple[int, str]]:
+        """Batch indexes whose documents failed in a bulk insert"""
+        failures = {}
+        for write_error in error.details.get("writeErrors", []):
+            index = owners[write_error["index"]]
+            if write_error.get("code") == DUPLICATE_KEY:
+                failures[index] = (status.HTTP_409_CONFLICT, detail)
+            else:
+                failures.setdefault(index, (status.HTTP_500_INTERNAL_SERVER_ERROR, "Could not save reservation"))
+        return failures
+
+    @staticmethod
+    async def write_best_effort(accepted: List[Tuple[int, Reservation]]) -> Dict[int, Tuple[int, str]]:
+        """Claim and insert independently per item; returns the items that failed"""
+        if not accepted:
+            return {}
+        claims = SlotClaim.get_motor_collection()
+        documents, owners = BulkReservationService.claim_documents(accepted)
+        failures: Dict[int, Tuple[int, str]] = {}
+        try:
+            await claims.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            failures = BulkReservationService.write_failures(e, owners, "Time slot is no longer available")
+
+        by_index = dict(accepted)
+        if failures:
+            await claims.delete_many({"reservation_id": {"$in": [str(by_index[i].id) for i in failures]}})
+
+        to_insert = [(index, reservation) for index, reservation in accepted if index not in failures]
+        if not to_insert:
+            return failures
+        try:
+            await Reservation.insert_many([reservation for _, reservation in to_insert], ordered=False)
+        except BulkWriteError as e:
+            insert_failures = BulkReservationService.write_failures(
+                e, [index for index, _ in to_insert], "Reservation already exists"
+            )
+            await claims.delete_many({"reservation_id": {"$in": [str(by_index[i].id) for i in insert_failures]}})
+            failures.update(insert_failures)
+        await ReservationService.confirm_slots(reservation for index, reservation in to_insert if index not in failures)
+        return failures
+
+    @staticmethod
+    async def write_all_or_nothing(accepted: List[Tuple[int, Reservation]]) -> Dict[int, Tuple[int, str]]:
+        """Claim and insert the whole batch atomically; returns the item that failed, if any"""
+        claims = SlotClaim.get_motor_collection()
+        # Claims committed with their reservations need no pending phase
+        documents, owners = BulkReservationService.claim_documents(accepted, pending=False)
+        indexes = [index for index, _ in accepted]
+        reservations = [reservation for _, reservation in accepted]
+        client = claims.database.client
+        try:
+            async with await client.start_session() as session:
+                async with session.start_transaction():
+                    try:
+                        await claims.insert_many(documents, ordered=True, session=session)
+                    except BulkWriteError as e:
+                        # Returning from the block would commit the claims written so far
+                        await session.abort_transaction()
+                        return BulkReservationService.write_failures(e, owners, "Time slot is no longer available")
+                    try:
+                        await Reservation.insert_many(reservations, ordered=True, session=session)
+                    except BulkWriteError as e:
+                        await session.abort_transaction()
+                        return BulkReservationService.write_failures(e, indexes, "Reservation already exists")
+            return {}
+        except OperationFailure as e:
+            if e.code != TRANSACTIONS_UNSUPPORTED or isinstance(e, BulkWriteError):
+                raise
+            logger.warning("MongoDB transactions unavailable; writing bulk booking with compensation")
+
+        # Without transactions the ordered claim insert stops at the first taken
+        # cell, and whatever was written is removed again
+        documents, owners = BulkReservationService.claim_documents(accepted)
+        reservation_ids = [str(reservation.id) for reservation in reservations]
+        try:
+            await claims.insert_many(documents, ordered=True)
+        except BulkWriteError as e:
+            await claims.delete_many({"reservation_id": {"$in": reservation_ids}})
+            return BulkReservationService.write_failures(e, owners, "Time slot is no longer available")
+        try:
+            await Reservation.insert_many(reservations, ordered=True)
+        except Exception as e:
+            await asyncio.gather(
+                claims.delete_many({"reservation_id": {"$in": reservation_ids}}),
+                Reservation.get_motor_collection().delete_many({"_id": {"$in": [r.id for r in reservations]}})
+            )
+            if isinstance(e, BulkWriteError):
+                return BulkReservationService.write_failures(e, indexes, "Reservation already exists")
+            raise
+        await ReservationService.confirm_slots(reservations)
+        return {}
@@ -0,0 +1,155 @@
+"""
+Day bitmaps of box and doctor occupancy.
+
+A box-day or doctor-day is a Python int used as a fixed-width bitmap: one
+bit per BOOKING_SLOT_MINUTES cell (288 bits at 5 minutes), set when an
+active reservation holds the cell. These are the cells slot claims lock,
+so the bitmaps answer exactly what a booking will be judged by:
+
+- overlap test: ``occupied & range_mask(first, last)``;
+- where an appointment of ``n`` cells fits: ``fit_mask(free, n)``, the AND
+  of shifted copies of the free mask (about log2(n) shifts), whose set
+  bits are the possible first cells;
+- first free slots: the lowest set bits of that mask, across boxes by
+  OR-ing their fit masks.
+
+A 288-bit int is five machine words, so each of these is a few C-level
+word operations instead of a loop over reservation objects.
+
+The bitmaps are not stored: slot claims are already the persisted
+occupancy, and BoxMatcher rebuilds the bitmaps of a date range from the
+reservations in one query and keeps them in memory, updated as bookings
+change.
+"""
+import time as timer
+from datetime import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from app.core.config import settings
+from app.services.slot_grid import MINUTES_PER_DAY, to_minutes
+
+CELL = settings.BOOKING_SLOT_MINUTES
+CELLS_PER_DAY = MINUTES_PER_DAY // CELL
+FULL_DAY = (1 << CELLS_PER_DAY) - 1
+
+
+def cell_range(start_minute: int, end_minute: int) -> Tuple[int, int]:
+    """First cell and end cell (exclusive) touched by a minute range"""
+    return start_minute // CELL, min(CELLS_PER_DAY, -(-end_minute // CELL))
+
+
+def range_mask(first: int, last: int) -> int:
+    return ((1 << (last - first)) - 1) << first if last > first else 0
+
+
+def time_mask(start_time: time, end_time: time) -> int:
+    """Cells an appointment claims (``time.max`` ends at midnight)"""
+    end_minute = MINUTES_PER_DAY if end_time == time.max else to_minutes(end_time)
+    return range_mask(*cell_range(to_minutes(start_time), end_minute))
+
+
+def hours_mask(start_minute: int, end_minute: int) -> int:
+    """Cells wholly inside opening hours"""
+    return range_mask(-(-start_minute // CELL), min(CELLS_PER_DAY, end_minute // CELL))
+
+
+def fit_mask(free: int, cells: int) -> int:
+    """Cells starting a run of ``cells`` free cells"""
+    fits = free & FULL_DAY
+    span = 1
+    while span < cells and fits:
+        # Bit i covers i..i+span-1; AND with itself shifted extends the run
+        step = min(span, cells - span)
+        fits &= fits >> step
+        span += step
+    return fits
+
+
+def stride_mask(step_cells: int, offset: int = 0) -> int:
+    """Every ``step_cells``-th cell from ``offset``"""
+    mask = 0
+    for cell in range(offset % step_cells, CELLS_PER_DAY, step_cells):
+        mask |= 1 << cell
+    return mask
+
+
+def set_cells(mask: int) -> Iterator[int]:
+    """Set cells, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def free_run(blocked: int, start: int, end: int) -> Tuple[int, int]:
+    """Free cells right before ``start`` and right after ``end``"""
+    before = start - (blocked & ((1 << start) - 1)).bit_length()
+    after = blocked >> end
+    return before, (after & -after).bit_length() - 1 if after else CELLS_PER_DAY - end
+
+
+def schedule_fits(schedules: Iterable, cells: int) -> int:
+    """
+    Cells where an appointment of ``cells`` cells can start within a
+    doctor's schedules: inside one available time slot and clear of the
+    lunch break (the rules of AvailabilityIndex.covers).
+    """
+    fits = 0
+    for schedule in schedules:
+        inside = 0
+        for time_slot in schedule.time_slots:
+            if time_slot.is_available:
+                end_minute = MINUTES_PER_DAY if time_slot.end_time == time.max else to_minutes(time_slot.end_time)
+                inside |= fit_mask(hours_mask(to_minutes(time_slot.start_time), end_minute), cells)
+        if schedule.lunch_break_start and schedule.lunch_break_end:
+            inside &= fit_mask(~time_mask(schedule.lunch_break_start, schedule.lunch_break_end), cells)
+        fits |= inside
+    return fits
+
+
+class Occupancy:
+    """Occupied cells per owner (box or doctor) on one date"""
+    __slots__ = ("occupied", "by_owner")
+
+    def __init__(self):
+        self.occupied: Dict[str, int] = {}
+        self.by_owner: Dict[str, Dict[str, int]] = {}  # owner -> reservation_id -> mask
+
+    def get(self, owner_id: Optional[str]) -> int:
+        return self.occupied.get(owner_id, 0)
+
+    def add(self, reservation_id: str, owner_id: str, mask: int):
+        reservations = self.by_owner.setdefault(owner_id, {})
+        if reservation_id not in reservations:
+            reservations[reservation_id] = mask
+            self.occupied[owner_id] = self.occupied.get(owner_id, 0) | mask
+
+    def remove(self, reservation_id: str, owner_id: str):
+        reservations = self.by_owner.get(owner_id)
+        if reservations is None or reservations.pop(reservation_id, None) is None:
+            return
+        # Reservations of an owner never share cells, but rebuild to be safe
+        occupied = 0
+        for mask in reservations.values():
+            occupied |= mask
+        self.occupied[owner_id] = occupied
+
+
+class DayCalendar:
+    """Box-day and doctor-day bitmaps of one date"""
+    __slots__ = ("boxes", "doctors", "loaded_at")
+
+    def __init__(self):
+        self.boxes = Occupancy()
+        self.doctors = Occupancy()
+        self.loaded_at = timer.monotonic()
+
+    def add(self, reservation_id: str, box_id: str, doctor_id: Optional[str], mask: int):
+        self.boxes.add(reservation_id, box_id, mask)
+        if doctor_id:
+            self.doctors.add(reservation_id, doctor_id, mask)
+
+    def remove(self, reservation_id: str, box_id: str, doctor_id: Optional[str]):
+        self.boxes.remove(reservation_id, box_id)
+        if doctor_id:
+            self.doctors.remove(reservation_id, doctor_id)
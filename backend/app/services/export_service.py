@@ -0,0 +1,138 @@
+"""
+Streaming reservation exports.
+
+Rows are read from a raw Motor cursor (projection + batch_size) instead of
+loading Reservation documents, so memory stays constant whatever the size
+of the report. CSV is emitted in chunks while the cursor is still being
+consumed. XLSX uses openpyxl's write-only mode into a temporary file
+(a zip archive can only be finalized once all rows are written) and is
+then streamed from disk.
+
+Text cells that a spreadsheet would read as a formula (patient names and
+other user input starting with =, +, -, @) are prefixed with a quote in
+both formats.
+"""
+import csv
+import io
+import tempfile
+from datetime import date
+from typing import AsyncIterator, Iterator, List, Optional
+
+from openpyxl import Workbook
+from starlette.concurrency import run_in_threadpool
+
+from app.models.reservation import Reservation
+
+EXPORT_COLUMNS = [
+    "id",
+    "date",
+    "start_time",
+    "end_time",
+    "duration_minutes",
+    "status",
+    "appointment_type",
+    "priority",
+    "patient_id",
+    "patient_name",
+    "doctor_id",
+    "doctor_name",
+    "doctor_specialization",
+    "box_id",
+    "box_name",
+    "box_location",
+    "created_at"
+]
+
+CURSOR_BATCH_SIZE = 1000
+CSV_CHUNK_SIZE = 64 * 1024
+FILE_CHUNK_SIZE = 256 * 1024
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+class ReservationExportService:
+    """Reservation report exports"""
+
+    @staticmethod
+    def build_query(
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        box_id: Optional[str] = None,
+        doctor_id: Optional[str] = None,
+        status: Optional[List[str]] = None
+    ) -> dict:
+        """MongoDB filter for the export"""
+        query = {}
+        if date_from or date_to:
+            query["date"] = {}
+            if date_from:
+                query["date"]["$gte"] = date_from.isoformat()
+            if date_to:
+                query["date"]["$lte"] = date_to.isoformat()
+        if box_id:
+            query["box_id"] = box_id
+        if doctor_id:
+            query["doctor_id"] = doctor_id
+        if status:
+            query["status"] = {"$in": status}
+        return query
+
+    @staticmethod
+    async def iter_rows(query: dict) -> AsyncIterator[list]:
+        """Export rows straight from a Motor cursor"""
+        projection = {field: 1 for field in EXPORT_COLUMNS if field != "id"}
+        cursor = Reservation.get_motor_collection().find(
+            query,
+            projection,
+            batch_size=CURSOR_BATCH_SIZE
+        ).sort("date", 1)
+
+        async for document in cursor:
+            document["id"] = str(document.pop("_id"))
+            yield [escape_formula(document.get(field)) for field in EXPORT_COLUMNS]
+
+    @staticmethod
+    async def stream_csv(query: dict) -> AsyncIterator[str]:
+        """CSV export, yielded in chunks as rows arrive"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+
+        async for row in ReservationExportService.iter_rows(query):
+            writer.writerow(row)
+            if buffer.tell() >= CSV_CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        yield buffer.getvalue()
+
+    @staticmethod
+    async def stream_xlsx(query: dict) -> AsyncIterator[bytes]:
+        """XLSX export built in write-only mode and streamed from a temp file"""
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Reservas")
+        sheet.append(EXPORT_COLUMNS)
+
+        async for row in ReservationExportService.iter_rows(query):
+            sheet.append(row)
+
+        with tempfile.TemporaryFile(suffix=".xlsx") as output:
+            await run_in_threadpool(workbook.save, output)
+            output.seek(0)
+            for chunk in _read_chunks(output):
+                yield chunk
+
+
+def escape_formula(value):
+    """Keep spreadsheets from evaluating a text cell as a formula"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _read_chunks(file) -> Iterator[bytes]:
+    while True:
+        chunk = file.read(FILE_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
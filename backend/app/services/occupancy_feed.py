@@ -0,0 +1,342 @@
+"""
+Live box occupancy for reception screens.
+
+Each worker holds one upstream feed and fans it out to its WebSocket and
+SSE subscribers:
+
+- ``change_stream``: a single MongoDB change stream on the database,
+  filtered server-side to box writes and reservation check-ins/check-outs
+  (needs a replica set).
+- ``events``: Box document event hooks and ReservationService publish the
+  same events on a Redis channel that every worker follows (or hand them
+  straight to the local subscribers when Redis is not configured).
+
+``auto`` uses the change stream when MongoDB supports it and events
+otherwise.
+
+The feed keeps the occupancy of every box in memory, so a new subscriber
+gets a snapshot without a query. Subscribers are indexed by their
+(floor, location) filter, so an event only visits the subscribers that
+want it. Each subscriber has a bounded queue; one that falls behind has
+its backlog replaced by a single ``resync`` event, after which the client
+should reload the snapshot, and never slows down the others. Every
+subscriber gets a ``resync`` when the Redis listener reconnects, since
+events published while it was down are lost; the box states are
+reloaded first.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "occupancy"
+STARTUP_RETRY_MAX_DELAY = 30  # seconds between attempts to start the feed, doubling up to this
+BOX_FIELDS = ("name", "floor", "location", "status", "current_reservation_id", "current_doctor_id")
+CHECK_EVENTS = {
+    settings.RESERVATION_STATUS["IN_PROGRESS"]: "check_in",
+    settings.RESERVATION_STATUS["COMPLETED"]: "check_out"
+}
+# Server-side filter of the change stream
+CHANGE_STREAM_PIPELINE = [
+    {"$match": {"$or": [
+        {"ns.coll": "boxes", "operationType": {"$in": ["insert", "replace", "update", "delete"]}},
+        {
+            "ns.coll": "reservations",
+            "operationType": "update",
+            "updateDescription.updatedFields.status": {"$in": list(CHECK_EVENTS)}
+        }
+    ]}}
+]
+
+Filter = Tuple[Optional[int], Optional[str]]
+
+
+def box_state(box_id: str, document: Dict[str, Any]) -> Dict[str, Any]:
+    state = {"box_id": box_id}
+    for field in BOX_FIELDS:
+        state[field] = document.get(field)
+    return state
+
+
+class Subscription:
+    """One connected client: its filter and bounded event queue"""
+
+    def __init__(self, floor: Optional[int], location: Optional[str], queue_size: int):
+        self.floor = floor
+        self.location = location
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.resyncs = 0
+
+    @property
+    def filter(self) -> Filter:
+        return self.floor, self.location
+
+    def push(self, event: Dict[str, Any]):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too far behind: replace the backlog with a reload request
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+            self.resyncs += 1
+
+    async def next_event(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Next event, or None after ``timeout`` seconds without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class OccupancyFeed:
+    """Box occupancy state plus fan-out of changes to subscribers"""
+
+    def __init__(self, source: str, queue_size: int, max_subscribers: int):
+        self.configured_source = source
+        self.source: Optional[str] = None
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.boxes: Dict[str, Dict[str, Any]] = {}
+        self.subscribers: Dict[Filter, Set[Subscription]] = {}
+        self.subscriber_count = 0
+        self.events_published = 0
+        self.ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # Subscribers
+
+    def subscribe(self, floor: Optional[int] = None, location: Optional[str] = None) -> Optional[Subscription]:
+        """Register a client, or None when the worker is at OCCUPANCY_MAX_SUBSCRIBERS"""
+        if self.subscriber_count >= self.max_subscribers:
+            return None
+        subscription = Subscription(floor, location, self.queue_size)
+        self.subscribers.setdefault(subscription.filter, set()).add(subscription)
+        self.subscriber_count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        group = self.subscribers.get(subscription.filter)
+        if group is not None and subscription in group:
+            group.discard(subscription)
+            self.subscriber_count -= 1
+            if not group:
+                del self.subscribers[subscription.filter]
+
+    def snapshot(self, floor: Optional[int] = None, location: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [
+            state for state in self.boxes.values()
+            if (floor is None or state["floor"] == floor) and (location is None or state["location"] == location)
+        ]
+
+    def resync(self):
+        """Ask every subscriber to reload the snapshot"""
+        for group in self.subscribers.values():
+            for subscription in group:
+                subscription.push({"type": "resync"})
+
+    def dispatch(self, event: Dict[str, Any]):
+        """Apply an event to the box states and queue it for matching subscribers"""
+        box_id = event.get("box_id")
+        if event["type"] == "box":
+            self.boxes[box_id] = {key: value for key, value in event.items() if key not in ("type", "at")}
+        elif event["type"] == "box_deleted":
+            self.boxes.pop(box_id, None)
+
+        # Reservation events carry no floor/location; take the box's
+        state = self.boxes.get(box_id) or event
+        floor, location = state.get("floor"), state.get("location")
+        self.events_published += 1
+        for key in {(None, None), (floor, None), (None, location), (floor, location)}:
+            for subscription in self.subscribers.get(key, ()):
+                subscription.push(event)
+
+    # Upstream
+
+    async def start(self):
+        """Load box states, then follow changes in the background"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.ready.clear()
+
+    async def _load_boxes(self):
+        from app.models.box import Box
+
+        boxes = {}
+        async for document in Box.get_motor_collection().find({}, {field: 1 for field in BOX_FIELDS}):
+            boxes[str(document["_id"])] = box_state(str(document["_id"]), document)
+        self.boxes = boxes
+        logger.info(f"Occupancy feed loaded {len(self.boxes)} boxes")
+
+    async def _run(self):
+        from app.core.database import db
+
+        delay = 1
+        while True:
+            try:
+                stream, first_change = await self._connect(db.database)
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Not ready yet: subscribers get 503 until a retry succeeds
+                logger.warning(f"Occupancy feed failed to start ({e}); retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, STARTUP_RETRY_MAX_DELAY)
+        self.ready.set()
+
+        if self.source == "change_stream":
+            await self._follow_change_stream(db.database, stream, first_change)
+        else:
+            await self._follow_redis()
+
+    async def _connect(self, database):
+        """Load box states and pick the source; returns the open change stream and its first change"""
+        await self._load_boxes()
+
+        self.source = self.configured_source
+        stream = first_change = None
+        if self.source in ("auto", "change_stream"):
+            try:
+                stream = database.watch(CHANGE_STREAM_PIPELINE, full_document="updateLookup")
+                # The probe may already return a change; it is dispatched by the follower
+                first_change = await stream.try_next()
+                self.source = "change_stream"
+            except Exception as e:
+                if self.configured_source == "change_stream":
+                    raise
+                logger.info(f"Change streams unavailable ({e}); occupancy feed uses document events")
+                self.source = "events"
+        return stream, first_change
+
+    async def _follow_change_stream(self, database, stream, first_change: Optional[Dict[str, Any]] = None):
+        if first_change is not None:
+            event = self._event_from_change(first_change)
+            if event is not None:
+                self.dispatch(event)
+        while True:
+            try:
+                async with stream:
+                    while stream.alive:
+                        change = await stream.try_next()
+                        if change is not None:
+                            event = self._event_from_change(change)
+                            if event is not None:
+                                self.dispatch(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Occupancy change stream error: {e}")
+                await asyncio.sleep(1)
+            resume_token = stream.resume_token
+            stream = database.watch(
+                CHANGE_STREAM_PIPELINE, full_document="updateLookup", resume_after=resume_token
+            )
+
+    def _event_from_change(self, change: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        at = datetime.utcnow().isoformat()
+        document_id = str(change["documentKey"]["_id"])
+        if change["ns"]["coll"] == "boxes":
+            if change["operationType"] == "delete":
+                return {"type": "box_deleted", "box_id": document_id, "at": at}
+            document = change.get("fullDocument")
+            if document is None:
+                return None
+            return {"type": "box", **box_state(document_id, document), "at": at}
+
+        document = change.get("fullDocument") or {}
+        new_status = change["updateDescription"]["updatedFields"]["status"]
+        return {
+            "type": CHECK_EVENTS[new_status],
+            "reservation_id": document_id,
+            "box_id": document.get("box_id"),
+            "doctor_id": document.get("doctor_id"),
+            "at": at
+        }
+
+    async def _follow_redis(self):
+        redis = get_redis()
+        if redis is None:
+            return
+        reconnecting = False
+        while True:
+            try:
+                pubsub = redis.pubsub()
+                await pubsub.subscribe(CHANNEL)
+                if reconnecting:
+                    # Subscribed again before reloading, so no change falls in between
+                    await self._load_boxes()
+                    self.resync()
+                    reconnecting = False
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.dispatch(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Occupancy feed listener error: {e}")
+                reconnecting = True
+                await asyncio.sleep(1)
+
+    # Producers (events source only; a change stream sees the writes itself)
+
+    async def publish(self, event: Dict[str, Any]):
+        if self.source != "events":
+            return
+        redis = get_redis()
+        if redis is None:
+            self.dispatch(event)
+            return
+        try:
+            await redis.publish(CHANNEL, json.dumps(event, default=str))
+        except Exception as e:
+            logger.warning(f"Occupancy event publish failed: {e}")
+            self.dispatch(event)
+
+    async def box_changed(self, box):
+        await self.publish({"type": "box", **box_state(str(box.id), box.model_dump()), "at": datetime.utcnow().isoformat()})
+
+    async def box_deleted(self, box_id: str):
+        await self.publish({"type": "box_deleted", "box_id": box_id, "at": datetime.utcnow().isoformat()})
+
+    async def reservation_changed(self, reservation):
+        kind = CHECK_EVENTS.get(reservation.status)
+        if kind is not None:
+            await self.publish({
+                "type": kind,
+                "reservation_id": str(reservation.id),
+                "box_id": reservation.box_id,
+                "doctor_id": reservation.doctor_id,
+                "at": datetime.utcnow().isoformat()
+            })
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "boxes": len(self.boxes),
+            "subscribers": self.subscriber_count,
+            "events_published": self.events_published,
+            "resyncs": sum(s.resyncs for group in self.subscribers.values() for s in group)
+        }
+
+
+occupancy_feed = OccupancyFeed(
+    source=settings.OCCUPANCY_FEED_SOURCE,
+    queue_size=settings.OCCUPANCY_QUEUE_SIZE,
+    max_subscribers=settings.OCCUPANCY_MAX_SUBSCRIBERS
+)
@@ -0,0 +1,270 @@
+"""
+Recurrence rule engine for reservation series.
+
+A series stores an RFC 5545 RRULE (parsed and validated with
+python-dateutil) and occurrences are only expanded for the date window
+being looked at. Rule strings are parsed once, and rules are compiled
+once per (rule, dtstart) and cached:
+
+- DAILY and WEEKLY rules using only INTERVAL, COUNT, UNTIL, BYDAY and
+  WKST (the shapes clinics use for treatment series) are reduced to a
+  period in days plus day offsets inside it. Expanding a window is then
+  pure arithmetic on ordinals, O(occurrences in the window) however far
+  the window is from DTSTART, COUNT included.
+- Any other rule falls back to dateutil iteration, memoized: occurrences
+  seen so far are kept as sorted ordinals and only extended when a later
+  window is requested, so repeated windows are a bisect.
+
+Calendar views ask for the same few windows over and over, so expand_many
+also keeps each series' expanded window, keyed by the series' updated_at:
+saving an exception bumps it, and the stale entry is never hit again.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from math import gcd
+from operator import attrgetter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from dateutil.rrule import DAILY, WEEKLY, rrule, rrulestr
+
+FAST_PATH_KEYS = {"FREQ", "INTERVAL", "COUNT", "UNTIL", "BYDAY", "WKST"}
+RULE_CACHE_SIZE = 65536
+PARSE_CACHE_SIZE = 4096
+PARSE_DTSTART = datetime(2000, 1, 1)
+WINDOW_CACHE_SIZE = 65536
+
+
+class Occurrence(NamedTuple):
+    """One (possibly modified) occurrence of a series"""
+    series_id: str
+    original_date: date
+    date: date
+    start_time: time
+    duration_minutes: int
+    box_id: str
+    modified: bool = False
+    cancelled: bool = False
+
+
+def _rule_keys(rule: str) -> set:
+    body = rule.split(":", 1)[1] if rule.upper().startswith("RRULE:") else rule
+    return {part.split("=", 1)[0].strip().upper() for part in body.split(";") if part.strip()}
+
+
+class Recurrence:
+    """A compiled recurrence rule anchored at a start date"""
+
+    def __init__(self, rule: str, dtstart: date):
+        self.rule = rule
+        self.dtstart = dtstart
+        parsed = parse_rule(rule)
+        if not isinstance(parsed, rrule):
+            raise ValueError("Invalid recurrence rule: expected a single RRULE")
+        self._rrule: rrule = parsed.replace(dtstart=datetime.combine(dtstart, time.min))
+        if self._rrule._freq > DAILY:
+            raise ValueError("Invalid recurrence rule: frequency must be daily or coarser")
+
+        self.count: Optional[int] = self._rrule._count
+        self.until: Optional[date] = self._rrule._until.date() if self._rrule._until else None
+        self._period = 0
+        self._offsets: List[int] = []
+        self._first_skip = 0
+        self._anchor = dtstart.toordinal()
+        self._iterator = None
+        self._seen: List[int] = []
+        self._exhausted = False
+        if _rule_keys(rule) <= FAST_PATH_KEYS and self._rrule._freq in (DAILY, WEEKLY):
+            self._compile()
+
+    def _compile(self):
+        """Reduce the rule to a period (days) and sorted day offsets within it"""
+        interval = self._rrule._interval
+        weekdays = self._rrule._byweekday
+        dtstart = self.dtstart.toordinal()
+
+        if self._rrule._freq == WEEKLY:
+            wkst = self._rrule._wkst
+            self._anchor = dtstart - (self.dtstart.weekday() - wkst) % 7
+            self._period = 7 * interval
+            self._offsets = sorted((weekday - wkst) % 7 for weekday in weekdays)
+        elif weekdays:
+            # Every interval-th day on some weekdays repeats every lcm(interval, 7) days
+            self._period = interval * 7 // gcd(interval, 7)
+            self._offsets = [
+                step for step in range(0, self._period, interval)
+                if (self.dtstart + timedelta(days=step)).weekday() in weekdays
+            ]
+        else:
+            self._period = interval
+            self._offsets = [0]
+        self._first_skip = sum(1 for offset in self._offsets if self._anchor + offset < dtstart)
+
+    @property
+    def is_compiled(self) -> bool:
+        return bool(self._period)
+
+    @property
+    def is_bounded(self) -> bool:
+        return self.count is not None or self.until is not None
+
+    def _extend(self, high: int):
+        """Iterate the dateutil rule until past the ordinal ``high``"""
+        if self._iterator is None:
+            self._iterator = iter(self._rrule)
+        seen = self._seen
+        while not self._exhausted and (not seen or seen[-1] <= high):
+            try:
+                seen.append(next(self._iterator).toordinal())
+            except StopIteration:
+                self._exhausted = True
+
+    def between(self, start: date, end: date) -> List[date]:
+        """Occurrence dates in [start, end]"""
+        if not self.is_compiled:
+            low, high = start.toordinal(), end.toordinal()
+            self._extend(high)
+            seen = self._seen
+            return [date.fromordinal(day) for day in seen[bisect_left(seen, low):bisect_right(seen, high)]]
+
+        low = max(start.toordinal(), self.dtstart.toordinal())
+        high = end.toordinal()
+        if self.until is not None:
+            high = min(high, self.until.toordinal())
+        if low > high or not self._offsets:
+            return []
+
+        anchor, period, offsets = self._anchor, self._period, self._offsets
+        per_period = len(offsets)
+        result = []
+        for index in range((low - anchor) // period, (high - anchor) // period + 1):
+            base = anchor + index * period
+            for position, offset in enumerate(offsets):
+                day = base + offset
+                if day < low:
+                    continue
+                if day > high:
+                    break
+                if self.count is not None and index * per_period + position - self._first_skip >= self.count:
+                    return result
+                result.append(date.fromordinal(day))
+        return result
+
+    def last(self) -> Optional[date]:
+        """Last occurrence of a bounded rule (None if it never ends)"""
+        if not self.is_bounded:
+            return None
+        if self.is_compiled and self.until is None:
+            if not self._offsets:
+                return None
+            period, position = divmod(self.count - 1 + self._first_skip, len(self._offsets))
+            return date.fromordinal(self._anchor + period * self._period + self._offsets[position])
+        value = self._rrule.before(datetime.combine(self.until, time.max), inc=True) if self.until \
+            else self._rrule[-1]
+        return value.date() if value else None
+
+    def occurs_on(self, day: date) -> bool:
+        return bool(self.between(day, day))
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_rule(rule: str):
+    """
+    Parse a rule once, anchored at a placeholder date; series share a few
+    rule strings, so each start date only re-anchors the parsed rule
+    """
+    try:
+        return rrulestr(rule, dtstart=PARSE_DTSTART)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid recurrence rule: {e}")
+
+
+@lru_cache(maxsize=RULE_CACHE_SIZE)
+def compile_rule(rule: str, dtstart: date) -> Recurrence:
+    """Cached Recurrence for a rule and start date (ValueError if invalid)"""
+    return Recurrence(rule, dtstart)
+
+
+def expand_series(
+    series,
+    start: date,
+    end: date,
+    include_cancelled: bool = False,
+    by_original_date: bool = False
+) -> List[Occurrence]:
+    """
+    Occurrences of a series falling in [start, end], after exceptions:
+    cancelled occurrences are dropped (unless include_cancelled), moved
+    ones appear on their new date, including ones moved into the window.
+    With by_original_date the window applies to the dates in the rule
+    instead, so every occurrence is seen exactly once when walking
+    consecutive windows.
+    """
+    days = compile_rule(series.rrule, series.dtstart).between(start, end)
+    series_id = str(series.id)
+    start_time, duration, box_id = series.start_time, series.duration_minutes, series.box_id
+    exceptions: Dict[date, object] = {exception.original_date: exception for exception in series.exceptions or ()}
+    if not exceptions:
+        return [Occurrence(series_id, day, day, start_time, duration, box_id) for day in days]
+
+    result = []
+    for day in days:
+        exception = exceptions.get(day)
+        if exception is None:
+            result.append(Occurrence(series_id, day, day, start_time, duration, box_id))
+        elif exception.cancelled:
+            if include_cancelled:
+                result.append(Occurrence(series_id, day, day, start_time, duration, box_id, True, True))
+        elif by_original_date or start <= (exception.moved_to or day) <= end:
+            result.append(_modified(series, series_id, exception))
+
+    if by_original_date:
+        return result
+    for original, exception in exceptions.items():
+        moved_to = exception.moved_to
+        if not exception.cancelled and moved_to and start <= moved_to <= end and not start <= original <= end:
+            result.append(_modified(series, series_id, exception))
+    return result
+
+
+def _modified(series, series_id: str, exception) -> Occurrence:
+    return Occurrence(
+        series_id,
+        exception.original_date,
+        exception.moved_to or exception.original_date,
+        exception.start_time or series.start_time,
+        exception.duration_minutes or series.duration_minutes,
+        exception.box_id or series.box_id,
+        True
+    )
+
+
+# (series id, updated_at, start, end) -> occurrences, oldest first
+_windows: Dict[tuple, Tuple[Occurrence, ...]] = {}
+
+
+def expand_window(series, start: date, end: date) -> Tuple[Occurrence, ...]:
+    """expand_series for a saved series, cached per series version and window"""
+    if series.id is None:
+        return tuple(expand_series(series, start, end))
+    key = (series.id, series.updated_at, start, end)
+    occurrences = _windows.get(key)
+    if occurrences is None:
+        if len(_windows) >= WINDOW_CACHE_SIZE:
+            del _windows[next(iter(_windows))]
+        occurrences = _windows[key] = tuple(expand_series(series, start, end))
+    return occurrences
+
+
+def clear_window_cache():
+    _windows.clear()
+
+
+def expand_many(series_list: Iterable, start: date, end: date) -> List[Occurrence]:
+    """Occurrences of many series in a window, ordered by date and time"""
+    occurrences = []
+    for series in series_list:
+        occurrences.extend(expand_window(series, start, end))
+    occurrences.sort(key=attrgetter("date", "start_time"))
+    return occurrences
+
@@ -0,0 +1,330 @@
+"""
+Reservation booking with double-booking prevention.
+
+A booking first looks for overlapping active reservations of the box and
+the doctor through the (box_id, date, start_time) and
+(doctor_id, date, start_time) compound indexes. It then claims every
+BOOKING_SLOT_MINUTES cell of the range for both the box and the doctor by
+inserting SlotClaim documents keyed by the cell. MongoDB's unique _id index
+makes the claim atomic: when two requests race for the same cell, only one
+insert succeeds and the other booking is rejected. Claims expire after
+SLOT_CLAIM_PENDING_TTL seconds unless the reservation is saved and they are
+confirmed, so a worker dying mid-booking does not hold the cells.
+
+Start times must fall on a cell boundary (see ReservationCreate), so
+back-to-back appointments never share a cell.
+"""
+import asyncio
+import logging
+import secrets
+from collections import defaultdict
+from datetime import date, datetime, time
+from typing import Iterable, List, Optional, Tuple
+
+from beanie import PydanticObjectId, UpdateResponse
+from bson.errors import InvalidId
+from fastapi import HTTPException, status
+from pymongo import UpdateMany
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.core.config import settings
+from app.models.box import Box
+from app.models.reservation import Reservation, ReservationCalendarSlot, ReservationCreate
+from app.models.slot_claim import SlotClaim
+from app.models.user import User
+from app.services.box_matcher import box_matcher
+from app.services.occupancy_feed import occupancy_feed
+from app.services.rollup_service import RollupService
+from app.services.slot_grid import MINUTES_PER_DAY, to_minutes
+
+logger = logging.getLogger(__name__)
+
+STATUS = settings.RESERVATION_STATUS
+
+ACTIVE_STATUSES = [
+    STATUS["PENDING"],
+    STATUS["CONFIRMED"],
+    STATUS["IN_PROGRESS"]
+]
+
+# Allowed status changes
+STATUS_TRANSITIONS = {
+    STATUS["PENDING"]: {STATUS["CONFIRMED"], STATUS["CANCELLED"]},
+    STATUS["CONFIRMED"]: {STATUS["IN_PROGRESS"], STATUS["CANCELLED"], STATUS["NO_SHOW"]},
+    STATUS["IN_PROGRESS"]: {STATUS["COMPLETED"]}
+}
+
+
+class ReservationService:
+    """Reservation booking operations"""
+
+    @staticmethod
+    def claim_keys(box_id: str, doctor_id: str, day: date, start_time: time, end_time: time) -> List[str]:
+        """Slot keys covering a time range for a box and a doctor"""
+        cell = settings.BOOKING_SLOT_MINUTES
+        end_minute = MINUTES_PER_DAY if end_time == time.max else to_minutes(end_time)
+        first = to_minutes(start_time) // cell
+        last = -(-end_minute // cell)  # ceil
+        day_key = day.isoformat()
+
+        keys = []
+        for index in range(first, last):
+            keys.append(SlotClaim.make_key("box", box_id, day_key, index * cell))
+            keys.append(SlotClaim.make_key("doctor", doctor_id, day_key, index * cell))
+        # Same acquisition order for every request keeps contention short
+        return sorted(keys)
+
+    @staticmethod
+    async def find_overlap(
+        field: str,
+        owner_id: str,
+        day: date,
+        start_time: time,
+        end_time: time,
+        exclude_id: Optional[PydanticObjectId] = None
+    ) -> Optional[ReservationCalendarSlot]:
+        """Find an active reservation of a box or doctor overlapping a range"""
+        query = {
+            field: owner_id,
+            "date": day.isoformat(),
+            "start_time": {"$lt": end_time.isoformat()},
+            "end_time": {"$gt": start_time.isoformat()},
+            "status": {"$in": ACTIVE_STATUSES}
+        }
+        if exclude_id is not None:
+            query["_id"] = {"$ne": exclude_id}
+        return await Reservation.find_one(query).project(ReservationCalendarSlot)
+
+    @staticmethod
+    async def claim_slots(keys: List[str], reservation_id: str) -> bool:
+        """Atomically claim slot keys; all-or-nothing. Claims stay pending until confirm_slots"""
+        collection = SlotClaim.get_motor_collection()
+        now = datetime.utcnow()
+        expires_at = SlotClaim.pending_expiry(now)
+        documents = [
+            {"_id": key, "reservation_id": reservation_id, "created_at": now, "expires_at": expires_at}
+            for key in keys
+        ]
+        try:
+            await collection.insert_many(documents, ordered=True)
+            return True
+        except BulkWriteError:
+            await collection.delete_many({"reservation_id": reservation_id})
+            return False
+
+    @staticmethod
+    async def confirm_slots(reservations: Iterable[Reservation]):
+        """Keep the claims of saved reservations until their day is over"""
+        by_day = defaultdict(list)
+        for reservation in reservations:
+            by_day[reservation.date].append(str(reservation.id))
+        if not by_day:
+            return
+        try:
+            await SlotClaim.get_motor_collection().bulk_write([
+                UpdateMany({"reservation_id": {"$in": ids}}, {"$set": {"expires_at": SlotClaim.day_expiry(day)}})
+                for day, ids in by_day.items()
+            ], ordered=False)
+        except PyMongoError as e:
+            # The booking stands; overlap checks still see it once its claims expire
+            logger.warning(f"Could not confirm slot claims of {sum(map(len, by_day.values()))} reservations: {e}")
+
+    @staticmethod
+    async def release_slots(reservation_id: str):
+        """Release every slot held by a reservation"""
+        await SlotClaim.get_motor_collection().delete_many({"reservation_id": reservation_id})
+
+    @staticmethod
+    def party_error(patient: Optional[User], doctor: Optional[User], box: Optional[Box]) -> Optional[Tuple[int, str]]:
+        """(status code, detail) when the patient, doctor or box cannot be booked"""
+        if patient is None or not patient.is_patient():
+            return status.HTTP_404_NOT_FOUND, "Patient not found"
+        if doctor is None or not doctor.is_doctor():
+            return status.HTTP_404_NOT_FOUND, "Doctor not found"
+        if box is None or not box.is_active or box.is_in_maintenance():
+            return status.HTTP_404_NOT_FOUND, "Box not available"
+        return None
+
+    @staticmethod
+    def build_reservation(
+        data: ReservationCreate,
+        end_time: time,
+        patient: User,
+        doctor: User,
+        box: Box,
+        created_by: User
+    ) -> Reservation:
+        """New pending reservation with denormalized patient, doctor and box info"""
+        return Reservation(
+            id=PydanticObjectId(),
+            patient_id=data.patient_id,
+            doctor_id=data.doctor_id,
+            box_id=data.box_id,
+            date=data.date,
+            start_time=data.start_time,
+            end_time=end_time,
+            duration_minutes=data.duration_minutes,
+            status=settings.RESERVATION_STATUS["PENDING"],
+            appointment_type=data.appointment_type,
+            reason=data.reason,
+            notes=data.notes,
+            priority=data.priority or "normal",
+            created_by=str(created_by.id),
+            patient_name=patient.full_name,
+            patient_phone=patient.phone,
+            patient_email=patient.email,
+            doctor_name=doctor.full_name,
+            doctor_specialization=doctor.specialization,
+            box_name=box.name,
+            box_location=box.location,
+            confirmation_code=secrets.token_hex(4).upper()
+        )
+
+    @staticmethod
+    async def create_reservation(data: ReservationCreate, created_by: User) -> Reservation:
+        """Book a reservation, rejecting box or doctor double-bookings"""
+        if created_by.is_patient() and data.patient_id != str(created_by.id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Patients can only book reservations for themselves"
+            )
+
+        patient, doctor, box = await asyncio.gather(
+            User.get(data.patient_id),
+            User.get(data.doctor_id),
+            Box.get(data.box_id)
+        )
+        error = ReservationService.party_error(patient, doctor, box)
+        if error:
+            raise HTTPException(status_code=error[0], detail=error[1])
+
+        end_time = Reservation.compute_end_time(data.start_time, data.duration_minutes)
+
+        box_clash, doctor_clash = await asyncio.gather(
+            ReservationService.find_overlap("box_id", data.box_id, data.date, data.start_time, end_time),
+            ReservationService.find_overlap("doctor_id", data.doctor_id, data.date, data.start_time, end_time)
+        )
+        if box_clash or doctor_clash:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Box is already booked for this time" if box_clash else "Doctor is already booked for this time"
+            )
+
+        reservation = ReservationService.build_reservation(data, end_time, patient, doctor, box, created_by)
+        reservation_id = str(reservation.id)
+        keys = ReservationService.claim_keys(data.box_id, data.doctor_id, data.date, data.start_time, end_time)
+        if not await ReservationService.claim_slots(keys, reservation_id):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Time slot is no longer available"
+            )
+
+        try:
+            await reservation.insert()
+        except Exception:
+            await ReservationService.release_slots(reservation_id)
+            raise
+        await ReservationService.confirm_slots([reservation])
+
+        await RollupService.record_created(reservation)
+        await box_matcher.record_created(reservation)
+        logger.info(f"Reservation {reservation_id} booked for box {data.box_id} on {data.date}")
+        return reservation
+
+    @staticmethod
+    async def update_status(
+        reservation: Reservation,
+        new_status: str,
+        changed_by: User,
+        reason: Optional[str] = None
+    ) -> Reservation:
+        """Move a reservation to a new status, keeping slots and rollups in sync"""
+        old_status = reservation.status
+        if new_status not in STATUS_TRANSITIONS.get(old_status, set()):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cannot change reservation status from {old_status} to {new_status}"
+            )
+
+        now = datetime.utcnow()
+        user_id = str(changed_by.id)
+        changes = {"status": new_status, "updated_at": now}
+        if new_status == STATUS["CONFIRMED"]:
+            changes.update(confirmed_at=now, confirmed_by=user_id)
+        elif new_status == STATUS["IN_PROGRESS"]:
+            changes.update(checked_in_at=now)
+        elif new_status == STATUS["COMPLETED"]:
+            changes.update(checked_out_at=now)
+            if reservation.checked_in_at:
+                changes.update(actual_duration=int((now - reservation.checked_in_at).total_seconds() // 60))
+        elif new_status == STATUS["CANCELLED"]:
+            changes.update(cancelled_at=now, cancelled_by=user_id, cancellation_reason=reason)
+
+        # Only applies if nobody changed the status since it was read, so
+        # slots and rollups are moved once per transition
+        result = await Reservation.get_motor_collection().update_one(
+            {"_id": reservation.id, "status": old_status},
+            {"$set": changes}
+        )
+        if result.matched_count == 0:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="The reservation status was changed by another request"
+            )
+        for field, value in changes.items():
+            setattr(reservation, field, value)
+
+        if new_status not in ACTIVE_STATUSES:
+            await ReservationService.release_slots(str(reservation.id))
+        await RollupService.record_status_change(reservation, old_status, new_status)
+        await box_matcher.record_status_change(reservation)
+        if new_status in (STATUS["IN_PROGRESS"], STATUS["COMPLETED"]):
+            await ReservationService.sync_box_occupancy(reservation)
+            await occupancy_feed.reservation_changed(reservation)
+        return reservation
+
+    @staticmethod
+    async def sync_box_occupancy(reservation: Reservation):
+        """Occupy the box on check-in, free it on check-out"""
+        reservation_id = str(reservation.id)
+        if reservation.status == STATUS["IN_PROGRESS"]:
+            box = await Box.get(reservation.box_id)
+            if box is not None:
+                await box.set({
+                    Box.status: settings.BOX_STATUS["OCCUPIED"],
+                    Box.current_reservation_id: reservation_id,
+                    Box.current_doctor_id: reservation.doctor_id,
+                    Box.updated_at: reservation.updated_at
+                })
+            return
+
+        # Only if the box still holds this reservation: a check-in may have
+        # taken it over since, and must not be undone
+        try:
+            box_id = PydanticObjectId(reservation.box_id)
+        except (InvalidId, TypeError):
+            return
+        box = await Box.find_one({"_id": box_id, "current_reservation_id": reservation_id}).update(
+            {"$set": {
+                "status": settings.BOX_STATUS["AVAILABLE"],
+                "current_reservation_id": None,
+                "current_doctor_id": None,
+                "updated_at": reservation.updated_at
+            }},
+            response_type=UpdateResponse.NEW_DOCUMENT
+        )
+        if box is not None:
+            # Query updates skip the document event hooks
+            await box.invalidate_response_cache()
+            await box.publish_occupancy()
+            await box.sync_box_matcher()
+
+    @staticmethod
+    async def cancel_reservation(reservation: Reservation, cancelled_by: User, reason: Optional[str] = None) -> Reservation:
+        """Cancel a reservation and free its box and doctor slots"""
+        if not reservation.can_be_cancelled():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Reservation cannot be cancelled"
+            )
+        return await ReservationService.update_status(reservation, STATUS["CANCELLED"], cancelled_by, reason)
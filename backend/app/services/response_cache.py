@@ -0,0 +1,291 @@
+"""
+HTTP response cache for read-heavy GET endpoints.
+
+Box and schedule listings change rarely but are read on every booking
+screen. GET responses under CACHED_PREFIXES are kept in process, keyed by
+resource, path, normalized query string, the caller's role and the
+caller's user id. Paths in ROLE_CACHED_PATHS opt out of the user id and
+share one entry per role, so their bodies must only depend on the role.
+Every cached response carries an ETag; a matching If-None-Match gets a
+304 without a body.
+
+An entry is fresh for RESPONSE_CACHE_TTL seconds. For RESPONSE_CACHE_STALE_TTL
+seconds after that it is still served while one background request
+refreshes it (stale-while-revalidate). Misses are single-flight: requests
+for a key that is being computed wait for that computation instead of
+each querying MongoDB.
+
+Writes invalidate by resource: Box and Schedule document event hooks bump
+the resource's generation, which makes every entry stored under an older
+generation a miss, and broadcast the bump to the other workers over Redis
+pub/sub. Invalidated entries are never served stale, so writes are
+visible on the next read.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.core.security import verify_token
+from app.services.user_cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+CACHED_PREFIXES = {
+    "/api/v1/boxes": "boxes",
+    "/api/v1/schedules": "schedules"
+}
+# Responses that depend only on the caller's role, shared by every user of a role
+ROLE_CACHED_PATHS: Set[str] = {"/api/v1/boxes"}
+INVALIDATION_CHANNEL = "response-cache:invalidate"
+ANONYMOUS = "anonymous"
+
+
+class CachedResponse(NamedTuple):
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    etag: bytes
+    generation: int
+    stored_at: float  # time.monotonic()
+    route: Any = None  # matched route, reported to request metrics on hits
+
+
+class ResponseCache:
+    """In-process GET response cache with per-resource invalidation"""
+
+    def __init__(self, maxsize: int, ttl: float, stale_ttl: float):
+        self.ttl = ttl
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl + stale_ttl)
+        self.generations: Dict[str, int] = defaultdict(int)
+        self.results: Dict[str, int] = defaultdict(int)
+        self.inflight: Dict[Hashable, asyncio.Future] = {}
+        self.revalidating: Set[Hashable] = set()
+        self._listener: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def resource_for(path: str) -> Optional[str]:
+        for prefix, resource in CACHED_PREFIXES.items():
+            if path == prefix or path.startswith(prefix + "/"):
+                return resource
+        return None
+
+    def lookup(self, key: Hashable, resource: str) -> Optional[CachedResponse]:
+        """Entry for a key unless a write to its resource happened since"""
+        entry = self.entries.get(key)
+        if entry is not None and entry.generation == self.generations[resource]:
+            return entry
+        return None
+
+    def store(
+        self, key: Hashable, status: int, headers: List[Tuple[bytes, bytes]], body: bytes, generation: int,
+        route: Any = None
+    ) -> CachedResponse:
+        etag = b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode() + b'"'
+        entry = CachedResponse(status, headers, body, etag, generation, time.monotonic(), route)
+        self.entries.set(key, entry)
+        return entry
+
+    def bump(self, resource: str):
+        self.generations[resource] += 1
+
+    async def invalidate(self, resource: str):
+        """Drop cached responses of a resource on every worker"""
+        self.bump(resource)
+
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.publish(INVALIDATION_CHANNEL, resource)
+            except Exception as e:
+                logger.warning(f"Response cache invalidation broadcast failed: {e}")
+
+    async def start(self):
+        """Listen for invalidations published by other workers"""
+        redis = get_redis()
+        if redis is None or self._listener is not None:
+            return
+        self._listener = asyncio.create_task(self._listen(redis))
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self, redis):
+        while True:
+            try:
+                pubsub = redis.pubsub()
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.bump(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Writes on other workers go unnoticed until the connection is back
+                logger.warning(f"Response cache invalidation listener error: {e}")
+                for resource in set(CACHED_PREFIXES.values()):
+                    self.bump(resource)
+                await asyncio.sleep(1)
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# HELP response_cache_requests_total Cacheable GET requests by outcome",
+            "# TYPE response_cache_requests_total counter"
+        ]
+        for result, count in sorted(self.results.items()):
+            lines.append(f'response_cache_requests_total{{result="{result}"}} {count}')
+        lines += [
+            "# HELP response_cache_entries Responses held in the cache",
+            "# TYPE response_cache_entries gauge",
+            f"response_cache_entries {len(self.entries)}"
+        ]
+        return "\n".join(lines) + "\n"
+
+
+async def request_caller(scope) -> Optional[Tuple[str, str]]:
+    """(role, user id) of the caller, "anonymous" for both without a token, None if the token is invalid"""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            try:
+                user = await user_cache.get_user(verify_token(token))
+            except HTTPException:
+                return None
+            return (user.role, str(user.id)) if user is not None and user.is_active else None
+    return ANONYMOUS, ANONYMOUS
+
+
+def etag_matches(scope, etag: bytes) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"if-none-match":
+            candidates = [candidate.strip() for candidate in value.split(b",")]
+            return b"*" in candidates or any(candidate.removeprefix(b"W/") == etag for candidate in candidates)
+    return False
+
+
+async def _receive_nothing():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware serving cacheable GETs from ResponseCache"""
+
+    def __init__(self, app, cache: ResponseCache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        resource = self.cache.resource_for(scope["path"]) if scope["type"] == "http" and scope["method"] == "GET" else None
+        if resource is None:
+            await self.app(scope, receive, send)
+            return
+        caller = await request_caller(scope)
+        if caller is None:
+            # Let the route answer 401
+            await self.app(scope, receive, send)
+            return
+
+        cache = self.cache
+        role, user_id = caller
+        query = b"&".join(sorted(scope["query_string"].split(b"&")))
+        key = (resource, scope["path"], query, role, None if scope["path"] in ROLE_CACHED_PATHS else user_id)
+
+        entry = cache.lookup(key, resource)
+        if entry is not None:
+            if time.monotonic() - entry.stored_at <= cache.ttl:
+                await self._respond(scope, send, entry, b"HIT")
+                return
+            if key not in cache.revalidating:
+                cache.revalidating.add(key)
+                asyncio.create_task(self._revalidate(dict(scope), key, resource))
+            await self._respond(scope, send, entry, b"STALE")
+            return
+
+        # Single flight: wait for a request already computing this key
+        pending = cache.inflight.get(key)
+        if pending is not None:
+            entry = await asyncio.shield(pending)
+            if entry is not None:
+                await self._respond(scope, send, entry, b"HIT")
+                return
+            await self.app(scope, receive, send)
+            return
+
+        future = cache.inflight[key] = asyncio.get_running_loop().create_future()
+        entry = None
+        # Read before rendering: a write during the render must leave the entry stale
+        generation = cache.generations[resource]
+        try:
+            start, body = await self._render(scope)
+            if start["status"] == 200:
+                entry = cache.store(key, 200, list(start.get("headers", [])), body, generation, scope.get("route"))
+                await self._respond(scope, send, entry, b"MISS")
+            else:
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+        finally:
+            del cache.inflight[key]
+            future.set_result(entry)
+
+    async def _render(self, scope) -> Tuple[dict, bytes]:
+        """Run the route, buffering its response"""
+        start: dict = {}
+        chunks: List[bytes] = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, _receive_nothing, capture)
+        return start, b"".join(chunks)
+
+    async def _revalidate(self, scope, key: Hashable, resource: str):
+        cache = self.cache
+        generation = cache.generations[resource]
+        try:
+            start, body = await self._render(scope)
+            if start.get("status") == 200:
+                cache.store(key, 200, list(start.get("headers", [])), body, generation, scope.get("route"))
+        except Exception as e:
+            logger.warning(f"Response cache revalidation of {scope['path']} failed: {e}")
+        finally:
+            cache.revalidating.discard(key)
+
+    async def _respond(self, scope, send, entry: CachedResponse, result: bytes):
+        # The route did not run for a hit; label its metrics as if it had
+        if entry.route is not None:
+            scope.setdefault("route", entry.route)
+        extra = [(b"etag", entry.etag), (b"cache-control", b"private, no-cache"), (b"x-cache", result)]
+        if etag_matches(scope, entry.etag):
+            self.cache.results["not_modified"] += 1
+            await send({"type": "http.response.start", "status": 304, "headers": extra})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        self.cache.results[result.decode().lower()] += 1
+        headers = [header for header in entry.headers if header[0] not in (b"etag", b"cache-control")]
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers + extra})
+        await send({"type": "http.response.body", "body": entry.body})
+
+
+response_cache = ResponseCache(
+    maxsize=settings.RESPONSE_CACHE_SIZE,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    stale_ttl=settings.RESPONSE_CACHE_STALE_TTL
+)
@@ -0,0 +1,257 @@
+"""
+Materialized daily reservation rollups.
+
+Every reservation contributes to three rollup documents for its date: the
+whole clinic, its box and its doctor. Creating a reservation or changing
+its status applies $inc deltas to those three documents in one unordered
+bulk write, so dashboards read a few hundred rollups instead of
+re-aggregating the reservations collection. ``rebuild`` recomputes them
+(see app/commands/rebuild_rollups.py) one day at a time and writes the
+difference to the stored counters as $inc, so the live $inc updates keep
+running alongside it.
+"""
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.models.reservation import Reservation
+from app.models.rollup import ReservationRollup
+
+logger = logging.getLogger(__name__)
+
+STATUS = settings.RESERVATION_STATUS
+
+# Reservations that occupy a box (cancelled and no-show ones do not)
+OCCUPYING_STATUSES = {
+    STATUS["PENDING"],
+    STATUS["CONFIRMED"],
+    STATUS["IN_PROGRESS"],
+    STATUS["COMPLETED"]
+}
+
+WRITE_BATCH_SIZE = 1000
+
+
+def _field_key(value: Optional[str]) -> str:
+    """Make a value safe to use as a MongoDB field name"""
+    return (value or "unknown").replace(".", "_").replace("$", "_")
+
+
+def _iso(value) -> str:
+    return value.isoformat() if isinstance(value, (date, datetime)) else str(value)
+
+
+def _hour(start_time) -> str:
+    return _iso(start_time)[:2]
+
+
+def _targets(reservation: dict) -> List[Tuple[str, str, Optional[str]]]:
+    return [
+        ("clinic", "all", None),
+        ("box", reservation["box_id"], reservation.get("box_name")),
+        ("doctor", reservation["doctor_id"], reservation.get("doctor_name"))
+    ]
+
+
+def _as_row(reservation: Reservation) -> dict:
+    return {
+        "box_id": reservation.box_id,
+        "box_name": reservation.box_name,
+        "doctor_id": reservation.doctor_id,
+        "doctor_name": reservation.doctor_name,
+        "date": reservation.date.isoformat(),
+        "start_time": reservation.start_time.isoformat(),
+        "duration_minutes": reservation.duration_minutes,
+        "status": reservation.status,
+        "appointment_type": reservation.appointment_type
+    }
+
+
+def created_increments(row: dict) -> Dict[str, int]:
+    """Counter deltas for a new reservation"""
+    duration = row.get("duration_minutes") or 0
+    inc = {
+        "total": 1,
+        "duration_minutes": duration,
+        f"status.{_field_key(row['status'])}": 1,
+        f"type.{_field_key(row.get('appointment_type'))}": 1,
+        f"hours.{_hour(row['start_time'])}": 1
+    }
+    if row["status"] in OCCUPYING_STATUSES:
+        inc["booked"] = 1
+        inc["booked_minutes"] = duration
+    return inc
+
+
+def status_change_increments(row: dict, old_status: str, new_status: str) -> Dict[str, int]:
+    """Counter deltas for a status transition"""
+    inc = {
+        f"status.{_field_key(old_status)}": -1,
+        f"status.{_field_key(new_status)}": 1
+    }
+    was_booked, is_booked = old_status in OCCUPYING_STATUSES, new_status in OCCUPYING_STATUSES
+    if was_booked != is_booked:
+        sign = 1 if is_booked else -1
+        inc["booked"] = sign
+        inc["booked_minutes"] = sign * (row.get("duration_minutes") or 0)
+    return inc
+
+
+class RollupService:
+    """Maintenance of reservation rollups"""
+
+    @staticmethod
+    def rollup_id(scope: str, key: str, day: str) -> str:
+        return f"{scope}:{key}:{day}"
+
+    @staticmethod
+    async def _apply(row: dict, inc: Dict[str, int]):
+        day = _iso(row["date"])
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"_id": RollupService.rollup_id(scope, key, day)},
+                {
+                    "$inc": inc,
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {"scope": scope, "key": key, "date": day, "month": day[:7], "name": name}
+                },
+                upsert=True
+            )
+            for scope, key, name in _targets(row)
+        ]
+        await RollupService._write(operations)
+
+    @staticmethod
+    async def _write(operations: List[UpdateOne]):
+        if not operations:
+            return
+        try:
+            await ReservationRollup.get_motor_collection().bulk_write(operations, ordered=False)
+        except Exception as e:
+            # Never fail a booking because of a counter; a rebuild fixes drift
+            logger.error(f"Error updating reservation rollups: {e}")
+
+    @staticmethod
+    async def record_created(reservation: Reservation):
+        """Count a newly created reservation"""
+        row = _as_row(reservation)
+        await RollupService._apply(row, created_increments(row))
+
+    @staticmethod
+    async def record_created_many(reservations: List[Reservation]):
+        """Count a batch of new reservations with one upsert per rollup"""
+        fields: Dict[str, dict] = {}
+        counters: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for reservation in reservations:
+            row = _as_row(reservation)
+            day = _iso(row["date"])
+            inc = created_increments(row)
+            for scope, key, name in _targets(row):
+                rollup_id = RollupService.rollup_id(scope, key, day)
+                fields.setdefault(rollup_id, {"scope": scope, "key": key, "date": day, "month": day[:7], "name": name})
+                for field, delta in inc.items():
+                    counters[rollup_id][field] += delta
+
+        now = datetime.utcnow()
+        await RollupService._write([
+            UpdateOne(
+                {"_id": rollup_id},
+                {"$inc": dict(counters[rollup_id]), "$set": {"updated_at": now}, "$setOnInsert": document},
+                upsert=True
+            )
+            for rollup_id, document in fields.items()
+        ])
+
+    @staticmethod
+    async def record_status_change(reservation: Reservation, old_status: str, new_status: str):
+        """Move a reservation between status counters"""
+        if old_status == new_status:
+            return
+        row = _as_row(reservation)
+        await RollupService._apply(row, status_change_increments(row, old_status, new_status))
+
+    @staticmethod
+    async def rebuild(date_from: Optional[date] = None, date_to: Optional[date] = None) -> int:
+        """Recompute rollups for a date range (all dates by default); returns the rollups corrected"""
+        query = {}
+        if date_from or date_to:
+            query["date"] = {}
+            if date_from:
+                query["date"]["$gte"] = date_from.isoformat()
+            if date_to:
+                query["date"]["$lte"] = date_to.isoformat()
+
+        rollup_collection = ReservationRollup.get_motor_collection()
+        days = set(await Reservation.get_motor_collection().distinct("date", query))
+        days.update(await rollup_collection.distinct("date", query))
+        corrected = 0
+        for day in sorted(_iso(day) for day in days):
+            corrected += await RollupService._rebuild_day(day)
+        logger.info(f"Rebuilt reservation rollups of {len(days)} days, {corrected} corrected")
+        return corrected
+
+    @staticmethod
+    async def _rebuild_day(day: str) -> int:
+        """
+        Correct one day's rollups by $inc of the difference between the
+        counts recomputed from its reservations and the rollups read just
+        before. Live $inc updates that land after that read are kept, as
+        they add to whatever the rollup holds. A change written to a
+        reservation before the recount but counted after the read (the few
+        milliseconds between a reservation write and its rollup update) is
+        counted twice; running the rebuild again corrects it.
+        """
+        rollup_collection = ReservationRollup.get_motor_collection()
+        snapshot: Dict[str, Dict[str, int]] = {}
+        async for document in rollup_collection.find({"date": day}):
+            counters = {field: document.get(field, 0) for field in ("total", "duration_minutes", "booked", "booked_minutes")}
+            for group in ("status", "type", "hours"):
+                for name, value in (document.get(group) or {}).items():
+                    counters[f"{group}.{name}"] = value
+            snapshot[document["_id"]] = counters
+
+        projection = {
+            "box_id": 1, "box_name": 1, "doctor_id": 1, "doctor_name": 1, "date": 1,
+            "start_time": 1, "duration_minutes": 1, "status": 1, "appointment_type": 1
+        }
+        names: Dict[str, Tuple[str, str, Optional[str]]] = {}
+        counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        cursor = Reservation.get_motor_collection().find({"date": day}, projection, batch_size=5000)
+        async for row in cursor:
+            inc = created_increments(row)
+            for scope, key, name in _targets(row):
+                rollup_id = RollupService.rollup_id(scope, key, day)
+                names.setdefault(rollup_id, (scope, key, name))
+                for field, delta in inc.items():
+                    counts[rollup_id][field] += delta
+
+        now = datetime.utcnow()
+        operations = []
+        for rollup_id in names.keys() | snapshot.keys():
+            current, recounted = snapshot.get(rollup_id, {}), counts.get(rollup_id, {})
+            delta = {
+                field: recounted.get(field, 0) - current.get(field, 0)
+                for field in current.keys() | recounted.keys()
+                if recounted.get(field, 0) != current.get(field, 0)
+            }
+            if not delta:
+                continue
+            update = {"$inc": delta, "$set": {"updated_at": now}}
+            if rollup_id in names:
+                scope, key, name = names[rollup_id]
+                update["$set"]["name"] = name
+                update["$setOnInsert"] = {"scope": scope, "key": key, "date": day, "month": day[:7]}
+            operations.append(UpdateOne({"_id": rollup_id}, update, upsert=rollup_id in names))
+        for offset in range(0, len(operations), WRITE_BATCH_SIZE):
+            await rollup_collection.bulk_write(operations[offset:offset + WRITE_BATCH_SIZE], ordered=False)
+
+        # Rollups left without reservations; the filter keeps one a live booking just counted
+        emptied = [rollup_id for rollup_id in snapshot if rollup_id not in names]
+        if emptied:
+            await rollup_collection.delete_many({"_id": {"$in": emptied}, "total": {"$lte": 0}})
+        return len(operations)
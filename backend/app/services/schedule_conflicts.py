@@ -0,0 +1,130 @@
+"""
+Bulk schedule conflict detection.
+
+Every available TimeSlot of a working schedule becomes an interval keyed by
+(doctor, weekday) for REGULAR schedules or (doctor, date) for EXCEPTION
+schedules. Within a key, intervals are swept by effective date: only slots
+whose date range is still open at the sweep position are compared, and a
+pair conflicts when their times of day overlap as well. A doctor's history
+of successive schedules with the same hours then costs one comparison per
+schedule, not one per pair.
+
+VACATION and SICK_LEAVE entries are overrides, not working time, so they
+never conflict. An EXCEPTION replaces the REGULAR schedule of its date
+(see ``availability_index``), so REGULAR/EXCEPTION pairs don't conflict
+either.
+"""
+import heapq
+from datetime import date
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterable, List, Optional, Set
+
+from app.models.schedule import DayOfWeek, Schedule, ScheduleConflict, ScheduleType
+from app.services.slot_grid import to_minutes, to_time
+
+# Row layout: (doctor_id, kind, day, start, end, valid_from, valid_to, schedule index)
+_DOCTOR, _KIND, _DAY, _START, _END, _FROM, _TO, _INDEX = range(8)
+
+
+def _intervals(schedules: List[Schedule]) -> list:
+    rows = []
+    for index, schedule in enumerate(schedules):
+        if not schedule.is_available:
+            continue
+
+        if schedule.schedule_type == ScheduleType.REGULAR:
+            if not schedule.day_of_week:
+                continue
+            kind, day = "weekday", DayOfWeek(schedule.day_of_week).value
+            valid_from, valid_to = schedule.effective_from, schedule.effective_to or date.max
+        elif schedule.schedule_type == ScheduleType.EXCEPTION:
+            if not schedule.specific_date:
+                continue
+            kind, day = "date", schedule.specific_date
+            valid_from = valid_to = schedule.specific_date
+        else:
+            continue
+
+        for time_slot in schedule.time_slots:
+            if not time_slot.is_available:
+                continue
+            start, end = to_minutes(time_slot.start_time), to_minutes(time_slot.end_time)
+            if end > start:
+                rows.append((schedule.doctor_id, kind, day, start, end, valid_from, valid_to, index))
+
+    # Weekday names and dates never share a group, so sort them apart
+    rows.sort(key=lambda row: (row[_DOCTOR], row[_KIND], str(row[_DAY]), row[_FROM], row[_START]))
+    return rows
+
+
+def find_conflicts(
+    schedules: Iterable[Schedule],
+    only: Optional[Iterable[int]] = None,
+) -> List[ScheduleConflict]:
+    """
+    Find every overlapping pair of time slots between schedules.
+
+    Works on any mix of doctors. When ``only`` is given (positions in
+    ``schedules``), only pairs involving one of those schedules are returned.
+    """
+    schedules = list(schedules)
+    targets: Optional[Set[int]] = set(only) if only is not None else None
+    conflicts: List[ScheduleConflict] = []
+
+    rows = _intervals(schedules)
+    for (doctor_id, kind, day), group in groupby(rows, key=itemgetter(_DOCTOR, _KIND, _DAY)):
+        # Rows whose date range is open at the sweep position, by position in the group
+        active: dict = {}
+        ends: list = []  # heap of (valid_to, position)
+        for position, row in enumerate(group):
+            while ends and ends[0][0] < row[_FROM]:
+                del active[heapq.heappop(ends)[1]]
+
+            for other in active.values():
+                if other[_INDEX] == row[_INDEX]:
+                    continue
+                if other[_START] >= row[_END] or row[_START] >= other[_END]:
+                    continue
+                if targets is not None and row[_INDEX] not in targets and other[_INDEX] not in targets:
+                    continue
+
+                first, second = schedules[other[_INDEX]], schedules[row[_INDEX]]
+                if targets is not None and other[_INDEX] not in targets:
+                    first, second = second, first
+
+                overlap_to = min(row[_TO], other[_TO])
+                conflicts.append(ScheduleConflict(
+                    doctor_id=doctor_id,
+                    schedule_id=str(first.id) if first.id else None,
+                    conflicting_schedule_id=str(second.id) if second.id else None,
+                    day_of_week=day if kind == "weekday" else None,
+                    specific_date=day if kind == "date" else None,
+                    overlap_from=row[_FROM],
+                    overlap_to=None if overlap_to == date.max else overlap_to,
+                    start_time=to_time(max(row[_START], other[_START])),
+                    end_time=to_time(min(row[_END], other[_END])),
+                ))
+
+            active[position] = row
+            heapq.heappush(ends, (row[_TO], position))
+
+    return conflicts
+
+
+def conflicts_with(candidate: Schedule, existing: Iterable[Schedule]) -> List[ScheduleConflict]:
+    """Conflicts between a new schedule and a doctor's existing schedules"""
+    others = [s for s in existing if s.doctor_id == candidate.doctor_id and (s.id is None or s.id != candidate.id)]
+    return find_conflicts([candidate] + others, only=[0])
+
+
+async def find_stored_conflicts(doctor_id: Optional[str] = None) -> List[ScheduleConflict]:
+    """Conflicts among stored schedules for one doctor, or for all doctors"""
+    query = Schedule.find(Schedule.doctor_id == doctor_id) if doctor_id else Schedule.find_all()
+    return find_conflicts(await query.to_list())
+
+
+async def check_new_schedule(candidate: Schedule) -> List[ScheduleConflict]:
+    """Conflicts between a schedule about to be saved and the stored ones"""
+    existing = await Schedule.find(Schedule.doctor_id == candidate.doctor_id).to_list()
+    return conflicts_with(candidate, existing)
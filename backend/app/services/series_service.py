@@ -0,0 +1,364 @@
+"""
+Recurring reservation series.
+
+A series is one ReservationSeries document holding an RRULE and its
+per-occurrence exceptions. Calendar queries expand occurrences lazily for
+the requested window (see app/services/recurrence.py); ``materialize``
+books the next SERIES_MATERIALIZE_DAYS of occurrences as regular
+reservations through the bulk booking path, so reminders, check-in and
+slot claims work on them like on any other reservation.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from beanie import PydanticObjectId
+from fastapi import HTTPException, status
+from pymongo import UpdateMany, UpdateOne
+
+from app.core.config import settings
+from app.models.box import Box
+from app.models.reservation import Reservation, ReservationBulkCreate, ReservationCreate, on_slot_boundary
+from app.models.series import (
+    ReservationSeries,
+    ReservationSeriesCreate,
+    SeriesException,
+    SeriesMaterializeResult,
+    SeriesOccurrence
+)
+from app.models.user import User
+from app.services.bulk_reservation_service import BulkReservationService
+from app.services.recurrence import Occurrence, compile_rule, expand_many, expand_series
+from app.services.reservation_service import ReservationService
+
+logger = logging.getLogger(__name__)
+
+
+def _recurrence_or_400(rule: str, dtstart: date):
+    try:
+        return compile_rule(rule, dtstart)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+class SeriesService:
+    """Reservation series operations"""
+
+    @staticmethod
+    async def create_series(data: ReservationSeriesCreate, created_by: User) -> ReservationSeries:
+        """Store a series and book its first occurrences"""
+        if created_by.is_patient() and data.patient_id != str(created_by.id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Patients can only book reservations for themselves"
+            )
+
+        recurrence = _recurrence_or_400(data.rrule, data.dtstart)
+        until = recurrence.last()
+        if recurrence.is_bounded and until is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Recurrence rule has no occurrences"
+            )
+
+        patient, doctor, box = await asyncio.gather(
+            User.get(data.patient_id),
+            User.get(data.doctor_id),
+            Box.get(data.box_id)
+        )
+        error = ReservationService.party_error(patient, doctor, box)
+        if error:
+            raise HTTPException(status_code=error[0], detail=error[1])
+
+        series = ReservationSeries(
+            patient_id=data.patient_id,
+            doctor_id=data.doctor_id,
+            box_id=data.box_id,
+            patient_name=patient.full_name,
+            doctor_name=doctor.full_name,
+            box_name=box.name,
+            rrule=data.rrule,
+            dtstart=data.dtstart,
+            until=until,
+            start_time=data.start_time,
+            duration_minutes=data.duration_minutes,
+            appointment_type=data.appointment_type,
+            reason=data.reason,
+            notes=data.notes,
+            priority=data.priority or "normal",
+            created_by=str(created_by.id)
+        )
+        await series.insert()
+        logger.info(f"Reservation series {series.id} created ({data.rrule} from {data.dtstart})")
+
+        horizon = date.today() + timedelta(days=settings.SERIES_MATERIALIZE_DAYS)
+        await SeriesService.materialize(horizon, [series.id])
+        return await ReservationSeries.get(series.id)
+
+    @staticmethod
+    async def find_in_window(
+        date_from: date,
+        date_to: date,
+        doctor_id: Optional[str] = None,
+        box_id: Optional[str] = None,
+        patient_id: Optional[str] = None
+    ) -> List[ReservationSeries]:
+        """Active series that may have occurrences in a date window"""
+        query = {
+            "is_active": True,
+            "dtstart": {"$lte": date_to.isoformat()},
+            "$or": [{"until": None}, {"until": {"$gte": date_from.isoformat()}}]
+        }
+        if doctor_id:
+            query["doctor_id"] = doctor_id
+        if box_id:
+            query["box_id"] = box_id
+        if patient_id:
+            query["patient_id"] = patient_id
+        return await ReservationSeries.find(query).to_list()
+
+    @staticmethod
+    def to_response(series: ReservationSeries, occurrence: Occurrence) -> SeriesOccurrence:
+        return SeriesOccurrence(
+            series_id=occurrence.series_id,
+            original_date=occurrence.original_date,
+            date=occurrence.date,
+            start_time=occurrence.start_time,
+            end_time=Reservation.compute_end_time(occurrence.start_time, occurrence.duration_minutes),
+            duration_minutes=occurrence.duration_minutes,
+            box_id=occurrence.box_id,
+            doctor_id=series.doctor_id,
+            patient_id=series.patient_id,
+            doctor_name=series.doctor_name,
+            box_name=series.box_name,
+            modified=occurrence.modified,
+            cancelled=occurrence.cancelled,
+            materialized=bool(series.materialized_until and occurrence.original_date <= series.materialized_until)
+        )
+
+    @staticmethod
+    async def occurrences(
+        date_from: date,
+        date_to: date,
+        doctor_id: Optional[str] = None,
+        box_id: Optional[str] = None,
+        patient_id: Optional[str] = None
+    ) -> List[SeriesOccurrence]:
+        """Occurrences of all matching series in a window, by date and time"""
+        series_list = await SeriesService.find_in_window(date_from, date_to, doctor_id, box_id, patient_id)
+        by_id = {str(series.id): series for series in series_list}
+        return [
+            SeriesService.to_response(by_id[occurrence.series_id], occurrence)
+            for occurrence in expand_many(series_list, date_from, date_to)
+        ]
+
+    @staticmethod
+    def series_occurrences(
+        series: ReservationSeries,
+        date_from: date,
+        date_to: date,
+        include_cancelled: bool = False
+    ) -> List[SeriesOccurrence]:
+        """Occurrences of one series in a window"""
+        return [
+            SeriesService.to_response(series, occurrence)
+            for occurrence in expand_series(series, date_from, date_to, include_cancelled)
+        ]
+
+    @staticmethod
+    async def add_exception(
+        series: ReservationSeries,
+        exception: SeriesException,
+        changed_by: User
+    ) -> ReservationSeries:
+        """Cancel, move or change one occurrence of a series"""
+        recurrence = _recurrence_or_400(series.rrule, series.dtstart)
+        if not recurrence.occurs_on(exception.original_date):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="The series has no occurrence on that date"
+            )
+        moved_to = exception.moved_to
+        if moved_to and (moved_to < series.dtstart or (series.until and moved_to > series.until)):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Occurrences can only be moved within the series period"
+            )
+        if not on_slot_boundary(exception.start_time):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"start_time must be a multiple of {settings.BOOKING_SLOT_MINUTES} minutes"
+            )
+
+        if series.materialized_until and exception.original_date <= series.materialized_until:
+            reservation = await Reservation.find_one({
+                "series_id": str(series.id),
+                "occurrence_date": exception.original_date.isoformat()
+            })
+            if reservation is not None:
+                if not exception.cancelled:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="This occurrence is already booked; reschedule its reservation instead"
+                    )
+                if reservation.status != settings.RESERVATION_STATUS["CANCELLED"]:
+                    if not reservation.can_be_cancelled():
+                        raise HTTPException(
+                            status_code=status.HTTP_409_CONFLICT,
+                            detail="This occurrence has already taken place and cannot be cancelled"
+                        )
+                    # Cancelled before the exception is saved: a failure here leaves the series unchanged
+                    await ReservationService.cancel_reservation(reservation, changed_by, exception.reason)
+
+        series.exceptions = [e for e in series.exceptions if e.original_date != exception.original_date]
+        series.exceptions.append(exception)
+        series.exceptions.sort(key=lambda e: e.original_date)
+        series.failed_occurrences = [
+            f for f in series.failed_occurrences if f.original_date != exception.original_date
+        ]
+        series.updated_at = datetime.utcnow()
+        await series.save()
+        return series
+
+    @staticmethod
+    async def cancel_series(series: ReservationSeries, cancelled_by: User) -> ReservationSeries:
+        """Stop a series and cancel its upcoming booked occurrences"""
+        if not series.is_active:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Series is already cancelled"
+            )
+
+        now = datetime.utcnow()
+        series.is_active = False
+        series.cancelled_at = now
+        series.cancelled_by = str(cancelled_by.id)
+        series.updated_at = now
+        await series.save()
+
+        upcoming = await Reservation.find({
+            "series_id": str(series.id),
+            "date": {"$gte": date.today().isoformat()}
+        }).to_list()
+        for reservation in upcoming:
+            if reservation.can_be_cancelled():
+                await ReservationService.cancel_reservation(reservation, cancelled_by, "Series cancelled")
+        return series
+
+    @staticmethod
+    async def booked_occurrences(extras: List[dict]) -> set:
+        """(series_id, occurrence_date) pairs among extras that already have a reservation"""
+        if not extras:
+            return set()
+        wanted = {(extra["series_id"], extra["occurrence_date"]) for extra in extras}
+        reservations = await Reservation.get_motor_collection().find(
+            {
+                "series_id": {"$in": list({series_id for series_id, _ in wanted})},
+                "occurrence_date": {"$in": list({day.isoformat() for _, day in wanted})}
+            },
+            {"series_id": 1, "occurrence_date": 1}
+        ).to_list(None)
+        booked = {(r["series_id"], date.fromisoformat(r["occurrence_date"])) for r in reservations}
+        return booked & wanted
+
+    @staticmethod
+    async def materialize(
+        until: date,
+        series_ids: Optional[List[PydanticObjectId]] = None
+    ) -> SeriesMaterializeResult:
+        """Book every not yet materialized occurrence up to a date, from today on"""
+        query = {
+            "is_active": True,
+            "$or": [{"materialized_until": None}, {"materialized_until": {"$lt": until.isoformat()}}]
+        }
+        if series_ids is not None:
+            query["_id"] = {"$in": series_ids}
+        series_list = await ReservationSeries.find(query).to_list()
+        if not series_list:
+            return SeriesMaterializeResult(until=until, series=0, created=0, failed=0)
+
+        creator_ids = [PydanticObjectId(i) for i in {s.created_by for s in series_list} if PydanticObjectId.is_valid(i)]
+        creators = {str(user.id): user for user in await User.find({"_id": {"$in": creator_ids}}).to_list()}
+        today = date.today()
+        batches: Dict[str, List[tuple]] = defaultdict(list)
+        for series in series_list:
+            start = max(series.dtstart, today)
+            if series.materialized_until:
+                start = max(start, series.materialized_until + timedelta(days=1))
+            for occurrence in expand_series(series, start, until, by_original_date=True):
+                item = ReservationCreate(
+                    patient_id=series.patient_id,
+                    doctor_id=series.doctor_id,
+                    box_id=occurrence.box_id,
+                    date=occurrence.date,
+                    start_time=occurrence.start_time,
+                    duration_minutes=occurrence.duration_minutes,
+                    appointment_type=series.appointment_type,
+                    reason=series.reason,
+                    notes=series.notes,
+                    priority=series.priority
+                )
+                extra = {"series_id": str(series.id), "occurrence_date": occurrence.original_date}
+                batches[series.created_by].append((item, extra))
+
+        created = 0
+        # series_id -> occurrences left unbooked, recorded on the series since
+        # materialized_until moves past them
+        failures: Dict[str, List[dict]] = defaultdict(list)
+
+        def record_failure(item: ReservationCreate, extra: dict, status_code: int, detail: Optional[str]):
+            logger.warning(
+                f"Series {extra['series_id']} occurrence {extra['occurrence_date']} not booked: {detail}"
+            )
+            failures[extra["series_id"]].append({
+                "original_date": extra["occurrence_date"].isoformat(),
+                "date": item.date.isoformat(),
+                "status_code": status_code,
+                "detail": detail,
+                "failed_at": datetime.utcnow()
+            })
+
+        batch_size = settings.BULK_RESERVATION_MAX_ITEMS
+        rejected: List[tuple] = []
+        for creator_id, entries in batches.items():
+            creator = creators.get(creator_id)
+            if creator is None:
+                for item, extra in entries:
+                    record_failure(item, extra, status.HTTP_424_FAILED_DEPENDENCY, "Series creator not found")
+                continue
+            for offset in range(0, len(entries), batch_size):
+                chunk = entries[offset:offset + batch_size]
+                result = await BulkReservationService.create_reservations(
+                    ReservationBulkCreate(items=[item for item, _ in chunk]),
+                    creator,
+                    [extra for _, extra in chunk]
+                )
+                created += result.created
+                for item_result in result.results:
+                    if item_result.status_code != status.HTTP_201_CREATED:
+                        rejected.append((*chunk[item_result.index], item_result.status_code, item_result.detail))
+
+        # A concurrent materialize of the same series books the occurrence
+        # itself, and its slot then looks taken here; that is not a failure
+        booked = await SeriesService.booked_occurrences([extra for _, extra, _, _ in rejected])
+        for item, extra, status_code, detail in rejected:
+            if (extra["series_id"], extra["occurrence_date"]) not in booked:
+                record_failure(item, extra, status_code, detail)
+
+        progress = {"$set": {"materialized_until": until.isoformat(), "updated_at": datetime.utcnow()}}
+        operations = [
+            UpdateOne(
+                {"_id": PydanticObjectId(series_id)},
+                {**progress, "$push": {"failed_occurrences": {"$each": entries}}}
+            )
+            for series_id, entries in failures.items()
+        ]
+        succeeded = [series.id for series in series_list if str(series.id) not in failures]
+        if succeeded:
+            operations.append(UpdateMany({"_id": {"$in": succeeded}}, progress))
+        await ReservationSeries.get_motor_collection().bulk_write(operations, ordered=False)
+        failed = sum(len(entries) for entries in failures.values())
+        logger.info(f"Materialized {created} occurrences of {len(series_list)} series up to {until} ({failed} failed)")
+        return SeriesMaterializeResult(until=until, series=len(series_list), created=created, failed=failed)
@@ -0,0 +1,245 @@
+"""
+Slot-grid engine for doctor availability.
+
+A doctor-day is represented as minute offsets from midnight (0..1440).
+Slot starts for many TimeSlots and dates are produced in a single batched
+NumPy pass, and lunch breaks / booked intervals are removed with interval
+arithmetic over a per-day minute grid instead of per-slot Python objects.
+"""
+from datetime import date, time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MINUTES_PER_DAY = 24 * 60
+WEEKDAY_NAMES = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# (doctor_id, date, start_time, end_time)
+BookedInterval = Tuple[str, date, time, time]
+
+
+def to_minutes(value: time) -> int:
+    """Convert a time of day to minutes after midnight"""
+    return value.hour * 60 + value.minute
+
+
+def to_time(minutes: int) -> time:
+    """Convert minutes after midnight to a time of day"""
+    return time(int(minutes) // 60, int(minutes) % 60)
+
+
+def slot_step(time_slot) -> int:
+    """Minutes between two consecutive slot starts"""
+    return max(1, time_slot.appointment_duration + time_slot.break_between)
+
+
+def time_slot_starts(time_slot) -> List[time]:
+    """Slot starts for a single TimeSlot (same result as the legacy loop)"""
+    start = to_minutes(time_slot.start_time)
+    end = to_minutes(time_slot.end_time)
+    return [to_time(m) for m in range(start, end, slot_step(time_slot))]
+
+
+def active_days(schedule, dates: Sequence[date], weekdays: Sequence[str]) -> List[date]:
+    """
+    Dates on which a schedule is active.
+
+    Same rules as ``Schedule.applies_on`` but reads the schedule fields
+    once instead of once per date.
+    """
+    if not schedule.is_available:
+        return []
+
+    effective_from = schedule.effective_from
+    effective_to = schedule.effective_to
+    schedule_type = schedule.schedule_type
+    day_of_week = schedule.day_of_week
+    specific_date = schedule.specific_date
+
+    result = []
+    for day, weekday in zip(dates, weekdays):
+        if day < effective_from or (effective_to and day > effective_to):
+            continue
+        if schedule_type == "regular":
+            if day_of_week == weekday:
+                result.append(day)
+        elif schedule_type == "exception":
+            if specific_date == day:
+                result.append(day)
+    return result
+
+
+def expand_ranges(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    steps: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Expand [start, end) ranges with a step into flat slot starts.
+
+    Returns (owner, offsets): owner[i] is the index of the range that
+    produced offsets[i].
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    steps = np.maximum(np.asarray(steps, dtype=np.int64), 1)
+
+    span = np.maximum(ends - starts, 0)
+    counts = (span + steps - 1) // steps
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    owner = np.repeat(np.arange(len(starts)), counts)
+    first = np.cumsum(counts) - counts
+    position = np.arange(total) - np.repeat(first, counts)
+    offsets = starts[owner] + position * steps[owner]
+    return owner, offsets
+
+
+class SlotGrid:
+    """Available slot starts for a set of doctor-days"""
+
+    def __init__(
+        self,
+        keys: List[Tuple[str, date]],
+        group: np.ndarray,
+        starts: np.ndarray,
+        durations: np.ndarray,
+    ):
+        self.keys = keys
+        self._index = {key: i for i, key in enumerate(keys)}
+
+        # Sort by (doctor-day, start) once so lookups are contiguous slices
+        order = np.lexsort((starts, group))
+        self.group = group[order]
+        self.starts = starts[order]
+        self.durations = durations[order]
+        self._bounds = np.searchsorted(self.group, np.arange(len(keys) + 1))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def offsets_for(self, doctor_id: str, day: date) -> np.ndarray:
+        """Slot starts as minute offsets for one doctor-day"""
+        i = self._index.get((doctor_id, day))
+        if i is None:
+            return np.empty(0, dtype=np.int64)
+        return self.starts[self._bounds[i]:self._bounds[i + 1]]
+
+    def slots_for(self, doctor_id: str, day: date) -> List[time]:
+        """Slot starts as time objects for one doctor-day"""
+        return [to_time(m) for m in self.offsets_for(doctor_id, day)]
+
+    def as_dict(self) -> Dict[Tuple[str, date], List[time]]:
+        """All doctor-days with their slot starts"""
+        return {key: self.slots_for(*key) for key in self.keys}
+
+    def subtract(self, blocked: Sequence[Tuple[int, int, int]]) -> "SlotGrid":
+        """
+        Remove slots overlapping blocked intervals.
+
+        ``blocked`` holds (group, start_minute, end_minute) triples. A slot
+        [start, start + duration) is dropped when any blocked minute falls
+        inside it.
+        """
+        if not blocked or len(self.starts) == 0:
+            return self
+
+        blocked_arr = np.asarray(blocked, dtype=np.int64).reshape(-1, 3)
+        n_groups = len(self.keys)
+
+        # Coverage count per minute via difference array + cumsum
+        diff = np.zeros((n_groups, MINUTES_PER_DAY + 1), dtype=np.int32)
+        lo = np.clip(blocked_arr[:, 1], 0, MINUTES_PER_DAY)
+        hi = np.clip(blocked_arr[:, 2], 0, MINUTES_PER_DAY)
+        valid = hi > lo
+        np.add.at(diff, (blocked_arr[valid, 0], lo[valid]), 1)
+        np.add.at(diff, (blocked_arr[valid, 0], hi[valid]), -1)
+        covered = np.cumsum(diff, axis=1) > 0
+
+        # Prefix sum of covered minutes answers "any blocked in [a, b)"
+        prefix = np.zeros((n_groups, MINUTES_PER_DAY + 1), dtype=np.int32)
+        np.cumsum(covered[:, :MINUTES_PER_DAY], axis=1, out=prefix[:, 1:])
+
+        slot_end = np.minimum(self.starts + np.maximum(self.durations, 1), MINUTES_PER_DAY)
+        hits = prefix[self.group, slot_end] - prefix[self.group, self.starts]
+        keep = hits == 0
+
+        return SlotGrid(self.keys, self.group[keep], self.starts[keep], self.durations[keep])
+
+
+def build_slot_grid(
+    schedules: Iterable,
+    dates: Iterable[date],
+    booked: Optional[Iterable[BookedInterval]] = None,
+    subtract_lunch: bool = False,
+) -> SlotGrid:
+    """
+    Build the slot grid for every doctor active on the given dates.
+
+    With no bookings and ``subtract_lunch=False`` each doctor-day holds the
+    same slots as ``Schedule.get_available_slots_for_date`` (concatenated
+    across the doctor's active schedules). Like that method it only applies
+    each entry's own dates; pass the schedules from
+    ``AvailabilityIndex.schedules_on`` to honour leave and exceptions.
+    """
+    dates = list(dates)
+    weekdays = [WEEKDAY_NAMES[day.weekday()] for day in dates]
+    keys: List[Tuple[str, date]] = []
+    key_index: Dict[Tuple[str, date], int] = {}
+
+    range_group: List[int] = []
+    range_start: List[int] = []
+    range_end: List[int] = []
+    range_step: List[int] = []
+    range_duration: List[int] = []
+    blocked: List[Tuple[int, int, int]] = []
+
+    for schedule in schedules:
+        days = active_days(schedule, dates, weekdays)
+        if not days:
+            continue
+
+        available = [ts for ts in schedule.time_slots if ts.is_available]
+        if not available:
+            continue
+
+        starts = [to_minutes(ts.start_time) for ts in available]
+        ends = [to_minutes(ts.end_time) for ts in available]
+        steps = [slot_step(ts) for ts in available]
+        durations = [ts.appointment_duration for ts in available]
+
+        lunch = None
+        if subtract_lunch and schedule.lunch_break_start and schedule.lunch_break_end:
+            lunch = (to_minutes(schedule.lunch_break_start), to_minutes(schedule.lunch_break_end))
+
+        doctor_id = schedule.doctor_id
+        for day in days:
+            key = (doctor_id, day)
+            group = key_index.get(key)
+            if group is None:
+                group = key_index[key] = len(keys)
+                keys.append(key)
+
+            range_group.extend([group] * len(available))
+            range_start.extend(starts)
+            range_end.extend(ends)
+            range_step.extend(steps)
+            range_duration.extend(durations)
+
+            if lunch:
+                blocked.append((group, lunch[0], lunch[1]))
+
+    owner, offsets = expand_ranges(range_start, range_end, range_step)
+    group_arr = np.asarray(range_group, dtype=np.int64)[owner] if len(owner) else owner
+    duration_arr = np.asarray(range_duration, dtype=np.int64)[owner] if len(owner) else owner
+    grid = SlotGrid(keys, group_arr, offsets, duration_arr)
+
+    for doctor_id, day, start, end in booked or ():
+        group = key_index.get((doctor_id, day))
+        if group is not None:
+            blocked.append((group, to_minutes(start), to_minutes(end)))
+
+    return grid.subtract(blocked)
@@ -0,0 +1,389 @@
+"""
+Statistics computed with server-side MongoDB aggregation pipelines.
+
+Each stats model is filled by $match/$facet/$group pipelines so only the
+aggregated numbers travel over the wire. Independent pipelines run
+concurrently with asyncio.gather. Dates and times are stored as ISO
+strings, so month and hour buckets are plain $substrBytes prefixes.
+
+With STATS_USE_ROLLUPS, reservation figures are read from the per-day
+rollups (rollup_service) instead of the reservations collection. It is off
+by default: rollups only exist once app.commands.rebuild_rollups has
+backfilled them.
+"""
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.box import Box, BoxStats
+from app.models.reservation import Reservation, ReservationStats
+from app.models.rollup import ReservationRollup
+from app.models.schedule import Schedule, ScheduleStats
+from app.models.user import User, UserStats
+from app.services.rollup_service import OCCUPYING_STATUSES
+from app.services.slot_grid import WEEKDAY_NAMES
+
+STATUS = settings.RESERVATION_STATUS
+
+DEFAULT_PERIOD_DAYS = 30
+
+
+def _period(date_from: Optional[date], date_to: Optional[date]) -> Tuple[date, date]:
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=DEFAULT_PERIOD_DAYS - 1)
+    return date_from, date_to
+
+
+def _date_match(date_from: date, date_to: date) -> dict:
+    return {"date": {"$gte": date_from.isoformat(), "$lte": date_to.isoformat()}}
+
+
+def _minutes_expr(field: str) -> dict:
+    """Aggregation expression turning an "HH:MM[:SS]" string into minutes"""
+    return {
+        "$add": [
+            {"$multiply": [{"$toInt": {"$substrBytes": [field, 0, 2]}}, 60]},
+            {"$toInt": {"$substrBytes": [field, 3, 2]}}
+        ]
+    }
+
+
+def _hhmm_to_minutes(value: str) -> int:
+    return int(value[:2]) * 60 + int(value[3:5])
+
+
+def _percentage(part: float, total: float) -> float:
+    return round(100 * part / total, 2) if total else 0.0
+
+
+async def _aggregate(document_model, pipeline: List[dict]) -> List[dict]:
+    return await document_model.aggregate(pipeline).to_list()
+
+
+class StatsService:
+    """Dashboard statistics"""
+
+    @staticmethod
+    def _build_reservation_stats(
+        by_status: Dict[str, int],
+        by_type: Dict[str, int],
+        duration_total: float,
+        hours: Dict[str, int],
+        monthly: List[dict]
+    ) -> ReservationStats:
+        total = sum(by_status.values())
+        attended = by_status.get(STATUS["COMPLETED"], 0) + by_status.get(STATUS["NO_SHOW"], 0)
+        busiest = sorted(((hour, count) for hour, count in hours.items() if hour), key=lambda item: -item[1])[:5]
+
+        return ReservationStats(
+            total_reservations=total,
+            pending_reservations=by_status.get(STATUS["PENDING"], 0),
+            confirmed_reservations=by_status.get(STATUS["CONFIRMED"], 0),
+            completed_reservations=by_status.get(STATUS["COMPLETED"], 0),
+            cancelled_reservations=by_status.get(STATUS["CANCELLED"], 0),
+            no_show_rate=_percentage(by_status.get(STATUS["NO_SHOW"], 0), attended),
+            average_duration=round(duration_total / total, 2) if total else 0.0,
+            busiest_hours=[{"hour": int(hour), "count": count} for hour, count in busiest],
+            reservations_by_type=by_type,
+            monthly_trends=monthly
+        )
+
+    @staticmethod
+    async def reservation_stats(date_from: Optional[date] = None, date_to: Optional[date] = None) -> ReservationStats:
+        """Reservation counts, no-show rate, busiest hours and monthly trends"""
+        if settings.STATS_USE_ROLLUPS:
+            return await StatsService.reservation_stats_from_rollups(date_from, date_to)
+        return await StatsService.reservation_stats_live(date_from, date_to)
+
+    @staticmethod
+    async def reservation_stats_live(date_from: Optional[date] = None, date_to: Optional[date] = None) -> ReservationStats:
+        """Reservation statistics aggregated from the reservations collection"""
+        date_from, date_to = _period(date_from, date_to)
+        match = {"$match": _date_match(date_from, date_to)}
+
+        summary_pipeline = [
+            match,
+            {"$facet": {
+                "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+                "by_type": [{"$group": {"_id": "$appointment_type", "count": {"$sum": 1}}}],
+                "duration": [{"$group": {"_id": None, "total": {"$sum": "$duration_minutes"}}}]
+            }}
+        ]
+        trends_pipeline = [
+            match,
+            {"$facet": {
+                "hours": [
+                    {"$group": {"_id": {"$substrBytes": ["$start_time", 0, 2]}, "count": {"$sum": 1}}}
+                ],
+                "monthly": [
+                    {"$group": {
+                        "_id": {"$substrBytes": ["$date", 0, 7]},
+                        "total": {"$sum": 1},
+                        "completed": {"$sum": {"$cond": [{"$eq": ["$status", STATUS["COMPLETED"]]}, 1, 0]}},
+                        "cancelled": {"$sum": {"$cond": [{"$eq": ["$status", STATUS["CANCELLED"]]}, 1, 0]}},
+                        "no_show": {"$sum": {"$cond": [{"$eq": ["$status", STATUS["NO_SHOW"]]}, 1, 0]}}
+                    }},
+                    {"$sort": {"_id": 1}}
+                ]
+            }}
+        ]
+
+        summary, trends = await asyncio.gather(
+            _aggregate(Reservation, summary_pipeline),
+            _aggregate(Reservation, trends_pipeline)
+        )
+        summary, trends = summary[0], trends[0]
+
+        return StatsService._build_reservation_stats(
+            by_status={row["_id"]: row["count"] for row in summary["by_status"]},
+            by_type={row["_id"]: row["count"] for row in summary["by_type"]},
+            duration_total=summary["duration"][0]["total"] if summary["duration"] else 0,
+            hours={row["_id"]: row["count"] for row in trends["hours"]},
+            monthly=[
+                {
+                    "month": row["_id"],
+                    "total": row["total"],
+                    "completed": row["completed"],
+                    "cancelled": row["cancelled"],
+                    "no_show": row["no_show"]
+                }
+                for row in trends["monthly"]
+            ]
+        )
+
+    @staticmethod
+    async def reservation_stats_from_rollups(date_from: Optional[date] = None, date_to: Optional[date] = None) -> ReservationStats:
+        """Reservation statistics merged from clinic-wide daily rollups"""
+        date_from, date_to = _period(date_from, date_to)
+        rollups = await ReservationRollup.get_motor_collection().find(
+            {"scope": "clinic", **_date_match(date_from, date_to)},
+            {"_id": 0, "month": 1, "total": 1, "duration_minutes": 1, "status": 1, "type": 1, "hours": 1}
+        ).to_list(None)
+
+        by_status: Dict[str, int] = defaultdict(int)
+        by_type: Dict[str, int] = defaultdict(int)
+        hours: Dict[str, int] = defaultdict(int)
+        months: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        duration_total = 0
+
+        for rollup in rollups:
+            duration_total += rollup.get("duration_minutes", 0)
+            for status_name, count in (rollup.get("status") or {}).items():
+                by_status[status_name] += count
+            for type_name, count in (rollup.get("type") or {}).items():
+                by_type[type_name] += count
+            for hour, count in (rollup.get("hours") or {}).items():
+                hours[hour] += count
+            month = months[rollup["month"]]
+            month["total"] += rollup.get("total", 0)
+            for field, status_name in (("completed", "COMPLETED"), ("cancelled", "CANCELLED"), ("no_show", "NO_SHOW")):
+                month[field] += (rollup.get("status") or {}).get(STATUS[status_name], 0)
+
+        return StatsService._build_reservation_stats(
+            by_status={name: count for name, count in by_status.items() if count},
+            by_type={name: count for name, count in by_type.items() if count},
+            duration_total=duration_total,
+            hours=hours,
+            monthly=[
+                {
+                    "month": month,
+                    "total": values["total"],
+                    "completed": values["completed"],
+                    "cancelled": values["cancelled"],
+                    "no_show": values["no_show"]
+                }
+                for month, values in sorted(months.items())
+            ]
+        )
+
+    @staticmethod
+    def box_capacity_minutes(box: dict, date_from: date, date_to: date) -> int:
+        """Bookable minutes of a box in a period, from its opening hours"""
+        try:
+            opens = _hhmm_to_minutes(box.get("available_from") or "08:00")
+            closes = _hhmm_to_minutes(box.get("available_to") or "18:00")
+        except (TypeError, ValueError):
+            return 0
+        days = set(box.get("available_days") or [])
+        open_days = sum(
+            1 for offset in range((date_to - date_from).days + 1)
+            if WEEKDAY_NAMES[(date_from + timedelta(days=offset)).weekday()] in days
+        )
+        return max(0, closes - opens) * open_days
+
+    @staticmethod
+    async def box_stats(date_from: Optional[date] = None, date_to: Optional[date] = None) -> BoxStats:
+        """Box status counts, utilization rate and most used boxes"""
+        date_from, date_to = _period(date_from, date_to)
+
+        boxes_pipeline = [
+            {"$facet": {
+                "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+                "by_floor": [{"$group": {"_id": "$floor", "count": {"$sum": 1}}}],
+                "active": [
+                    {"$match": {"is_active": True}},
+                    {"$project": {"name": 1, "available_from": 1, "available_to": 1, "available_days": 1}}
+                ]
+            }}
+        ]
+        if settings.STATS_USE_ROLLUPS:
+            usage_model = ReservationRollup
+            usage_pipeline = [
+                {"$match": {"scope": "box", **_date_match(date_from, date_to)}},
+                {"$group": {
+                    "_id": "$key",
+                    "box_name": {"$last": "$name"},
+                    "reservations": {"$sum": "$booked"},
+                    "booked_minutes": {"$sum": "$booked_minutes"}
+                }},
+                {"$sort": {"booked_minutes": -1}}
+            ]
+        else:
+            usage_model = Reservation
+            usage_pipeline = [
+                {"$match": {**_date_match(date_from, date_to), "status": {"$in": list(OCCUPYING_STATUSES)}}},
+                {"$group": {
+                    "_id": "$box_id",
+                    "box_name": {"$first": "$box_name"},
+                    "reservations": {"$sum": 1},
+                    "booked_minutes": {"$sum": "$duration_minutes"}
+                }},
+                {"$sort": {"booked_minutes": -1}}
+            ]
+
+        boxes, usage = await asyncio.gather(
+            _aggregate(Box, boxes_pipeline),
+            _aggregate(usage_model, usage_pipeline)
+        )
+        boxes = boxes[0]
+
+        by_status = {row["_id"]: row["count"] for row in boxes["by_status"]}
+        active_ids = {str(box["_id"]) for box in boxes["active"]}
+        capacity = sum(StatsService.box_capacity_minutes(box, date_from, date_to) for box in boxes["active"])
+        booked = sum(row["booked_minutes"] for row in usage if row["_id"] in active_ids)
+
+        return BoxStats(
+            total_boxes=sum(by_status.values()),
+            available_boxes=by_status.get(settings.BOX_STATUS["AVAILABLE"], 0),
+            occupied_boxes=by_status.get(settings.BOX_STATUS["OCCUPIED"], 0),
+            maintenance_boxes=by_status.get(settings.BOX_STATUS["MAINTENANCE"], 0),
+            utilization_rate=_percentage(booked, capacity),
+            boxes_by_floor={str(row["_id"]): row["count"] for row in boxes["by_floor"]},
+            most_used_boxes=[
+                {
+                    "box_id": row["_id"],
+                    "box_name": row["box_name"],
+                    "reservations": row["reservations"],
+                    "booked_minutes": row["booked_minutes"]
+                }
+                for row in usage[:5]
+            ]
+        )
+
+    @staticmethod
+    async def schedule_stats(on_date: Optional[date] = None) -> ScheduleStats:
+        """Schedule counts, slots per day and weekday coverage"""
+        today = (on_date or date.today()).isoformat()
+        slot_count = {
+            "$sum": {
+                "$map": {
+                    "input": {"$filter": {"input": "$time_slots", "as": "ts", "cond": "$$ts.is_available"}},
+                    "as": "ts",
+                    "in": {"$ceil": {"$divide": [
+                        {"$max": [0, {"$subtract": [_minutes_expr("$$ts.end_time"), _minutes_expr("$$ts.start_time")]}]},
+                        {"$max": [1, {"$add": ["$$ts.appointment_duration", "$$ts.break_between"]}]}
+                    ]}}
+                }
+            }
+        }
+        active_match = {
+            "is_available": True,
+            "effective_from": {"$lte": today},
+            "$or": [{"effective_to": None}, {"effective_to": {"$gte": today}}]
+        }
+
+        pipeline = [
+            {"$facet": {
+                "total": [{"$count": "count"}],
+                "active": [{"$match": active_match}, {"$count": "count"}],
+                "doctors": [{"$group": {"_id": "$doctor_id"}}, {"$count": "count"}],
+                "regular": [
+                    {"$match": {**active_match, "schedule_type": "regular"}},
+                    {"$group": {
+                        "_id": "$day_of_week",
+                        "schedules": {"$sum": 1},
+                        "doctors": {"$addToSet": "$doctor_id"},
+                        "slots": {"$sum": slot_count}
+                    }}
+                ]
+            }}
+        ]
+        result = (await _aggregate(Schedule, pipeline))[0]
+
+        def count(facet: str) -> int:
+            return result[facet][0]["count"] if result[facet] else 0
+
+        regular = result["regular"]
+        doctors_total = count("doctors")
+        schedules_total = sum(row["schedules"] for row in regular)
+        slots_total = sum(row["slots"] for row in regular)
+
+        return ScheduleStats(
+            total_schedules=count("total"),
+            active_schedules=count("active"),
+            doctors_with_schedules=doctors_total,
+            average_slots_per_day=round(slots_total / schedules_total, 2) if schedules_total else 0.0,
+            busiest_days=[
+                {"day": row["_id"], "schedules": row["schedules"], "slots": row["slots"]}
+                for row in sorted(regular, key=lambda row: row["slots"], reverse=True)
+            ],
+            schedule_coverage={
+                day: _percentage(next((len(r["doctors"]) for r in regular if r["_id"] == day), 0), doctors_total)
+                for day in WEEKDAY_NAMES
+            }
+        )
+
+    @staticmethod
+    async def user_stats(recent_days: int = 30) -> UserStats:
+        """User counts by role, activity and verification"""
+        since = datetime.utcnow() - timedelta(days=recent_days)
+        pipeline = [
+            {"$facet": {
+                "by_role": [{"$group": {"_id": "$role", "count": {"$sum": 1}}}],
+                "totals": [{"$group": {
+                    "_id": None,
+                    "total": {"$sum": 1},
+                    "active": {"$sum": {"$cond": ["$is_active", 1, 0]}},
+                    "verified": {"$sum": {"$cond": ["$is_verified", 1, 0]}},
+                    "recent": {"$sum": {"$cond": [{"$gte": ["$created_at", since]}, 1, 0]}}
+                }}]
+            }}
+        ]
+        result = (await _aggregate(User, pipeline))[0]
+        totals = result["totals"][0] if result["totals"] else {}
+
+        return UserStats(
+            total_users=totals.get("total", 0),
+            active_users=totals.get("active", 0),
+            users_by_role={row["_id"]: row["count"] for row in result["by_role"]},
+            recent_registrations=totals.get("recent", 0),
+            verified_users=totals.get("verified", 0)
+        )
+
+    @staticmethod
+    async def dashboard(date_from: Optional[date] = None, date_to: Optional[date] = None) -> Dict[str, object]:
+        """All statistics, computed concurrently"""
+        reservations, boxes, schedules, users = await asyncio.gather(
+            StatsService.reservation_stats(date_from, date_to),
+            StatsService.box_stats(date_from, date_to),
+            StatsService.schedule_stats(),
+            StatsService.user_stats()
+        )
+        return {
+            "reservations": reservations,
+            "boxes": boxes,
+            "schedules": schedules,
+            "users": users
+        }
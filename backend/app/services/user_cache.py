@@ -0,0 +1,177 @@
+"""
+Cache for authenticated user lookups.
+
+get_current_user resolves the same user on every request, so users are kept
+in a bounded in-process TTL/LRU cache, with an optional Redis tier shared by
+all gunicorn workers. Only the UserAuth fields (identity, role, status) are
+loaded and cached: password hashes and medical data never reach Redis, and
+request handlers get the read-only UserAuth. Writes to a User (profile
+update, deactivation, password change, delete) invalidate both tiers and
+broadcast the invalidation to the other workers over Redis pub/sub.
+
+An invalidation can land between a miss's MongoDB read and its cache
+write. Each invalidation bumps a per-user version in Redis (and a local
+counter), and a miss only stores what it read if neither moved since it
+started, so a deactivated user is never cached back as active.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from beanie import PydanticObjectId
+from bson.errors import InvalidId
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.models.user import User, UserAuth
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "user-cache:"
+VERSION_KEY_PREFIX = "user-cache:version:"
+INVALIDATION_CHANNEL = "user-cache:invalidate"
+
+# KEYS[1] entry, KEYS[2] version; ARGV version read before the miss, entry, TTL
+STORE_IF_CURRENT_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+class UserCache:
+    """Two-tier user cache (in-process + optional Redis)"""
+
+    def __init__(self, maxsize: int, ttl: float, redis_ttl: int):
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.redis_ttl = redis_ttl
+        self.redis_hits = 0
+        self.redis_misses = 0
+        # Bumped by every invalidation seen here; a miss started before one is not stored
+        self.generation = 0
+        self._listener: Optional[asyncio.Task] = None
+        self._script = None
+        self._script_redis = None
+
+    async def get_user(self, user_id: str) -> Optional[UserAuth]:
+        """Get a user's auth fields by id, going to MongoDB only on a miss"""
+        user = self.local.get(user_id)
+        if user is not None:
+            return user
+
+        generation = self.generation
+        redis = get_redis()
+        version = None
+        if redis is not None:
+            try:
+                payload, version = await redis.mget(REDIS_KEY_PREFIX + user_id, VERSION_KEY_PREFIX + user_id)
+                version = version or "0"
+            except Exception as e:
+                logger.warning(f"User cache Redis read failed: {e}")
+                payload = None
+            if payload is not None:
+                self.redis_hits += 1
+                user = UserAuth.model_validate_json(payload)
+                if self.generation == generation:
+                    self.local.set(user_id, user)
+                return user
+            self.redis_misses += 1
+
+        try:
+            object_id = PydanticObjectId(user_id)
+        except (InvalidId, TypeError):
+            return None
+        user = await User.find_one({"_id": object_id}, projection_model=UserAuth)
+        if user is None:
+            return None
+        if self.generation == generation:
+            self.local.set(user_id, user)
+        if version is not None:
+            await self._store_if_current(redis, user, version)
+        return user
+
+    async def _store_if_current(self, redis, user: UserAuth, version: str):
+        """Write a user to Redis unless it was invalidated after ``version`` was read"""
+        if self._script is None or self._script_redis is not redis:
+            self._script = redis.register_script(STORE_IF_CURRENT_SCRIPT)
+            self._script_redis = redis
+        user_id = str(user.id)
+        try:
+            await self._script(
+                keys=[REDIS_KEY_PREFIX + user_id, VERSION_KEY_PREFIX + user_id],
+                args=[version, user.model_dump_json(), self.redis_ttl]
+            )
+        except Exception as e:
+            logger.warning(f"User cache Redis write failed: {e}")
+
+    async def invalidate(self, user_id: str):
+        """Drop a user from every tier and every worker"""
+        self.generation += 1
+        self.local.delete(user_id)
+
+        redis = get_redis()
+        if redis is not None:
+            try:
+                version_key = VERSION_KEY_PREFIX + user_id
+                async with redis.pipeline(transaction=True) as pipe:
+                    # The version outlives any entry stored against an older one
+                    pipe.incr(version_key).expire(version_key, self.redis_ttl).delete(REDIS_KEY_PREFIX + user_id)
+                    await pipe.execute()
+                await redis.publish(INVALIDATION_CHANNEL, user_id)
+            except Exception as e:
+                logger.warning(f"User cache Redis invalidation failed: {e}")
+
+    async def start(self):
+        """Listen for invalidations published by other workers"""
+        redis = get_redis()
+        if redis is None or self._listener is not None:
+            return
+        self._listener = asyncio.create_task(self._listen(redis))
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self, redis):
+        while True:
+            try:
+                pubsub = redis.pubsub()
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.generation += 1
+                        self.local.delete(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Local entries may be stale until the connection is back
+                logger.warning(f"User cache invalidation listener error: {e}")
+                self.generation += 1
+                self.local.clear()
+                await asyncio.sleep(1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for both tiers"""
+        return {
+            "local": self.local.stats(),
+            "redis": {
+                "enabled": get_redis() is not None,
+                "hits": self.redis_hits,
+                "misses": self.redis_misses
+            }
+        }
+
+
+user_cache = UserCache(
+    maxsize=settings.USER_CACHE_SIZE,
+    ttl=settings.USER_CACHE_TTL,
+    redis_ttl=settings.USER_CACHE_REDIS_TTL
+)
@@ -0,0 +1,106 @@
+"""
+Concurrency benchmark for reservation booking.
+
+Fires hundreds of simultaneous bookings at a handful of slots of the same
+box and doctor and checks that exactly one booking per slot succeeds.
+Runs against a scratch database (dropped first) on DATABASE_URL.
+
+Usage: python -m benchmarks.bench_booking_concurrency [--bookings 500] [--slots 10]
+"""
+import argparse
+import asyncio
+import statistics
+import time as timer
+from datetime import date, time
+
+from beanie import init_beanie
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.models.box import Box
+from app.models.reservation import Reservation, ReservationCreate
+from app.models.schedule import Schedule
+from app.models.slot_claim import SlotClaim
+from app.models.user import User
+from app.services.reservation_service import ReservationService
+
+
+async def seed():
+    patient = await User(
+        email="bench-patient@redsalud.cl", username="bench_patient", full_name="Bench Patient",
+        hashed_password="-", role="patient"
+    ).insert()
+    doctor = await User(
+        email="bench-doctor@redsalud.cl", username="bench_doctor", full_name="Bench Doctor",
+        hashed_password="-", role="doctor"
+    ).insert()
+    admin = await User(
+        email="bench-admin@redsalud.cl", username="bench_admin", full_name="Bench Admin",
+        hashed_password="-", role="admin"
+    ).insert()
+    box = await Box(name="Bench Box", location="Bench", capacity=2, status="available").insert()
+    return patient, doctor, admin, box
+
+
+async def run(args):
+    client = AsyncIOMotorClient(args.database_url, maxPoolSize=args.pool_size)
+    await client.drop_database(args.database)
+    await init_beanie(
+        database=client[args.database],
+        document_models=[User, Box, Reservation, Schedule, SlotClaim]
+    )
+    patient, doctor, admin, box = await seed()
+    day = date(2030, 1, 7)
+
+    async def book(slot: int):
+        data = ReservationCreate(
+            patient_id=str(patient.id),
+            doctor_id=str(doctor.id),
+            box_id=str(box.id),
+            date=day,
+            start_time=time(8 + slot // 2, 30 * (slot % 2)),
+            duration_minutes=30,
+            appointment_type="consultation"
+        )
+        started = timer.perf_counter()
+        try:
+            await ReservationService.create_reservation(data, admin)
+            ok = True
+        except HTTPException as exc:
+            if exc.status_code != 409:
+                raise
+            ok = False
+        return ok, timer.perf_counter() - started
+
+    started = timer.perf_counter()
+    results = await asyncio.gather(*(book(i % args.slots) for i in range(args.bookings)))
+    elapsed = timer.perf_counter() - started
+
+    successes = sum(ok for ok, _ in results)
+    stored = await Reservation.find(Reservation.box_id == str(box.id)).count()
+    latencies = sorted(latency for _, latency in results)
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+
+    print(f"bookings: {args.bookings}  slots: {args.slots}  succeeded: {successes}  stored: {stored}")
+    print(f"wall: {elapsed * 1000:.0f} ms  throughput: {args.bookings / elapsed:.0f} req/s")
+    print(f"latency p50: {p50 * 1000:.1f} ms  p99: {p99 * 1000:.1f} ms")
+    assert successes == stored == args.slots, "double booking detected"
+
+    await client.drop_database(args.database)
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bookings", type=int, default=500)
+    parser.add_argument("--slots", type=int, default=10)
+    parser.add_argument("--pool-size", type=int, default=100)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--database", default="redsalud_bench")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
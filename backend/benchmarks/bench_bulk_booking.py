@@ -0,0 +1,107 @@
+"""
+Benchmark: booking a batch one by one vs through the bulk path.
+
+Books N weekly appointments (spread over several doctors and boxes) with
+ReservationService.create_reservation in a loop, then the same amount on
+fresh dates with BulkReservationService in best-effort and all-or-nothing
+mode. Runs against a scratch database (dropped first) on DATABASE_URL.
+
+Usage: python -m benchmarks.bench_bulk_booking [--items 1000]
+"""
+import argparse
+import asyncio
+import time as timer
+from datetime import date, time, timedelta
+
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.models.box import Box
+from app.models.reservation import Reservation, ReservationBulkCreate, ReservationCreate
+from app.models.rollup import ReservationRollup
+from app.models.schedule import Schedule
+from app.models.slot_claim import SlotClaim
+from app.models.user import User
+from app.services.bulk_reservation_service import BulkReservationService
+from app.services.reservation_service import ReservationService
+
+DOCTORS = 10
+
+
+async def seed():
+    admin = await User(
+        email="bench-admin@redsalud.cl", username="bench_admin", full_name="Bench Admin",
+        hashed_password="-", role="admin"
+    ).insert()
+    patient = await User(
+        email="bench-patient@redsalud.cl", username="bench_patient", full_name="Bench Patient",
+        hashed_password="-", role="patient"
+    ).insert()
+    doctors, boxes = [], []
+    for i in range(DOCTORS):
+        doctors.append(await User(
+            email=f"bench-doctor{i}@redsalud.cl", username=f"bench_doctor{i}", full_name=f"Bench Doctor {i}",
+            hashed_password="-", role="doctor"
+        ).insert())
+        boxes.append(await Box(name=f"Bench Box {i}", location="Planta 1", capacity=1, floor=1, status="available").insert())
+    return admin, patient, doctors, boxes
+
+
+def series(n: int, first_day: date, patient, doctors, boxes):
+    """n appointments: per doctor/box, every 30 minutes from 08:00, one week apart"""
+    items = []
+    for i in range(n):
+        doctor = i % DOCTORS
+        slot, week = divmod(i // DOCTORS, 52)
+        items.append(ReservationCreate(
+            patient_id=str(patient.id),
+            doctor_id=str(doctors[doctor].id),
+            box_id=str(boxes[doctor].id),
+            date=first_day + timedelta(weeks=week),
+            start_time=time(8 + slot // 2, 30 * (slot % 2)),
+            duration_minutes=30,
+            appointment_type="consultation"
+        ))
+    return items
+
+
+async def run(args):
+    client = AsyncIOMotorClient(args.database_url)
+    await client.drop_database(args.database)
+    await init_beanie(
+        database=client[args.database],
+        document_models=[User, Box, Reservation, Schedule, SlotClaim, ReservationRollup]
+    )
+    admin, patient, doctors, boxes = await seed()
+    monday = date.today() + timedelta(days=7 - date.today().weekday())
+
+    items = series(args.items, monday, patient, doctors, boxes)
+    started = timer.perf_counter()
+    for item in items:
+        await ReservationService.create_reservation(item, admin)
+    print(f"one by one         {args.items:6d} items {timer.perf_counter() - started:8.2f} s")
+
+    for offset, mode in ((1, "best_effort"), (2, "all_or_nothing")):
+        items = series(args.items, monday + timedelta(days=offset), patient, doctors, boxes)
+        started = timer.perf_counter()
+        result = await BulkReservationService.create_reservations(
+            ReservationBulkCreate(items=items, mode=mode, check_schedule=False), admin
+        )
+        elapsed = timer.perf_counter() - started
+        print(f"bulk {mode:14s} {result.created:6d} items {elapsed:8.2f} s")
+
+    await client.drop_database(args.database)
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=settings.BULK_RESERVATION_MAX_ITEMS)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--database", default="redsalud_bench_bulk")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
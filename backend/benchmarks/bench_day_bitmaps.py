@@ -0,0 +1,182 @@
+"""
+Benchmark: free-slot search over box-day and doctor-day bitmaps.
+
+Builds a 90-day horizon of reservations (busiest in the first weeks, so a
+search has to look ahead), then finds the first free slots for a doctor
+across a few boxes two ways:
+
+- bitmaps: BoxMatcher.find_free_slots over DayCalendars;
+- overlap checks: every candidate start tested against the box's and the
+  doctor's reservations of that day, as find_overlap does per booking.
+
+Both must return the same slots. Also times rebuilding the bitmaps from
+the reservations and a single overlap test.
+
+Usage: python -m benchmarks.bench_day_bitmaps [--days 90] [--boxes 40] [--doctors 30] [--queries 200]
+"""
+import argparse
+import random
+import time as timer
+from collections import defaultdict
+from datetime import date, time, timedelta
+
+from bson import ObjectId
+
+from app.models.schedule import DayOfWeek, Schedule, ScheduleType, TimeSlot
+from app.services.availability_index import AvailabilityIndex
+from app.services.box_matcher import BoxMatcher, BoxProfile
+from app.services.day_bitmaps import CELL, DayCalendar, time_mask
+from app.services.slot_grid import to_time
+
+START = date(2024, 6, 3)  # A Monday
+WORKDAYS = [DayOfWeek.MONDAY, DayOfWeek.TUESDAY, DayOfWeek.WEDNESDAY, DayOfWeek.THURSDAY, DayOfWeek.FRIDAY]
+OPEN_FROM, OPEN_TO = 7 * 60, 20 * 60
+
+
+def make_horizon(n_days: int, n_boxes: int, n_doctors: int, seed: int = 3):
+    rng = random.Random(seed)
+    profiles = {}
+    for i in range(n_boxes):
+        profile = BoxProfile.from_document({
+            "_id": ObjectId(), "name": f"Box {i:03d}", "location": "Central", "floor": i % 3,
+            "capacity": 2, "equipment": [], "is_active": True, "status": "available",
+            "available_from": "07:00", "available_to": "20:00",
+            "available_days": ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday"]
+        })
+        profiles[profile.box_id] = profile
+
+    index = AvailabilityIndex()
+    doctors = [f"doctor-{i}" for i in range(n_doctors)]
+    for doctor_id in doctors:
+        for weekday in WORKDAYS:
+            index.upsert(Schedule.model_construct(
+                id=ObjectId(), doctor_id=doctor_id, doctor_name="Doctor",
+                schedule_type=ScheduleType.REGULAR, day_of_week=weekday, specific_date=None,
+                effective_from=START, effective_to=None, is_available=True,
+                lunch_break_start=time(13), lunch_break_end=time(14),
+                time_slots=[TimeSlot(start_time=time(8), end_time=time(13)), TimeSlot(start_time=time(14), end_time=time(18))]
+            ))
+
+    # (box_id | doctor_id, date) -> [(start, end)], like rows of the compound indexes
+    booked = defaultdict(list)
+    reservations = []
+    box_ids = list(profiles)
+    for offset in range(n_days):
+        day = START + timedelta(days=offset)
+        if day.weekday() >= 5:
+            continue
+        fill = max(0.1, 0.95 - 0.8 * offset / n_days)
+        for doctor_id in doctors:
+            minute = 8 * 60
+            while minute + 30 <= 18 * 60:
+                if minute >= 13 * 60 or minute + 30 <= 13 * 60:
+                    if rng.random() < fill:
+                        box_id = rng.choice(box_ids)
+                        start, end = to_time(minute), to_time(minute + 30)
+                        if not any(s < end and start < e for s, e in booked[(box_id, day)]):
+                            booked[(box_id, day)].append((start, end))
+                            booked[(doctor_id, day)].append((start, end))
+                            reservations.append((str(ObjectId()), box_id, doctor_id, day, start, end))
+                minute += 30
+    return profiles, index, doctors, booked, reservations
+
+
+def build_calendars(reservations, dates):
+    calendars = {day: DayCalendar() for day in dates}
+    for reservation_id, box_id, doctor_id, day, start, end in reservations:
+        calendars[day].add(reservation_id, box_id, doctor_id, time_mask(start, end))
+    return calendars
+
+
+def overlap_search(profiles, index, booked, dates, doctor_id, box_ids, duration, step, limit):
+    """First free slots by testing every candidate start against reservations"""
+    slots = []
+    for day in dates:
+        for minute in range(0, 24 * 60 - duration + 1, step):
+            start = to_time(minute)
+            end = to_time(minute + duration) if minute + duration < 24 * 60 else time.max
+            if not index.covers(doctor_id, day, start, end):
+                continue
+            if any(s < end and start < e for s, e in booked[(doctor_id, day)]):
+                continue
+            for box_id in box_ids:
+                profile = profiles[box_id]
+                if not profile.open_masks[day.weekday()] or minute < OPEN_FROM or minute + duration > OPEN_TO:
+                    continue
+                if any(s < end and start < e for s, e in booked[(box_id, day)]):
+                    continue
+                slots.append((day, start, box_id))
+                if len(slots) >= limit:
+                    return slots
+    return slots
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--boxes", type=int, default=40)
+    parser.add_argument("--doctors", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    profiles, index, doctors, booked, reservations = make_horizon(args.days, args.boxes, args.doctors)
+    dates = [START + timedelta(days=offset) for offset in range(args.days)]
+
+    started = timer.perf_counter()
+    calendars = build_calendars(reservations, dates)
+    rebuild = timer.perf_counter() - started
+
+    matcher = BoxMatcher(max_days=args.days, ttl=3600)
+    matcher.boxes = profiles
+    rng = random.Random(4)
+    queries = [
+        (rng.choice(doctors), rng.sample(list(profiles), 3), rng.choice([30, 45, 60]))
+        for _ in range(args.queries)
+    ]
+
+    for doctor_id, box_ids, duration in queries[:50]:
+        found = matcher.find_free_slots(
+            calendars, dates, index, duration, box_ids, doctor_id, step_minutes=15, limit=args.limit
+        )
+        expected = overlap_search(profiles, index, booked, dates, doctor_id, box_ids, duration, 15, args.limit)
+        assert [(slot.date, slot.start_time, slot.box_id) for slot in found] == expected, \
+            "bitmap search diverges from the overlap checks"
+
+    started = timer.perf_counter()
+    for doctor_id, box_ids, duration in queries:
+        matcher.find_free_slots(calendars, dates, index, duration, box_ids, doctor_id, step_minutes=15, limit=args.limit)
+    bitmap = (timer.perf_counter() - started) / len(queries)
+
+    started = timer.perf_counter()
+    for doctor_id, box_ids, duration in queries:
+        overlap_search(profiles, index, booked, dates, doctor_id, box_ids, duration, 15, args.limit)
+    naive = (timer.perf_counter() - started) / len(queries)
+
+    # Single overlap test: one box-day, one appointment
+    day = dates[0]
+    box_id = max(profiles, key=lambda b: len(booked[(b, day)]))
+    ranges = booked[(box_id, day)]
+    start, end = time(11, 10), time(11, 40)
+    mask = time_mask(start, end)
+    occupied = calendars[day].boxes.get(box_id)
+    rounds = 200000
+    started = timer.perf_counter()
+    for _ in range(rounds):
+        any(s < end and start < e for s, e in ranges)
+    range_test = (timer.perf_counter() - started) / rounds
+    started = timer.perf_counter()
+    for _ in range(rounds):
+        occupied & mask
+    bitmap_test = (timer.perf_counter() - started) / rounds
+
+    print(f"horizon: {args.days} days  boxes: {len(profiles)}  doctors: {len(doctors)}  reservations: {len(reservations)}")
+    print(f"bitmap rebuild from reservations: {rebuild * 1000:.1f} ms ({CELL}-minute cells)")
+    print(f"first {args.limit} free slots, bitmaps: {bitmap * 1e6:.0f} us/query")
+    print(f"first {args.limit} free slots, overlap checks: {naive * 1e6:.0f} us/query (x{naive / bitmap:.0f})")
+    print(f"one overlap test ({len(ranges)} reservations in the box-day): "
+          f"ranges {range_test * 1e9:.0f} ns, bitmap {bitmap_test * 1e9:.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
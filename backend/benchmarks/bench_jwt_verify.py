@@ -0,0 +1,54 @@
+"""
+Benchmark: per-request JWT verification cost.
+
+Compares a full jose.jwt.decode on every call (the old verify_token) with
+the cached verify_token, for a pool of tokens presented repeatedly.
+
+Usage: python -m benchmarks.bench_jwt_verify [--tokens 1000] [--requests 100000]
+"""
+import argparse
+import random
+import time as timer
+
+from jose import jwt
+
+from app.core.config import settings
+from app.core.security import create_access_token, token_cache, verify_token
+
+
+def legacy_verify(token: str) -> str:
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    return payload.get("sub")
+
+
+def timed(fn, tokens):
+    started = timer.perf_counter()
+    for token in tokens:
+        fn(token)
+    return timer.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=100000)
+    args = parser.parse_args()
+
+    pool = [create_access_token(f"user-{i}") for i in range(args.tokens)]
+    rng = random.Random(3)
+    stream = [rng.choice(pool) for _ in range(args.requests)]
+    assert all(verify_token(t) == legacy_verify(t) for t in pool)
+
+    token_cache.clear()
+    legacy_s = timed(legacy_verify, stream)
+    cached_s = timed(verify_token, stream)
+
+    per_legacy = legacy_s / args.requests * 1e6
+    per_cached = cached_s / args.requests * 1e6
+    print(f"tokens: {args.tokens}  requests: {args.requests}  cache: {token_cache.stats()}")
+    print(f"jose.jwt.decode : {per_legacy:7.2f} us/request")
+    print(f"verify_token    : {per_cached:7.2f} us/request  ({per_legacy / per_cached:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
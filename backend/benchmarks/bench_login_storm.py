@@ -0,0 +1,84 @@
+"""
+Benchmark: latency of unrelated endpoints during a login storm.
+
+Runs an in-process ASGI app with a cheap /ping endpoint and a login-like
+endpoint that verifies a bcrypt hash either inline (the old behaviour) or
+through the pooled PasswordHasher, then reports /ping p50/p99 while the
+storm is running.
+
+Usage: python -m benchmarks.bench_login_storm [--logins 32] [--pings 100]
+"""
+import argparse
+import asyncio
+import statistics
+import time as timer
+
+import httpx
+from fastapi import FastAPI
+
+from app.core.security import get_password_hash, password_hasher, verify_password
+
+PASSWORD = "Secreto123!"
+HASHED = get_password_hash(PASSWORD)
+
+app = FastAPI()
+
+
+@app.get("/ping")
+async def ping():
+    return {"ok": True}
+
+
+@app.post("/login/inline")
+async def login_inline():
+    return {"ok": verify_password(PASSWORD, HASHED)}
+
+
+@app.post("/login/pooled")
+async def login_pooled():
+    return {"ok": await password_hasher.verify(PASSWORD, HASHED)}
+
+
+async def storm(client: httpx.AsyncClient, mode: str, logins: int, pings: int, interval: float):
+    async def ping_loop():
+        # Open loop: latency counts from when the ping was due, so time
+        # spent waiting for a blocked event loop is included
+        latencies = []
+        base = timer.perf_counter()
+        for i in range(pings):
+            due = base + i * interval
+            await asyncio.sleep(max(0.0, due - timer.perf_counter()))
+            await client.get("/ping")
+            latencies.append(timer.perf_counter() - due)
+        return latencies
+
+    started = timer.perf_counter()
+    ping_task = asyncio.create_task(ping_loop())
+    await asyncio.gather(*(client.post(f"/login/{mode}") for _ in range(logins)))
+    logins_done = timer.perf_counter() - started
+    latencies = sorted(await ping_task)
+
+    p50 = statistics.median(latencies)
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    print(f"{mode:7s} logins: {logins} in {logins_done * 1000:7.0f} ms   "
+          f"/ping p50: {p50 * 1000:7.2f} ms  p99: {p99 * 1000:7.2f} ms  max: {latencies[-1] * 1000:7.2f} ms")
+
+
+async def run(args):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for mode in ("inline", "pooled"):
+            await storm(client, mode, args.logins, args.pings, args.interval)
+    password_hasher.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--pings", type=int, default=100)
+    parser.add_argument("--interval", type=float, default=0.02)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
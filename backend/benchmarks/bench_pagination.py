@@ -0,0 +1,120 @@
+"""
+Benchmark: keyset (cursor) pagination vs skip/limit paging.
+
+Seeds a scratch database with N reservations (reused when already present)
+and times fetching page 1, 10, 100, 1,000 and 10,000 of the date-ordered
+listing both ways. The cursor for page k is built from the last row of
+page k-1, exactly what a client walking the pages would hold.
+
+Usage: python -m benchmarks.bench_pagination [--reservations 1000000] [--page-size 20]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time as timer
+from datetime import date, datetime, timedelta
+
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+
+from app.core.config import settings
+from app.core.pagination import encode_cursor, paginate
+from app.models.reservation import Reservation
+
+PAGES = [1, 10, 100, 1000, 10000]
+
+
+async def seed(n: int, batch_size: int = 10000):
+    collection = Reservation.get_motor_collection()
+    if await collection.estimated_document_count() == n:
+        return
+
+    await collection.delete_many({})
+    rng = random.Random(7)
+    start = date.today() - timedelta(days=365)
+    for offset in range(0, n, batch_size):
+        documents = []
+        for _ in range(min(batch_size, n - offset)):
+            day = start + timedelta(days=rng.randrange(366))
+            hour = rng.randrange(8, 18)
+            documents.append({
+                "patient_id": f"patient-{rng.randrange(50000)}",
+                "doctor_id": f"doctor-{rng.randrange(300)}",
+                "box_id": f"box-{rng.randrange(40)}",
+                "date": day.isoformat(),
+                "start_time": f"{hour:02d}:00:00",
+                "end_time": f"{hour:02d}:30:00",
+                "duration_minutes": 30,
+                "status": "confirmed",
+                "appointment_type": "consultation",
+                "created_by": "bench",
+                "patient_name": "Bench Patient",
+                "doctor_name": "Bench Doctor",
+                "box_name": "Bench Box",
+                "box_location": "Planta 1",
+                "created_at": datetime.utcnow()
+            })
+        await collection.insert_many(documents, ordered=False)
+
+
+async def skip_page(page: int, page_size: int):
+    return await Reservation.find({}).sort([("date", ASCENDING), ("_id", ASCENDING)]) \
+        .skip((page - 1) * page_size).limit(page_size).to_list()
+
+
+async def cursor_for(page: int, page_size: int):
+    """Cursor a client would hold after reading page - 1"""
+    if page == 1:
+        return None
+    row = await Reservation.get_motor_collection().find({}, {"date": 1}) \
+        .sort([("date", ASCENDING), ("_id", ASCENDING)]) \
+        .skip((page - 1) * page_size - 1).limit(1).to_list(1)
+    return encode_cursor("date", ASCENDING, row[0]["date"], row[0]["_id"])
+
+
+async def median_ms(coro_factory, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = timer.perf_counter()
+        await coro_factory()
+        samples.append((timer.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def run(args):
+    client = AsyncIOMotorClient(args.database_url)
+    await init_beanie(database=client[args.database], document_models=[Reservation])
+
+    started = timer.perf_counter()
+    await seed(args.reservations)
+    print(f"dataset ready: {args.reservations} reservations ({timer.perf_counter() - started:.1f} s)")
+    print(f"{'page':>8s} {'skip/limit':>12s} {'keyset':>10s}")
+
+    for page in PAGES:
+        if (page - 1) * args.page_size >= args.reservations:
+            break
+        cursor = await cursor_for(page, args.page_size)
+        skip_ms = await median_ms(lambda: skip_page(page, args.page_size), args.repeat)
+        keyset_ms = await median_ms(
+            lambda: paginate(Reservation, {}, sort_field="date", cursor=cursor, limit=args.page_size),
+            args.repeat
+        )
+        print(f"{page:8d} {skip_ms:10.2f}ms {keyset_ms:8.2f}ms")
+
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reservations", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=settings.DEFAULT_PAGE_SIZE)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--database", default="redsalud_bench_pagination")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Benchmark: projection models vs full documents on hot read paths.
+
+For calendar slots, reservation list rows and public user profiles,
+reports the BSON bytes per row MongoDB has to send and the pydantic
+validation cost per row, full document vs projection, then times a
+1,000-row query both ways against a scratch database (dropped afterwards).
+
+Usage: python -m benchmarks.bench_projections [--rows 20000]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time as timer
+from datetime import date, datetime, timedelta
+
+import bson
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.models.reservation import Reservation, ReservationCalendarSlot, ReservationListItem
+from app.models.user import User, UserPublicProfile
+
+QUERY_ROWS = 1000
+
+
+def reservation_document(rng: random.Random) -> dict:
+    day = date.today() + timedelta(days=rng.randrange(60))
+    hour = rng.randrange(8, 18)
+    return {
+        "_id": bson.ObjectId(),
+        "patient_id": str(bson.ObjectId()),
+        "doctor_id": str(bson.ObjectId()),
+        "box_id": str(bson.ObjectId()),
+        "date": day.isoformat(),
+        "start_time": f"{hour:02d}:00:00",
+        "end_time": f"{hour:02d}:45:00",
+        "duration_minutes": 45,
+        "status": "confirmed",
+        "appointment_type": "consultation",
+        "reason": "Control de presión arterial y revisión de exámenes de laboratorio",
+        "notes": "Paciente solicita horario de mañana. Traer exámenes previos.",
+        "created_by": str(bson.ObjectId()),
+        "priority": "normal",
+        "patient_name": "María José González Pérez",
+        "patient_phone": "+56 9 8765 4321",
+        "patient_email": "maria.gonzalez@example.cl",
+        "doctor_name": "Dr. Juan Carlos Rodríguez",
+        "doctor_specialization": "Cardiología",
+        "box_name": f"Box {rng.randrange(40)}",
+        "box_location": "Edificio A, Planta 2, Ala Norte",
+        "confirmation_code": f"RS-{rng.randrange(10 ** 8):08d}",
+        "confirmed_at": datetime.utcnow(),
+        "confirmed_by": str(bson.ObjectId()),
+        "checked_in_at": None,
+        "checked_out_at": None,
+        "actual_duration": None,
+        "cancelled_at": None,
+        "cancelled_by": None,
+        "cancellation_reason": None,
+        "follow_up_required": True,
+        "follow_up_date": (day + timedelta(days=30)).isoformat(),
+        "follow_up_notes": "Repetir electrocardiograma",
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+        "reminder_sent": True,
+        "reminder_sent_at": datetime.utcnow()
+    }
+
+
+def user_document(rng: random.Random) -> dict:
+    return {
+        "_id": bson.ObjectId(),
+        "email": f"doctor{rng.randrange(10 ** 6)}@redsalud.cl",
+        "username": f"doctor{rng.randrange(10 ** 6)}",
+        "full_name": "Dra. Ana María Fuentes Soto",
+        "hashed_password": "$2b$12$" + "x" * 53,
+        "role": "doctor",
+        "is_active": True,
+        "is_verified": True,
+        "rut": "12.345.678-9",
+        "phone": "+56 2 2345 6789",
+        "address": "Av. Providencia 1234, Depto 56, Providencia, Santiago",
+        "date_of_birth": "1980-05-17",
+        "specialization": "Pediatría",
+        "license_number": "MED-123456",
+        "department": "Pediatría",
+        "emergency_contact": "Pedro Fuentes",
+        "emergency_phone": "+56 9 1234 5678",
+        "medical_conditions": ["Hipertensión", "Asma leve"],
+        "allergies": ["Penicilina", "Maní"],
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+        "last_login": datetime.utcnow(),
+        "preferences": {"language": "es", "notifications": {"email": True, "sms": False}}
+    }
+
+
+def projected(document: dict, model) -> dict:
+    return {key: value for key, value in document.items() if key in model.Settings.projection}
+
+
+def per_row_us(func, rows) -> float:
+    started = timer.perf_counter()
+    for row in rows:
+        func(row)
+    return (timer.perf_counter() - started) / len(rows) * 1e6
+
+
+def in_process(rows: int):
+    rng = random.Random(3)
+    reservations = [reservation_document(rng) for _ in range(rows)]
+    users = [user_document(rng) for _ in range(rows)]
+    cases = [
+        ("calendar slot", Reservation, ReservationCalendarSlot, reservations),
+        ("reservation list row", Reservation, ReservationListItem, reservations),
+        ("public user profile", User, UserPublicProfile, users)
+    ]
+
+    print(f"{'view':22s} {'bytes full':>11s} {'projected':>10s} {'validate full':>14s} {'projected':>10s}")
+    for label, document_model, projection_model, documents in cases:
+        small = [projected(document, projection_model) for document in documents]
+        full_bytes = statistics.mean(len(bson.encode(document)) for document in documents)
+        small_bytes = statistics.mean(len(bson.encode(document)) for document in small)
+        full_us = per_row_us(document_model.model_validate, documents)
+        small_us = per_row_us(projection_model.model_validate, small)
+        print(f"{label:22s} {full_bytes:9.0f} B {small_bytes:8.0f} B {full_us:11.1f} µs {small_us:7.1f} µs")
+
+
+async def timed_ms(coro_factory, repeat: int = 5) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = timer.perf_counter()
+        await coro_factory()
+        samples.append((timer.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def run(args):
+    client = AsyncIOMotorClient(args.database_url)
+    await init_beanie(database=client[args.database], document_models=[User, Reservation])
+    in_process(args.rows)
+
+    rng = random.Random(5)
+    for model, factory in ((Reservation, reservation_document), (User, user_document)):
+        collection = model.get_motor_collection()
+        await collection.delete_many({})
+        await collection.insert_many([factory(rng) for _ in range(QUERY_ROWS)])
+
+    cases = [
+        ("calendar slot", Reservation, ReservationCalendarSlot),
+        ("reservation list row", Reservation, ReservationListItem),
+        ("public user profile", User, UserPublicProfile)
+    ]
+    print(f"\n{QUERY_ROWS} rows per query")
+    for label, document_model, projection_model in cases:
+        full_ms = await timed_ms(lambda: document_model.find({}).to_list())
+        small_ms = await timed_ms(lambda: document_model.find({}).project(projection_model).to_list())
+        print(f"{label:22s} full {full_ms:8.1f} ms   projected {small_ms:8.1f} ms")
+
+    await client.drop_database(args.database)
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--database", default="redsalud_bench_projections")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: sweep-line schedule conflict detection.
+
+Validates the sweep against a brute-force pairwise check on small sets,
+then times a bulk validation of tens of thousands of schedules, and of one
+doctor's long history of successive Monday 09:00-17:00 schedules with
+disjoint date ranges.
+
+Usage: python -m benchmarks.bench_schedule_conflicts [--schedules 20000] [--history 10000]
+"""
+import argparse
+import random
+import time as timer
+from datetime import date, time, timedelta
+
+from bson import ObjectId
+
+from app.models.schedule import DayOfWeek, Schedule, ScheduleType, TimeSlot
+from app.services.schedule_conflicts import find_conflicts
+
+
+def make_schedules(n: int, seed: int = 11):
+    rng = random.Random(seed)
+    days = list(DayOfWeek)
+    n_doctors = max(1, n // 12)
+    schedules = []
+    for _ in range(n):
+        start = date(2023, 1, 1) + timedelta(days=rng.randrange(700))
+        exception = rng.random() < 0.2
+        hour = rng.randrange(7, 18)
+        schedules.append(Schedule.model_construct(
+            id=ObjectId(),
+            doctor_id=f"doctor-{rng.randrange(n_doctors)}",
+            doctor_name="Doctor",
+            schedule_type=ScheduleType.EXCEPTION if exception else ScheduleType.REGULAR,
+            effective_from=start,
+            effective_to=None if rng.random() < 0.3 else start + timedelta(days=rng.randrange(30, 200)),
+            day_of_week=None if exception else rng.choice(days[:6]),
+            specific_date=start if exception else None,
+            is_available=True,
+            time_slots=[TimeSlot(start_time=time(hour), end_time=time(hour + rng.randrange(1, 5), 30))],
+        ))
+    return schedules
+
+
+def make_history(n: int, overlapping: int = 0, seed: int = 13):
+    """One doctor's weekly Monday schedules, one per week, plus a few that overlap them"""
+    rng = random.Random(seed)
+    first = date(2000, 1, 3)
+    schedules = []
+    for week in range(n):
+        start = first + timedelta(weeks=week)
+        schedules.append(Schedule.model_construct(
+            id=ObjectId(),
+            doctor_id="doctor-history",
+            doctor_name="Doctor",
+            schedule_type=ScheduleType.REGULAR,
+            effective_from=start,
+            effective_to=start + timedelta(days=6),
+            day_of_week=DayOfWeek.MONDAY,
+            specific_date=None,
+            is_available=True,
+            time_slots=[TimeSlot(start_time=time(9), end_time=time(17))],
+        ))
+    for _ in range(overlapping):
+        start = first + timedelta(weeks=rng.randrange(n))
+        schedules.append(Schedule.model_construct(
+            id=ObjectId(),
+            doctor_id="doctor-history",
+            doctor_name="Doctor",
+            schedule_type=ScheduleType.REGULAR,
+            effective_from=start,
+            effective_to=start + timedelta(weeks=rng.randrange(1, 5)),
+            day_of_week=DayOfWeek.MONDAY,
+            specific_date=None,
+            is_available=True,
+            time_slots=[TimeSlot(start_time=time(rng.randrange(7, 18)), end_time=time(18, 30))],
+        ))
+    return schedules
+
+
+def brute_force(schedules):
+    pairs = set()
+    for i, a in enumerate(schedules):
+        for j in range(i + 1, len(schedules)):
+            b = schedules[j]
+            if a.doctor_id != b.doctor_id or a.schedule_type != b.schedule_type:
+                continue
+            if a.schedule_type == ScheduleType.REGULAR and a.day_of_week != b.day_of_week:
+                continue
+            if a.schedule_type == ScheduleType.EXCEPTION and a.specific_date != b.specific_date:
+                continue
+            if max(a.effective_from, b.effective_from) > min(a.effective_to or date.max, b.effective_to or date.max):
+                continue
+            for x in a.time_slots:
+                for y in b.time_slots:
+                    if x.start_time < y.end_time and y.start_time < x.end_time:
+                        pairs.add(frozenset((str(a.id), str(b.id))))
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--schedules", type=int, default=20000)
+    parser.add_argument("--history", type=int, default=10000)
+    args = parser.parse_args()
+
+    for sample in (make_schedules(600), make_history(400, overlapping=30)):
+        found = {frozenset((c.schedule_id, c.conflicting_schedule_id)) for c in find_conflicts(sample)}
+        assert found == brute_force(sample), "sweep diverges from pairwise check"
+
+    schedules = make_schedules(args.schedules)
+    started = timer.perf_counter()
+    conflicts = find_conflicts(schedules)
+    elapsed = timer.perf_counter() - started
+
+    print(f"schedules: {len(schedules)}  conflicts: {len(conflicts)}")
+    print(f"sweep: {elapsed * 1000:.1f} ms")
+
+    history = make_history(args.history)
+    started = timer.perf_counter()
+    conflicts = find_conflicts(history)
+    elapsed = timer.perf_counter() - started
+    print(f"one doctor's history: {len(history)} weekly schedules  conflicts: {len(conflicts)}")
+    print(f"sweep: {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
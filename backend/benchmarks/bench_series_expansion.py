@@ -0,0 +1,107 @@
+"""
+Benchmark: lazy expansion of recurring reservation series.
+
+Builds N series (weekly/daily treatment rules plus some monthly ones that
+take the dateutil fallback), with start dates up to two years back, and
+expands all of them over a one-month window, cold (rules compiled on the
+way), warm with compiled rules only, and warm with the expanded windows
+cached as well. The result is checked against
+plain ``rrulestr(...).between`` per series.
+
+Usage: python -m benchmarks.bench_series_expansion [--series 10000] [--days 31]
+"""
+import argparse
+import random
+import statistics
+import time as timer
+from datetime import date, datetime, time, timedelta
+
+from beanie import PydanticObjectId
+from dateutil.rrule import rrulestr
+
+from app.models.series import ReservationSeries
+from app.services.recurrence import clear_window_cache, compile_rule, expand_many, parse_rule
+
+RULES = [
+    "FREQ=WEEKLY;BYDAY=MO,TH",
+    "FREQ=WEEKLY;COUNT=12",
+    "FREQ=WEEKLY;INTERVAL=2;BYDAY=TU",
+    "FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=36",
+    "FREQ=DAILY;INTERVAL=3",
+    "FREQ=DAILY;BYDAY=MO,TU,WE,TH,FR;COUNT=20",
+    "FREQ=WEEKLY;UNTIL=20271231",
+    "FREQ=MONTHLY;BYMONTHDAY=15",
+]
+
+
+def make_series(n: int, today: date):
+    rng = random.Random(11)
+    series = []
+    for _ in range(n):
+        series.append(ReservationSeries.model_construct(
+            id=PydanticObjectId(),
+            patient_id="patient", doctor_id=f"doctor-{rng.randrange(300)}", box_id=f"box-{rng.randrange(40)}",
+            rrule=rng.choice(RULES),
+            dtstart=today - timedelta(days=rng.randrange(730)),
+            start_time=time(rng.randrange(8, 18), 0),
+            duration_minutes=30,
+            exceptions=[]
+        ))
+    return series
+
+
+def reference(series_list, start: date, end: date):
+    result = []
+    for series in series_list:
+        rule = rrulestr(series.rrule, dtstart=datetime.combine(series.dtstart, time.min))
+        for value in rule.between(datetime.combine(start, time.min), datetime.combine(end, time.min), inc=True):
+            result.append((str(series.id), value.date()))
+    return sorted(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--series", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    today = date.today()
+    window_end = today + timedelta(days=args.days - 1)
+    series_list = make_series(args.series, today)
+
+    parse_rule.cache_clear()
+    compile_rule.cache_clear()
+    clear_window_cache()
+    started = timer.perf_counter()
+    occurrences = expand_many(series_list, today, window_end)
+    cold_ms = (timer.perf_counter() - started) * 1000
+
+    compiled = []
+    for _ in range(args.repeat):
+        clear_window_cache()
+        started = timer.perf_counter()
+        expand_many(series_list, today, window_end)
+        compiled.append((timer.perf_counter() - started) * 1000)
+
+    samples = []
+    for _ in range(args.repeat):
+        started = timer.perf_counter()
+        expand_many(series_list, today, window_end)
+        samples.append((timer.perf_counter() - started) * 1000)
+
+    started = timer.perf_counter()
+    expected = reference(series_list, today, window_end)
+    reference_ms = (timer.perf_counter() - started) * 1000
+
+    got = sorted((occurrence.series_id, occurrence.date) for occurrence in occurrences)
+    print(f"{args.series} series, {args.days}-day window: {len(occurrences)} occurrences")
+    print(f"rrulestr + between per series   {reference_ms:9.1f} ms")
+    print(f"expand_many (cold, compiling)   {cold_ms:9.1f} ms")
+    print(f"expand_many (rules, median)     {statistics.median(compiled):9.1f} ms")
+    print(f"expand_many (windows, median)   {statistics.median(samples):9.1f} ms")
+    print(f"matches dateutil: {got == expected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Micro-benchmark: legacy per-slot loop vs batched slot grid.
+
+Builds a full-week availability view for N doctors and checks that both
+paths produce identical slots.
+
+Usage: python -m benchmarks.bench_slot_grid [--doctors 300] [--repeat 5]
+"""
+import argparse
+import random
+import time as timer
+from datetime import date, time, timedelta
+
+from app.models.schedule import DayOfWeek, Schedule, ScheduleType, TimeSlot
+from app.services.slot_grid import build_slot_grid
+
+
+def legacy_time_slot_starts(time_slot):
+    """Original TimeSlot.get_available_slots loop"""
+    slots = []
+    current_time = time_slot.start_time
+    while current_time < time_slot.end_time:
+        slots.append(current_time)
+        total_minutes = time_slot.appointment_duration + time_slot.break_between
+        hours = total_minutes // 60
+        minutes = total_minutes % 60
+        next_hour = current_time.hour + hours + (current_time.minute + minutes) // 60
+        next_minute = (current_time.minute + minutes) % 60
+        if next_hour >= 24:
+            break
+        current_time = time(next_hour, next_minute)
+    return slots
+
+
+def legacy_week_view(schedules, dates):
+    view = {}
+    for schedule in schedules:
+        for day in dates:
+            if not schedule.applies_on(day):
+                continue
+            slots = []
+            for time_slot in schedule.time_slots:
+                if time_slot.is_available:
+                    slots.extend(legacy_time_slot_starts(time_slot))
+            view.setdefault((schedule.doctor_id, day), []).extend(sorted(slots))
+    return view
+
+
+def make_schedules(n_doctors: int, seed: int = 7):
+    rng = random.Random(seed)
+    days = list(DayOfWeek)
+    schedules = []
+    for d in range(n_doctors):
+        for day in rng.sample(days[:6], 4):
+            duration = rng.choice([15, 20, 30, 45])
+            schedules.append(Schedule.model_construct(
+                doctor_id=f"doctor-{d}",
+                doctor_name=f"Doctor {d}",
+                schedule_type=ScheduleType.REGULAR,
+                effective_from=date(2024, 1, 1),
+                effective_to=None,
+                day_of_week=day,
+                specific_date=None,
+                is_available=True,
+                lunch_break_start=None,
+                lunch_break_end=None,
+                time_slots=[
+                    TimeSlot(start_time=time(8, rng.choice([0, 15, 30])), end_time=time(13),
+                             appointment_duration=duration, break_between=rng.choice([0, 5, 10])),
+                    TimeSlot(start_time=time(14), end_time=time(19, 30),
+                             appointment_duration=duration, break_between=5),
+                ],
+            ))
+    return schedules
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = timer.perf_counter()
+        fn()
+        best = min(best, timer.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--doctors", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    schedules = make_schedules(args.doctors)
+    week = [date(2024, 3, 4) + timedelta(days=i) for i in range(7)]
+
+    legacy = legacy_week_view(schedules, week)
+    grid = build_slot_grid(schedules, week).as_dict()
+    assert legacy == grid, "slot grid diverges from legacy loop"
+
+    legacy_s = best_of(lambda: legacy_week_view(schedules, week), args.repeat)
+    grid_s = best_of(lambda: build_slot_grid(schedules, week), args.repeat)
+
+    print(f"schedules: {len(schedules)}  doctor-days: {len(grid)}  "
+          f"slots: {sum(len(v) for v in grid.values())}")
+    print(f"legacy loop : {legacy_s * 1000:8.2f} ms")
+    print(f"slot grid   : {grid_s * 1000:8.2f} ms  ({legacy_s / grid_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: cold start to ready.
+
+Starts a fresh uvicorn process N times and measures the time from spawn
+until GET /health answers, plus the per-step breakdown the worker reports
+there. Run it once as is and once with --create-indexes to compare the
+default startup with creating indexes in every worker. Needs MongoDB on
+DATABASE_URL.
+
+Usage: python -m benchmarks.bench_startup [--runs 5] [--create-indexes] [--seed]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time as timer
+import urllib.request
+from collections import defaultdict
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(port: int, process: subprocess.Popen, timeout: float) -> dict:
+    deadline = timer.perf_counter() + timeout
+    while timer.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                return json.loads(response.read())
+        except OSError:
+            timer.sleep(0.005)
+    raise TimeoutError("Server not ready in time")
+
+
+def cold_start(env: dict, timeout: float):
+    port = free_port()
+    started = timer.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=env
+    )
+    try:
+        health = wait_ready(port, process, timeout)
+        return (timer.perf_counter() - started) * 1000, health.get("startup") or {}
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--create-indexes", action="store_true", help="create indexes in the worker")
+    parser.add_argument("--seed", action="store_true", help="seed development data on startup")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["DB_CREATE_INDEXES_ON_STARTUP"] = "true" if args.create_indexes else "false"
+    env["SEED_INITIAL_DATA"] = "true" if args.seed else "false"
+
+    totals, lifespans = [], []
+    steps = defaultdict(list)
+    for _ in range(args.runs):
+        ready_ms, startup = cold_start(env, args.timeout)
+        totals.append(ready_ms)
+        lifespans.append(startup.get("total_ms") or 0)
+        for name, ms in (startup.get("steps") or {}).items():
+            steps[name].append(ms)
+
+    print(f"create indexes: {args.create_indexes}, seed: {args.seed}, runs: {args.runs}")
+    print(f"spawn -> ready (median)      {statistics.median(totals):9.1f} ms")
+    print(f"lifespan startup (median)    {statistics.median(lifespans):9.1f} ms")
+    for name, values in steps.items():
+        print(f"  {name:26s} {statistics.median(values):9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
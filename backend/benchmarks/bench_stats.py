@@ -0,0 +1,139 @@
+"""
+Benchmark: aggregation-pipeline statistics on a seeded dataset.
+
+Seeds a scratch database with N reservations (1M by default, reused when
+already present), then times each stats pipeline, the dashboard computed
+sequentially vs concurrently, and a client-side Python pass over a
+projected cursor for comparison. Rollups are rebuilt after seeding so the
+live pipelines can be compared with rollup-backed stats.
+
+Usage: python -m benchmarks.bench_stats [--reservations 1000000] [--skip-python]
+"""
+import argparse
+import asyncio
+import random
+import time as timer
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.models.box import Box
+from app.models.reservation import Reservation
+from app.models.rollup import ReservationRollup
+from app.models.schedule import Schedule
+from app.models.user import User
+from app.services.rollup_service import RollupService
+from app.services.stats_service import StatsService
+
+STATUSES = list(settings.RESERVATION_STATUS.values())
+STATUS_WEIGHTS = [10, 15, 2, 55, 12, 6]
+
+
+async def seed(n: int, batch_size: int = 10000):
+    collection = Reservation.get_motor_collection()
+    if await collection.estimated_document_count() == n:
+        return
+
+    await collection.delete_many({})
+    await Box.get_motor_collection().delete_many({})
+    rng = random.Random(42)
+    boxes = [
+        {"name": f"Box {i}", "location": f"Planta {i % 3 + 1}", "capacity": 2, "status": "available",
+         "is_active": True, "available_from": "08:00", "available_to": "18:00",
+         "available_days": ["monday", "tuesday", "wednesday", "thursday", "friday"], "floor": i % 3 + 1}
+        for i in range(40)
+    ]
+    box_ids = (await Box.get_motor_collection().insert_many(boxes)).inserted_ids
+    start = date.today() - timedelta(days=365)
+
+    for offset in range(0, n, batch_size):
+        documents = []
+        for _ in range(min(batch_size, n - offset)):
+            day = start + timedelta(days=rng.randrange(366))
+            hour, minute = rng.randrange(8, 18), rng.choice([0, 15, 30, 45])
+            duration = rng.choice([15, 30, 30, 45, 60])
+            box = rng.randrange(len(box_ids))
+            documents.append({
+                "patient_id": f"patient-{rng.randrange(50000)}",
+                "doctor_id": f"doctor-{rng.randrange(300)}",
+                "box_id": str(box_ids[box]),
+                "date": day.isoformat(),
+                "start_time": f"{hour:02d}:{minute:02d}:00",
+                "end_time": f"{hour + (minute + duration) // 60:02d}:{(minute + duration) % 60:02d}:00",
+                "duration_minutes": duration,
+                "status": rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+                "appointment_type": rng.choice(["consultation", "procedure", "follow_up", "emergency"]),
+                "box_name": f"Box {box}",
+                "created_at": datetime.utcnow()
+            })
+        await collection.insert_many(documents, ordered=False)
+
+
+async def timed(label: str, coro_factory):
+    started = timer.perf_counter()
+    await coro_factory()
+    elapsed = timer.perf_counter() - started
+    print(f"{label:28s} {elapsed * 1000:9.1f} ms")
+    return elapsed
+
+
+async def python_reservation_stats(date_from: date, date_to: date):
+    """What the endpoint would cost without pipelines: stream and count client-side"""
+    cursor = Reservation.get_motor_collection().find(
+        {"date": {"$gte": date_from.isoformat(), "$lte": date_to.isoformat()}},
+        {"status": 1, "appointment_type": 1, "duration_minutes": 1, "start_time": 1, "date": 1}
+    )
+    by_status, hours, months = Counter(), Counter(), Counter()
+    async for row in cursor:
+        by_status[row["status"]] += 1
+        hours[row["start_time"][:2]] += 1
+        months[row["date"][:7]] += 1
+    return by_status, hours, months
+
+
+async def run(args):
+    client = AsyncIOMotorClient(args.database_url)
+    await init_beanie(database=client[args.database], document_models=[User, Box, Reservation, Schedule, ReservationRollup])
+
+    started = timer.perf_counter()
+    await seed(args.reservations)
+    print(f"dataset ready: {args.reservations} reservations ({timer.perf_counter() - started:.1f} s)")
+
+    date_to = date.today()
+    date_from = date_to - timedelta(days=365)
+
+    await timed("rollups rebuild", RollupService.rebuild)
+    await timed("reservation_stats (live)", lambda: StatsService.reservation_stats_live(date_from, date_to))
+    await timed("reservation_stats (rollups)", lambda: StatsService.reservation_stats_from_rollups(date_from, date_to))
+    await timed("box_stats", lambda: StatsService.box_stats(date_from, date_to))
+    await timed("schedule_stats", StatsService.schedule_stats)
+    await timed("user_stats", StatsService.user_stats)
+
+    async def sequential():
+        await StatsService.reservation_stats(date_from, date_to)
+        await StatsService.box_stats(date_from, date_to)
+        await StatsService.schedule_stats()
+        await StatsService.user_stats()
+
+    await timed("dashboard (sequential)", sequential)
+    await timed("dashboard (concurrent)", lambda: StatsService.dashboard(date_from, date_to))
+    if not args.skip_python:
+        await timed("python over find() cursor", lambda: python_reservation_stats(date_from, date_to))
+
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reservations", type=int, default=1_000_000)
+    parser.add_argument("--skip-python", action="store_true")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--database", default="redsalud_bench")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Shared fixtures: an in-memory MongoDB (mongomock-motor) with every model
+bound, and a fakeredis client installed as the shared Redis connection.
+"""
+import fakeredis.aioredis
+import pytest
+from beanie import init_beanie
+from mongomock_motor import AsyncMongoMockClient
+
+from app.core.database import DOCUMENT_MODELS
+from app.core.redis import redis_connection
+
+
+@pytest.fixture
+async def db():
+    database = AsyncMongoMockClient()["test"]
+    await init_beanie(database=database, document_models=DOCUMENT_MODELS)
+    # mongomock enforces partial unique indexes on every document
+    await database["reservations"].drop_indexes()
+    yield database
+
+
+@pytest.fixture
+async def redis(monkeypatch):
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(redis_connection, "client", client)
+    yield client
+    await client.aclose()
@@ -0,0 +1,120 @@
+import asyncio
+import json
+from datetime import date, time, timedelta
+
+import pytest
+
+from app.models.schedule import Schedule, ScheduleType, TimeSlot
+from app.services.availability_index import CHANNEL, AvailabilityIndex, availability_index
+
+MONDAY = date.today() + timedelta(days=7 - date.today().weekday())
+
+
+def schedule(**fields) -> Schedule:
+    fields = {
+        "day_of_week": "monday", "time_slots": [TimeSlot(start_time=time(8), end_time=time(13))], **fields
+    }
+    return Schedule(doctor_id="d1", doctor_name="D", effective_from=MONDAY, created_by="a1", **fields)
+
+
+async def wait_for(condition, timeout: float = 3):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met")
+
+
+async def test_leave_and_exceptions_override_regular_schedules(db):
+    index = AvailabilityIndex()
+    index.upsert(await schedule().insert())
+    assert index.covers("d1", MONDAY, time(9), time(9, 30))
+
+    index.upsert(await schedule(schedule_type=ScheduleType.EXCEPTION, specific_date=MONDAY, day_of_week=None,
+                                time_slots=[TimeSlot(start_time=time(14), end_time=time(16))]).insert())
+    assert not index.covers("d1", MONDAY, time(9), time(9, 30))
+    assert index.covers("d1", MONDAY, time(14), time(14, 30))
+
+    index.upsert(await schedule(schedule_type=ScheduleType.VACATION, effective_to=MONDAY, day_of_week=None).insert())
+    assert not index.is_doctor_available("d1", MONDAY)
+    assert index.is_doctor_available("d1", MONDAY + timedelta(weeks=1))
+
+
+async def test_schedule_writes_are_broadcast(db, redis):
+    await availability_index.load()
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(CHANNEL)
+    await pubsub.get_message(timeout=1)
+
+    written = await schedule().insert()
+
+    message = await pubsub.get_message(timeout=1)
+    assert json.loads(message["data"])["schedule_id"] == str(written.id)
+    assert availability_index.covers("d1", MONDAY, time(9), time(9, 30))
+    await pubsub.aclose()
+
+
+async def test_writes_from_other_workers_are_picked_up(db, redis):
+    index = AvailabilityIndex()
+    await index.load()
+    await index.start()
+    # Written by another worker: no hook ran on this index
+    result = await Schedule.get_motor_collection().insert_one(
+        schedule().model_dump(by_alias=True, exclude={"id"}, mode="json")
+    )
+    await asyncio.sleep(0.05)
+
+    await redis.publish(CHANNEL, json.dumps({"worker": "other", "schedule_id": str(result.inserted_id)}))
+    await wait_for(lambda: index.covers("d1", MONDAY, time(9), time(9, 30)))
+
+    await Schedule.get_motor_collection().delete_one({"_id": result.inserted_id})
+    await redis.publish(CHANNEL, json.dumps({"worker": "other", "schedule_id": str(result.inserted_id)}))
+    await wait_for(lambda: not index.is_doctor_available("d1", MONDAY))
+    await index.stop()
+
+
+class DroppingPubSub:
+    """Fails on its first listen, as a lost Redis connection does"""
+
+    attempts = 0
+
+    async def subscribe(self, channel):
+        pass
+
+    async def listen(self):
+        DroppingPubSub.attempts += 1
+        if DroppingPubSub.attempts == 1:
+            raise ConnectionError("Connection closed by server")
+        await asyncio.Event().wait()
+        yield
+
+
+class DroppingRedis:
+    def pubsub(self):
+        return DroppingPubSub()
+
+
+async def test_reconnect_reloads_the_index(db):
+    index = AvailabilityIndex()
+    await index.load()
+    await Schedule.get_motor_collection().insert_one(
+        schedule().model_dump(by_alias=True, exclude={"id"}, mode="json")
+    )
+
+    task = asyncio.create_task(index._listen(DroppingRedis()))
+    await wait_for(lambda: len(index) == 1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+async def test_schedule_entry_rule_stays_sync(db):
+    regular = await schedule().insert()
+    await schedule(schedule_type=ScheduleType.VACATION, effective_to=MONDAY, day_of_week=None).insert()
+    await availability_index.load()
+
+    # The entry's own dates cover Monday; the doctor's vacation overrides it
+    assert regular.is_active_on(MONDAY) is True
+    assert regular.get_available_slots_for_date(MONDAY)[0] == time(8)
+    assert not await regular.is_in_effect_on(MONDAY)
+    assert await regular.get_effective_slots_for_date(MONDAY) == []
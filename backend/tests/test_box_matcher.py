@@ -0,0 +1,41 @@
+from datetime import date, datetime, time, timedelta
+
+from bson import ObjectId
+
+from app.services.availability_index import AvailabilityIndex
+from app.services.box_matcher import BoxMatcher, BoxProfile
+from app.services.day_bitmaps import DayCalendar
+
+MONDAY = date(2024, 6, 3)
+
+
+def matcher_with_one_box() -> BoxMatcher:
+    matcher = BoxMatcher(max_days=30, ttl=3600)
+    profile = BoxProfile.from_document({
+        "_id": ObjectId(), "name": "Box 1", "location": "Central", "capacity": 1, "status": "available",
+        "available_from": "08:00", "available_to": "18:00", "available_days": ["monday", "tuesday"]
+    })
+    matcher.boxes = {profile.box_id: profile}
+    return matcher
+
+
+def test_free_slots_skip_starts_before_now():
+    dates = [MONDAY, MONDAY + timedelta(days=1)]
+    calendars = {day: DayCalendar() for day in dates}
+
+    slots = matcher_with_one_box().find_free_slots(
+        calendars, dates, AvailabilityIndex(), 30, limit=2, not_before=datetime(2024, 6, 3, 10, 7)
+    )
+
+    assert [(slot.date, slot.start_time) for slot in slots] == [(MONDAY, time(10, 15)), (MONDAY, time(10, 30))]
+
+
+def test_free_slots_move_to_the_next_day_after_hours():
+    dates = [MONDAY, MONDAY + timedelta(days=1)]
+    calendars = {day: DayCalendar() for day in dates}
+
+    slots = matcher_with_one_box().find_free_slots(
+        calendars, dates, AvailabilityIndex(), 30, limit=1, not_before=datetime(2024, 6, 3, 17, 45)
+    )
+
+    assert [(slot.date, slot.start_time) for slot in slots] == [(MONDAY + timedelta(days=1), time(8))]
@@ -0,0 +1,192 @@
+from datetime import date, time, timedelta
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from app.models.box import Box
+from app.models.reservation import Reservation, ReservationBulkCreate, ReservationCreate
+from app.models.slot_claim import SlotClaim
+from app.models.user import User
+from app.services.bulk_reservation_service import TRANSACTIONS_UNSUPPORTED, BulkReservationService
+
+# Claims of past days expire through the TTL index, which mongomock applies
+MONDAY = date.today() + timedelta(days=7 - date.today().weekday())
+
+
+class FakeSession:
+    """
+    Stands in for a Motor session on mongomock, which has no transactions:
+    writes apply immediately (mongomock ignores a falsy session) and the
+    session records how the transaction ended.
+    """
+
+    def __init__(self):
+        self.in_transaction = False
+        self.outcome = None
+
+    def __bool__(self):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def start_transaction(self):
+        return FakeTransaction(self)
+
+    async def commit_transaction(self):
+        self.in_transaction = False
+        self.outcome = "committed"
+
+    async def abort_transaction(self):
+        self.in_transaction = False
+        self.outcome = "aborted"
+
+
+class FakeTransaction:
+    """Same exit rules as pymongo: commit on a clean exit, abort on an exception"""
+
+    def __init__(self, session: FakeSession):
+        self.session = session
+
+    async def __aenter__(self):
+        self.session.in_transaction = True
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        if self.session.in_transaction:
+            if exc_type is None:
+                await self.session.commit_transaction()
+            else:
+                await self.session.abort_transaction()
+
+
+@pytest.fixture
+async def booking(db):
+    patient = await User(email="p@example.cl", username="p", full_name="P", hashed_password="x", role="patient").insert()
+    doctor = await User(email="d@example.cl", username="d", full_name="D", hashed_password="x", role="doctor").insert()
+    box = await Box(name="Box 1", location="Central", capacity=1, floor=1, status="available").insert()
+    return patient, doctor, box
+
+
+@pytest.fixture
+def session(db, monkeypatch):
+    session = FakeSession()
+
+    async def start_session():
+        return session
+
+    monkeypatch.setattr(SlotClaim.get_motor_collection().database.client, "start_session", start_session)
+    return session
+
+
+@pytest.fixture
+def no_transactions(db, monkeypatch):
+    async def start_session():
+        raise OperationFailure("Transaction numbers are only allowed on a replica set member or mongos",
+                               code=TRANSACTIONS_UNSUPPORTED)
+
+    monkeypatch.setattr(SlotClaim.get_motor_collection().database.client, "start_session", start_session)
+
+
+def weekly(booking, weeks, mode):
+    patient, doctor, box = booking
+    return ReservationBulkCreate(
+        items=[
+            ReservationCreate(
+                patient_id=str(patient.id), doctor_id=str(doctor.id), box_id=str(box.id),
+                date=MONDAY + timedelta(weeks=week), start_time=time(9), duration_minutes=30,
+                appointment_type="consultation"
+            )
+            for week in weeks
+        ],
+        mode=mode,
+        check_schedule=False
+    )
+
+
+async def take_cell(box, day: date):
+    """Claim a box cell as a concurrent booking would"""
+    await SlotClaim.get_motor_collection().insert_one({
+        "_id": SlotClaim.make_key("box", str(box.id), day.isoformat(), 9 * 60),
+        "reservation_id": "other"
+    })
+
+
+async def test_all_or_nothing_commits_a_free_batch(booking, session):
+    patient, _, _ = booking
+    result = await BulkReservationService.create_reservations(weekly(booking, range(3), "all_or_nothing"), patient)
+
+    assert result.committed and result.created == 3
+    assert session.outcome == "committed"
+    assert await Reservation.count() == 3
+
+
+async def test_all_or_nothing_aborts_a_conflicting_batch(booking, session):
+    patient, _, box = booking
+    await take_cell(box, MONDAY + timedelta(weeks=2))
+
+    result = await BulkReservationService.create_reservations(weekly(booking, range(4), "all_or_nothing"), patient)
+
+    assert not result.committed and result.created == 0
+    assert [item.status_code for item in result.results] == [424, 424, 409, 424]
+    # The claims of weeks 0 and 1 were written before the conflict; they
+    # must be rolled back, not committed
+    assert session.outcome == "aborted"
+    assert await Reservation.count() == 0
+
+
+async def test_all_or_nothing_reports_a_reservation_conflict(booking, session):
+    patient, _, _ = booking
+    # A reservation that collides on a unique key without holding the slot
+    reservations = Reservation.get_motor_collection()
+    await reservations.create_index("date", unique=True)
+    await reservations.insert_one({"date": (MONDAY + timedelta(weeks=1)).isoformat(), "status": "cancelled"})
+
+    result = await BulkReservationService.create_reservations(weekly(booking, range(3), "all_or_nothing"), patient)
+
+    assert not result.committed and result.created == 0
+    assert [item.status_code for item in result.results] == [424, 409, 424]
+    assert result.results[1].detail == "Reservation already exists"
+    assert session.outcome == "aborted"
+
+
+async def test_all_or_nothing_without_transactions_leaves_nothing_behind(booking, no_transactions):
+    patient, _, box = booking
+    await take_cell(box, MONDAY + timedelta(weeks=2))
+
+    result = await BulkReservationService.create_reservations(weekly(booking, range(4), "all_or_nothing"), patient)
+
+    assert not result.committed
+    assert await Reservation.count() == 0
+    assert await SlotClaim.count() == 1
+
+
+async def test_best_effort_books_around_a_taken_slot(booking, no_transactions):
+    patient, _, box = booking
+    await take_cell(box, MONDAY + timedelta(weeks=1))
+
+    result = await BulkReservationService.create_reservations(weekly(booking, range(3), "best_effort"), patient)
+
+    assert result.created == 2
+    assert [item.status_code for item in result.results] == [201, 409, 201]
+    assert await Reservation.count() == 2
+    claims = await SlotClaim.find({"reservation_id": {"$ne": "other"}}).to_list()
+    # Confirmed claims last until their day is over
+    assert {claim.expires_at for claim in claims} == {
+        SlotClaim.day_expiry(MONDAY), SlotClaim.day_expiry(MONDAY + timedelta(weeks=2))
+    }
+
+
+async def test_compensation_reports_a_reservation_conflict(booking, no_transactions):
+    patient, _, _ = booking
+    reservations = Reservation.get_motor_collection()
+    await reservations.create_index("date", unique=True)
+    await reservations.insert_one({"date": (MONDAY + timedelta(weeks=1)).isoformat(), "status": "cancelled"})
+
+    result = await BulkReservationService.create_reservations(weekly(booking, range(3), "all_or_nothing"), patient)
+
+    assert [item.status_code for item in result.results] == [424, 409, 424]
+    assert await Reservation.count() == 1
+    assert await SlotClaim.count() == 0
@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core import health
+from app.core.health import HealthMonitor
+from app.core.pool import ConnectionPoolMonitor, PoolStats
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    """A monitor of a started worker with a fresh, healthy database probe"""
+    monkeypatch.setattr(health.startup_timings, "total_ms", 100.0)
+    monkeypatch.setattr(health, "pool_monitor", ConnectionPoolMonitor())
+    monkeypatch.setattr(health.request_metrics, "current_loop_lag", lambda: None)
+    monitor = HealthMonitor(interval=5, timeout=1, stats_ttl=60)
+    monitor.database_ok = True
+    monitor.database_checked_at = time.monotonic()
+    return monitor
+
+
+def test_ready_when_every_check_passes(monitor):
+    assert monitor.readiness() == (True, {})
+
+
+def test_not_ready_before_startup_finishes(monitor, monkeypatch):
+    monkeypatch.setattr(health.startup_timings, "total_ms", None)
+
+    assert monitor.readiness() == (False, {"startup": "startup not finished"})
+
+
+@pytest.mark.parametrize("database_ok, age, failure", [
+    (None, None, "not probed yet"),
+    (False, 0, "ping failed"),
+    (True, 3 * 5 + 1 + 1, "probe result is stale"),
+])
+def test_not_ready_without_a_recent_successful_ping(monitor, database_ok, age, failure):
+    monitor.database_ok = database_ok
+    monitor.database_checked_at = None if age is None else time.monotonic() - age
+
+    assert monitor.readiness() == (False, {"database": failure})
+
+
+async def test_a_ping_timeout_counts_as_failed(monitor, monkeypatch):
+    async def hanging_ping():
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(health, "ping_database", hanging_ping)
+    monitor.timeout = 0.05
+
+    await monitor._probe_database()
+
+    assert monitor.readiness() == (False, {"database": "ping failed"})
+
+
+def test_not_ready_while_the_pool_queues_callers(monitor):
+    pool = PoolStats(max_size=10)
+    pool.in_use, pool.waiting = 10, 3
+    health.pool_monitor.pools[("mongo", 27017)] = pool
+
+    ready, failures = monitor.readiness()
+
+    assert not ready and list(failures) == ["pool"]
+
+
+def test_not_ready_when_the_event_loop_lags(monitor, monkeypatch):
+    monkeypatch.setattr(health.request_metrics, "current_loop_lag", lambda: 2.0)
+
+    assert monitor.readiness() == (False, {"event_loop": "lag 2000 ms"})
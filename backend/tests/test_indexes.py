@@ -0,0 +1,32 @@
+from pymongo import ASCENDING
+
+from app.core.indexes import sync_indexes
+from app.models.slot_claim import SlotClaim
+
+
+async def replace_ttl_index(expire_after_seconds: int):
+    """Build expires_at as an earlier deploy would have, with other options"""
+    collection = SlotClaim.get_motor_collection()
+    await collection.drop_index("expires_at_ttl")
+    await collection.create_index([("expires_at", ASCENDING)], name="expires_at_ttl",
+                                  expireAfterSeconds=expire_after_seconds)
+
+
+async def test_sync_leaves_a_changed_index_in_place(db):
+    await replace_ttl_index(3600)
+
+    diff = await sync_indexes(SlotClaim)
+
+    assert [current.name for current, _ in diff.changed] == ["expires_at_ttl"]
+    information = await SlotClaim.get_motor_collection().index_information()
+    assert information["expires_at_ttl"]["expireAfterSeconds"] == 3600
+
+
+async def test_sync_rebuilds_a_changed_index_when_asked(db):
+    await replace_ttl_index(3600)
+
+    await sync_indexes(SlotClaim, rebuild_changed=True)
+
+    information = await SlotClaim.get_motor_collection().index_information()
+    assert information["expires_at_ttl"]["expireAfterSeconds"] == 0
+    assert (await sync_indexes(SlotClaim)).in_sync
@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.core.config import settings
+from app.models.box import Box
+from app.models.reservation import Reservation
+from app.services.occupancy_feed import OccupancyFeed
+from app.services.reservation_service import ReservationService
+
+
+@pytest.fixture
+async def box(db):
+    return await Box(
+        name="Box 1", location="Central", capacity=1, floor=1, status=settings.BOX_STATUS["OCCUPIED"],
+        current_reservation_id="r2", current_doctor_id="d2"
+    ).insert()
+
+
+def completed(box, reservation_id: str) -> Reservation:
+    return Reservation.model_construct(
+        id=reservation_id, box_id=str(box.id), doctor_id="d1",
+        status=settings.RESERVATION_STATUS["COMPLETED"], updated_at=datetime.utcnow()
+    )
+
+
+async def test_check_out_leaves_a_box_taken_over_by_another_check_in(box):
+    await ReservationService.sync_box_occupancy(completed(box, "r1"))
+
+    box = await Box.get(box.id)
+    assert (box.status, box.current_reservation_id) == (settings.BOX_STATUS["OCCUPIED"], "r2")
+
+
+async def test_check_out_frees_the_box(box):
+    await ReservationService.sync_box_occupancy(completed(box, "r2"))
+
+    box = await Box.get(box.id)
+    assert (box.status, box.current_reservation_id, box.current_doctor_id) == (
+        settings.BOX_STATUS["AVAILABLE"], None, None
+    )
+
+
+class DroppingPubSub:
+    """Fails on its first listen, as a lost Redis connection does"""
+
+    attempts = 0
+
+    async def subscribe(self, channel):
+        pass
+
+    async def listen(self):
+        DroppingPubSub.attempts += 1
+        if DroppingPubSub.attempts == 1:
+            raise ConnectionError("Connection closed by server")
+        await asyncio.Event().wait()
+        yield
+
+
+class DroppingRedis:
+    def pubsub(self):
+        return DroppingPubSub()
+
+
+async def test_redis_reconnect_reloads_boxes_and_resyncs(box, monkeypatch):
+    monkeypatch.setattr("app.services.occupancy_feed.get_redis", DroppingRedis)
+    feed = OccupancyFeed(source="events", queue_size=10, max_subscribers=10)
+    subscription = feed.subscribe()
+
+    task = asyncio.create_task(feed._follow_redis())
+    event = await subscription.next_event(timeout=3)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert event == {"type": "resync"}
+    assert list(feed.boxes) == [str(box.id)]
+
+
+async def test_feed_retries_a_failed_start(box, monkeypatch):
+    feed = OccupancyFeed(source="events", queue_size=10, max_subscribers=10)
+    load_boxes = feed._load_boxes
+    attempts = []
+
+    async def flaky_load():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("No primary available")
+        await load_boxes()
+
+    monkeypatch.setattr(feed, "_load_boxes", flaky_load)
+    monkeypatch.setattr("app.services.occupancy_feed.get_redis", lambda: None)
+    await feed.start()
+    try:
+        await asyncio.wait_for(feed.ready.wait(), timeout=3)
+    finally:
+        await feed.stop()
+
+    assert len(attempts) == 2
+    assert list(feed.boxes) == [str(box.id)]
+
+
+async def test_stream_subscribes_only_once_it_is_consumed(monkeypatch):
+    from app.api.v1 import occupancy
+
+    feed = OccupancyFeed(source="events", queue_size=10, max_subscribers=10)
+    feed.ready.set()
+    monkeypatch.setattr(occupancy, "occupancy_feed", feed)
+
+    response = await occupancy.occupancy_stream(current_user=None)
+    # A client that disconnects before the body starts holds nothing
+    assert feed.subscriber_count == 0
+
+    body = response.body_iterator
+    assert (await body.__anext__()).startswith("event: snapshot")
+    assert feed.subscriber_count == 1
+    await body.aclose()
+    assert feed.subscriber_count == 0
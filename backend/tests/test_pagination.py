@@ -0,0 +1,73 @@
+import base64
+from datetime import date, time, timedelta
+
+import pytest
+from bson import ObjectId, json_util
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING
+
+from app.core.pagination import decode_cursor, encode_cursor, paginate
+from app.models.reservation import Reservation
+
+DAY = date.today() + timedelta(days=7)
+
+
+def forged(payload: dict) -> str:
+    return base64.urlsafe_b64encode(json_util.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.fixture
+async def reservations(db):
+    rows = [
+        Reservation.model_construct(
+            patient_id="p", doctor_id="d", box_id="b", patient_name="P", doctor_name="D", box_name="B",
+            box_location="L", date=DAY + timedelta(days=index // 2), start_time=time(9), end_time=time(9, 30),
+            duration_minutes=30, appointment_type="consultation", status="confirmed",
+            confirmation_code=f"C{index}", created_by="a"
+        )
+        for index in range(7)
+    ]
+    await Reservation.insert_many(rows)
+    return await Reservation.find_all().to_list()
+
+
+async def test_cursor_round_trip_walks_every_row_once(reservations):
+    seen, cursor = [], None
+    for _ in range(5):
+        page = await paginate(Reservation, {}, sort_field="date", cursor=cursor, limit=3, direction=DESCENDING)
+        seen.extend(row.id for row in page.items)
+        cursor = page.next_cursor
+        if not page.has_more:
+            break
+
+    expected = sorted(reservations, key=lambda r: (r.date, r.id), reverse=True)
+    assert seen == [row.id for row in expected]
+
+
+def test_decode_returns_what_was_encoded():
+    last_id = ObjectId()
+    cursor = encode_cursor("date", ASCENDING, DAY.isoformat(), last_id)
+
+    assert decode_cursor(cursor, "date", ASCENDING, (str,)) == (DAY.isoformat(), last_id)
+
+
+@pytest.mark.parametrize("payload", [
+    {"f": "date", "d": ASCENDING, "v": {"$ne": None}, "i": ObjectId()},
+    {"f": "date", "d": ASCENDING, "v": ["2030-01-01"], "i": ObjectId()},
+    {"f": "date", "d": ASCENDING, "v": 20300101, "i": ObjectId()},
+    {"f": "date", "d": ASCENDING, "v": "2030-01-01", "i": {"$gt": ""}},
+    {"f": "created_at", "d": ASCENDING, "v": "2030-01-01", "i": ObjectId()},
+    {"f": "date", "d": DESCENDING, "v": "2030-01-01", "i": ObjectId()},
+])
+async def test_tampered_cursors_are_rejected(db, payload):
+    with pytest.raises(HTTPException) as error:
+        await paginate(Reservation, {}, sort_field="date", cursor=forged(payload), direction=ASCENDING)
+
+    assert error.value.status_code == 400
+
+
+async def test_garbage_cursor_is_rejected(db):
+    with pytest.raises(HTTPException) as error:
+        await paginate(Reservation, {}, cursor="not a cursor!")
+
+    assert error.value.status_code == 400
@@ -0,0 +1,51 @@
+import fakeredis
+import fakeredis.aioredis
+import pytest
+
+from app.core.rate_limit import RateLimit, RateLimiter, client_identity
+from app.core.redis import redis_connection
+
+LIMIT = RateLimit(4, 60)
+
+
+async def test_a_lease_is_spent_without_calling_redis(redis):
+    limiter = RateLimiter(lease_fraction=0.5, lease_ttl=60)
+
+    assert [await limiter.acquire("key", LIMIT) for _ in range(4)] == [None] * 4
+    assert limiter.redis_calls == 2
+    assert await limiter.acquire("key", LIMIT) > 0
+
+
+async def test_unused_leases_are_refunded(redis):
+    first, second = RateLimiter(lease_fraction=1, lease_ttl=60), RateLimiter(lease_fraction=1, lease_ttl=60)
+    assert await first.acquire("key", LIMIT) is None
+    # The rest of the limit is parked on the first worker until it hands it back
+    assert await second.acquire("key", LIMIT) > 0
+
+    await first.sweep(expire_all=True)
+
+    assert [await second.acquire("key", LIMIT) for _ in range(3)] == [None] * 3
+    assert await second.acquire("key", LIMIT) > 0
+
+
+async def test_falls_back_to_local_limits_when_redis_fails(monkeypatch):
+    server = fakeredis.FakeServer()
+    server.connected = False
+    monkeypatch.setattr(redis_connection, "client", fakeredis.aioredis.FakeRedis(server=server))
+    limiter = RateLimiter(lease_fraction=0.5, lease_ttl=60)
+
+    assert [await limiter.acquire("key", LIMIT) for _ in range(4)] == [None] * 4
+    assert await limiter.acquire("key", LIMIT) > 0
+    assert "key" in limiter.local_tat
+
+
+@pytest.mark.parametrize("peer, trusted, expected", [
+    ("10.0.0.2", (), "ip:10.0.0.2"),
+    ("10.0.0.2", ("10.0.0.2",), "ip:203.0.113.7"),
+    ("198.51.100.1", ("10.0.0.2",), "ip:198.51.100.1"),
+])
+def test_client_address_comes_from_the_header_of_trusted_proxies_only(peer, trusted, expected):
+    scope = {"headers": [(b"x-forwarded-for", b"192.0.2.1, 203.0.113.7")], "client": (peer, 4000)}
+
+    assert client_identity(scope, b"x-forwarded-for", trusted) == expected
+    assert client_identity(scope) == "ip:" + peer
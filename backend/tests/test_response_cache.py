@@ -0,0 +1,99 @@
+import httpx
+import pytest
+from fastapi import APIRouter, FastAPI
+
+from app.core.metrics import RequestMetrics, RequestMetricsMiddleware
+from app.core.security import create_access_token
+from app.models.user import User
+from app.services.response_cache import ResponseCache, ResponseCacheMiddleware
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(maxsize=100, ttl=60, stale_ttl=60)
+
+
+@pytest.fixture
+def renders(cache):
+    """Calls per path of a stub router; /api/v1/schedules/busy writes while rendering"""
+    calls = {}
+    router = APIRouter()
+
+    @router.get("/api/v1/boxes")
+    async def boxes():
+        calls["boxes"] = calls.get("boxes", 0) + 1
+        return {"calls": calls["boxes"]}
+
+    @router.get("/api/v1/schedules")
+    async def schedules():
+        calls["schedules"] = calls.get("schedules", 0) + 1
+        return {"calls": calls["schedules"]}
+
+    @router.get("/api/v1/schedules/busy")
+    async def busy():
+        calls["busy"] = calls.get("busy", 0) + 1
+        cache.bump("schedules")
+        return {"calls": calls["busy"]}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(ResponseCacheMiddleware, cache=cache)
+    return app, calls
+
+
+@pytest.fixture
+async def tokens(db):
+    headers = []
+    for name in ("a", "b"):
+        user = await User(email=f"{name}@example.cl", username=name, full_name=name, hashed_password="x",
+                          role="doctor").insert()
+        headers.append({"Authorization": f"Bearer {create_access_token(user.id)}"})
+    return headers
+
+
+async def get(app, path, headers):
+    async with httpx.AsyncClient(app=app, base_url="http://testserver") as client:
+        return await client.get(path, headers=headers)
+
+
+async def test_responses_are_cached_per_user(renders, tokens):
+    app, calls = renders
+    first, second = tokens
+
+    assert (await get(app, "/api/v1/schedules", first)).headers["x-cache"] == "MISS"
+    assert (await get(app, "/api/v1/schedules", second)).headers["x-cache"] == "MISS"
+    assert (await get(app, "/api/v1/schedules", first)).json() == {"calls": 1}
+    assert calls["schedules"] == 2
+
+
+async def test_role_cached_paths_are_shared_by_a_role(renders, tokens):
+    app, calls = renders
+    first, second = tokens
+
+    await get(app, "/api/v1/boxes", first)
+    response = await get(app, "/api/v1/boxes", second)
+
+    assert response.headers["x-cache"] == "HIT"
+    assert calls["boxes"] == 1
+
+
+async def test_a_write_during_the_render_is_not_cached_over(renders, tokens):
+    app, calls = renders
+
+    await get(app, "/api/v1/schedules/busy", tokens[0])
+    response = await get(app, "/api/v1/schedules/busy", tokens[0])
+
+    assert response.headers["x-cache"] == "MISS"
+    assert calls["busy"] == 2
+
+
+async def test_cached_responses_keep_their_route_in_request_metrics(renders, tokens):
+    app, _ = renders
+    metrics = RequestMetrics(loop_lag_interval=0)
+    app.add_middleware(RequestMetricsMiddleware, metrics=metrics)
+
+    etag = (await get(app, "/api/v1/boxes", tokens[0])).headers["etag"]
+    await get(app, "/api/v1/boxes", tokens[0])
+    await get(app, "/api/v1/boxes", {**tokens[0], "If-None-Match": etag})
+
+    assert dict(metrics.requests) == {("GET", "/api/v1/boxes", "200"): 2, ("GET", "/api/v1/boxes", "304"): 1}
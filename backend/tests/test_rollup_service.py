@@ -0,0 +1,86 @@
+from datetime import date, time, timedelta
+
+import pytest
+
+from app.models.reservation import Reservation
+from app.models.rollup import ReservationRollup
+from app.services.rollup_service import RollupService
+
+DAY = date.today() + timedelta(days=30)
+
+
+def reservation(status: str = "confirmed", start: time = time(9)) -> Reservation:
+    return Reservation(
+        patient_id="p1", doctor_id="d1", box_id="b1", date=DAY, start_time=start,
+        end_time=time(start.hour, 30), duration_minutes=30, status=status, appointment_type="consultation",
+        created_by="a1", patient_name="P", doctor_name="D", box_name="Box 1", box_location="Central"
+    )
+
+
+@pytest.fixture
+async def booked(db):
+    reservations = [await reservation().insert(), await reservation("cancelled", time(10)).insert()]
+    await RollupService.record_created_many(reservations)
+    return reservations
+
+
+async def clinic() -> ReservationRollup:
+    return await ReservationRollup.get(RollupService.rollup_id("clinic", "all", DAY.isoformat()))
+
+
+async def test_rebuild_corrects_drifted_counters(booked):
+    await ReservationRollup.get_motor_collection().update_one(
+        {"_id": RollupService.rollup_id("clinic", "all", DAY.isoformat())}, {"$inc": {"total": 5, "booked": -1}}
+    )
+
+    assert await RollupService.rebuild(DAY, DAY) == 1
+
+    rollup = await clinic()
+    assert (rollup.total, rollup.booked, rollup.status) == (2, 1, {"confirmed": 1, "cancelled": 1})
+
+
+class ChangeAfterScan:
+    """Reservations collection that runs a live status change once a scan is read"""
+
+    def __init__(self, collection, change):
+        self.collection = collection
+        self.change = change
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def find(self, *args, **kwargs):
+        cursor, change = self.collection.find(*args, **kwargs), self.change
+
+        async def rows():
+            async for row in cursor:
+                yield row
+            await change()
+
+        return rows()
+
+
+async def test_rebuild_keeps_live_increments(booked, monkeypatch):
+    confirmed = booked[0]
+    collection = Reservation.get_motor_collection()
+
+    async def cancel():
+        await collection.update_one({"_id": confirmed.id}, {"$set": {"status": "cancelled"}})
+        await RollupService.record_status_change(confirmed, "confirmed", "cancelled")
+
+    monkeypatch.setattr(Reservation, "get_motor_collection", lambda: ChangeAfterScan(collection, cancel))
+    await RollupService.rebuild(DAY, DAY)
+
+    rollup = await clinic()
+    assert (rollup.booked, rollup.status["cancelled"]) == (0, 2)
+
+
+async def test_rebuild_drops_rollups_left_without_reservations(booked):
+    await ReservationRollup.get_motor_collection().insert_one({
+        "_id": RollupService.rollup_id("box", "gone", DAY.isoformat()), "scope": "box", "key": "gone",
+        "date": DAY.isoformat(), "month": DAY.isoformat()[:7], "total": 1
+    })
+
+    await RollupService.rebuild(DAY, DAY)
+
+    assert await ReservationRollup.find({"key": "gone"}).count() == 0
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from app.core.redis import redis_connection
+from app.core.security import TokenRevocationList, create_access_token, token_digest
+
+
+class DownRedis:
+    async def set(self, *args, **kwargs):
+        raise ConnectionError("Connection refused")
+
+    async def publish(self, *args, **kwargs):
+        raise ConnectionError("Connection refused")
+
+
+async def test_revoke_keeps_the_local_revocation_when_redis_is_down(monkeypatch):
+    monkeypatch.setattr(redis_connection, "client", DownRedis())
+    revocations = TokenRevocationList()
+    token = create_access_token("user", timedelta(minutes=5))
+
+    await revocations.revoke(token)
+
+    assert revocations.is_revoked(token_digest(token))
+
+
+async def test_revoke_shares_the_revocation(redis):
+    revocations = TokenRevocationList()
+    token = create_access_token("user", timedelta(minutes=5))
+
+    await revocations.revoke(token)
+
+    assert await redis.get(TokenRevocationList.REDIS_KEY_PREFIX + token_digest(token)) is not None
@@ -0,0 +1,29 @@
+from app.core.seed import SAMPLE_BOXES, SAMPLE_USERS, seed_initial_data
+from app.models.box import Box
+from app.models.user import User
+
+
+async def test_seed_skips_a_sample_user_whose_username_is_taken(db):
+    await User(
+        email="someone@example.cl", username="admin", full_name="Someone", hashed_password="x", role="admin"
+    ).insert()
+
+    await seed_initial_data()
+
+    emails = {user.email for user in await User.find_all().to_list()}
+    assert emails == {"someone@example.cl"} | {user["email"] for user in SAMPLE_USERS[1:]}
+
+
+async def test_seed_leaves_an_existing_box_inventory_alone(db):
+    await Box(name="Box A", location="Central", capacity=1, floor=1, status="available").insert()
+
+    await seed_initial_data()
+    await seed_initial_data()
+
+    assert [box.name for box in await Box.find_all().to_list()] == ["Box A"]
+
+
+async def test_seed_fills_an_empty_box_inventory(db):
+    await seed_initial_data()
+
+    assert sorted(box.name for box in await Box.find_all().to_list()) == [box["name"] for box in SAMPLE_BOXES]
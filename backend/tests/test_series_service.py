@@ -0,0 +1,105 @@
+from datetime import date, time, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.box import Box
+from app.models.reservation import Reservation
+from app.models.schedule import Schedule, TimeSlot
+from app.models.series import ReservationSeries, SeriesException
+from app.models.slot_claim import SlotClaim
+from app.models.user import User
+from app.services.availability_index import availability_index
+from app.services.series_service import SeriesService
+
+MONDAY = date.today() + timedelta(days=7 - date.today().weekday())
+UNTIL = MONDAY + timedelta(weeks=3)
+
+
+@pytest.fixture
+async def admin(db):
+    return await User(email="a@example.cl", username="a", full_name="A", hashed_password="x", role="admin").insert()
+
+
+@pytest.fixture
+async def series(db, admin):
+    patient = await User(email="p@example.cl", username="p", full_name="P", hashed_password="x", role="patient").insert()
+    doctor = await User(email="d@example.cl", username="d", full_name="D", hashed_password="x", role="doctor").insert()
+    box = await Box(name="Box 1", location="Central", capacity=1, floor=1, status="available").insert()
+    await Schedule(
+        doctor_id=str(doctor.id), doctor_name="D", effective_from=MONDAY, day_of_week="monday",
+        time_slots=[TimeSlot(start_time=time(8), end_time=time(13))], created_by=str(admin.id)
+    ).insert()
+    await availability_index.load()
+    return await ReservationSeries(
+        patient_id=str(patient.id), doctor_id=str(doctor.id), box_id=str(box.id),
+        patient_name="P", doctor_name="D", box_name="Box 1",
+        rrule="FREQ=WEEKLY;COUNT=3", dtstart=MONDAY, start_time=time(9), duration_minutes=30,
+        appointment_type="consultation", created_by=str(admin.id)
+    ).insert()
+
+
+async def test_materialize_records_occurrences_it_could_not_book(series):
+    taken = MONDAY + timedelta(weeks=1)
+    await SlotClaim.get_motor_collection().insert_one({
+        "_id": SlotClaim.make_key("box", series.box_id, taken.isoformat(), 9 * 60),
+        "reservation_id": "other"
+    })
+
+    result = await SeriesService.materialize(UNTIL)
+
+    assert (result.created, result.failed) == (2, 1)
+    series = await ReservationSeries.get(series.id)
+    assert series.materialized_until == UNTIL
+    assert [(f.original_date, f.status_code) for f in series.failed_occurrences] == [(taken, 409)]
+
+
+async def test_exception_clears_a_failed_occurrence(series, admin):
+    taken = MONDAY + timedelta(weeks=1)
+    await SlotClaim.get_motor_collection().insert_one({
+        "_id": SlotClaim.make_key("box", series.box_id, taken.isoformat(), 9 * 60),
+        "reservation_id": "other"
+    })
+    await SeriesService.materialize(UNTIL)
+    series = await ReservationSeries.get(series.id)
+
+    series = await SeriesService.add_exception(series, SeriesException(original_date=taken, cancelled=True), admin)
+
+    assert series.failed_occurrences == []
+    assert (await ReservationSeries.get(series.id)).get_exception(taken).cancelled
+
+
+async def test_cancelling_a_finished_occurrence_saves_nothing(series, admin):
+    await SeriesService.materialize(UNTIL)
+    reservation = await Reservation.find_one({"series_id": str(series.id), "occurrence_date": MONDAY.isoformat()})
+    await reservation.set({Reservation.status: "completed"})
+    series = await ReservationSeries.get(series.id)
+
+    with pytest.raises(HTTPException) as error:
+        await SeriesService.add_exception(series, SeriesException(original_date=MONDAY, cancelled=True), admin)
+
+    assert error.value.status_code == 409
+    assert (await ReservationSeries.get(series.id)).exceptions == []
+
+
+async def test_occurrences_booked_by_a_concurrent_materialize_are_not_failures(series):
+    await SeriesService.materialize(UNTIL)
+    # The second run read the series before the first one saved its progress
+    await ReservationSeries.get_motor_collection().update_one({"_id": series.id}, {"$set": {"materialized_until": None}})
+
+    result = await SeriesService.materialize(UNTIL)
+
+    assert (result.created, result.failed) == (0, 0)
+    assert (await ReservationSeries.get(series.id)).failed_occurrences == []
+
+
+async def test_occurrences_follow_a_new_exception(series, admin):
+    await SeriesService.materialize(UNTIL)
+    before = await SeriesService.occurrences(MONDAY, UNTIL)
+    series = await ReservationSeries.get(series.id)
+
+    await SeriesService.add_exception(series, SeriesException(original_date=MONDAY, cancelled=True), admin)
+
+    after = await SeriesService.occurrences(MONDAY, UNTIL)
+    assert [o.original_date for o in before] == [MONDAY + timedelta(weeks=week) for week in range(3)]
+    assert [o.original_date for o in after] == [MONDAY + timedelta(weeks=week) for week in (1, 2)]
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import date, time, timedelta
+
+import pytest
+from beanie import PydanticObjectId
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.models.box import Box
+from app.models.reservation import Reservation, ReservationCreate
+from app.models.slot_claim import SlotClaim
+from app.models.user import User
+from app.services.reservation_service import ReservationService
+
+# Claims of past days expire through the TTL index, which mongomock applies
+DAY = date.today() + timedelta(days=7)
+
+
+@pytest.fixture
+async def booking(db):
+    patient = await User(email="p@example.cl", username="p", full_name="P", hashed_password="x", role="patient").insert()
+    doctor = await User(email="d@example.cl", username="d", full_name="D", hashed_password="x", role="doctor").insert()
+    box = await Box(name="Box 1", location="Central", capacity=1, floor=1, status="available").insert()
+    return patient, doctor, box
+
+
+def request(booking, start: time, minutes: int = 30) -> ReservationCreate:
+    patient, doctor, box = booking
+    return ReservationCreate(
+        patient_id=str(patient.id), doctor_id=str(doctor.id), box_id=str(box.id),
+        date=DAY, start_time=start, duration_minutes=minutes, appointment_type="consultation"
+    )
+
+
+def keys(start: time, end: time):
+    return ReservationService.claim_keys("box", "doctor", DAY, start, end)
+
+
+def test_claim_keys_cover_every_cell_of_box_and_doctor():
+    cell = settings.BOOKING_SLOT_MINUTES
+    claimed = keys(time(9), time(9, 2 * cell))
+
+    assert claimed == sorted(
+        SlotClaim.make_key(kind, kind, DAY.isoformat(), 9 * 60 + offset)
+        for kind in ("box", "doctor") for offset in (0, cell)
+    )
+    # A range ending inside a cell still takes that cell
+    assert keys(time(9), time(9, cell + 1)) == claimed
+
+
+async def test_claims_are_all_or_nothing(db):
+    assert await ReservationService.claim_slots(keys(time(9), time(9, 30)), "first")
+
+    assert not await ReservationService.claim_slots(keys(time(9, 25), time(10)), "second")
+
+    assert await SlotClaim.find({"reservation_id": "second"}).count() == 0
+    assert await SlotClaim.find({"reservation_id": "first"}).count() == len(keys(time(9), time(9, 30)))
+
+
+async def test_released_cells_can_be_claimed_again(db):
+    await ReservationService.claim_slots(keys(time(9), time(9, 30)), "first")
+    await ReservationService.release_slots("first")
+
+    assert await ReservationService.claim_slots(keys(time(9), time(9, 30)), "second")
+
+
+async def test_confirmed_claims_last_until_their_day_is_over(db):
+    reservation = Reservation.model_construct(id=PydanticObjectId(), date=DAY)
+    await ReservationService.claim_slots(keys(time(9), time(9, 30)), str(reservation.id))
+    pending = {claim.expires_at for claim in await SlotClaim.find_all().to_list()}
+
+    await ReservationService.confirm_slots([reservation])
+
+    assert all(expiry < SlotClaim.day_expiry(DAY) for expiry in pending)
+    assert {claim.expires_at for claim in await SlotClaim.find_all().to_list()} == {SlotClaim.day_expiry(DAY)}
+
+
+async def test_concurrent_overlapping_bookings_get_one_reservation(booking):
+    patient, _, _ = booking
+
+    results = await asyncio.gather(
+        ReservationService.create_reservation(request(booking, time(9)), patient),
+        ReservationService.create_reservation(request(booking, time(9, 15)), patient),
+        return_exceptions=True
+    )
+
+    booked = [result for result in results if isinstance(result, Reservation)]
+    rejected = [result for result in results if isinstance(result, HTTPException)]
+    assert len(booked) == 1
+    assert [error.status_code for error in rejected] == [409]
+    assert await Reservation.count() == 1
+    assert {claim.reservation_id for claim in await SlotClaim.find_all().to_list()} == {str(booked[0].id)}
@@ -0,0 +1,58 @@
+import pydantic
+import pytest
+
+from app.models.user import User, UserAuth
+from app.services.user_cache import REDIS_KEY_PREFIX, UserCache
+
+
+@pytest.fixture
+def cache():
+    return UserCache(maxsize=100, ttl=60, redis_ttl=60)
+
+
+@pytest.fixture
+async def user(db):
+    return await User(email="d@example.cl", username="d", full_name="D", hashed_password="x", role="doctor").insert()
+
+
+async def test_cached_users_are_read_only(cache, user, redis):
+    cached = await cache.get_user(str(user.id))
+
+    assert isinstance(cached, UserAuth) and cached.is_doctor()
+    assert not hasattr(cached, "save") and not hasattr(cached, "hashed_password")
+    with pytest.raises(pydantic.ValidationError):
+        cached.role = "admin"
+    assert await cache.get_user(str(user.id)) is cached
+
+
+async def test_a_write_invalidates_every_tier(cache, user, redis, monkeypatch):
+    monkeypatch.setattr("app.services.user_cache.user_cache", cache)
+    await cache.get_user(str(user.id))
+
+    await user.set({User.is_active: False})
+
+    assert await redis.get(REDIS_KEY_PREFIX + str(user.id)) is None
+    assert not (await cache.get_user(str(user.id))).is_active
+
+
+async def test_an_invalidation_during_a_miss_is_not_cached_over(cache, user, redis, monkeypatch):
+    find_one = User.find_one
+
+    def read_then_deactivate(*args, **kwargs):
+        query = find_one(*args, **kwargs)
+
+        async def run():
+            stale = await query
+            # Another request deactivates the user once the read is done
+            await User.get_motor_collection().update_one({"_id": user.id}, {"$set": {"is_active": False}})
+            await cache.invalidate(str(user.id))
+            return stale
+
+        return run()
+
+    monkeypatch.setattr(User, "find_one", read_then_deactivate)
+    assert (await cache.get_user(str(user.id))).is_active
+    monkeypatch.setattr(User, "find_one", find_one)
+
+    assert await redis.get(REDIS_KEY_PREFIX + str(user.id)) is None
+    assert not (await cache.get_user(str(user.id))).is_active